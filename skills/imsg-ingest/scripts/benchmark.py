@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for quick_export.
+
+Usage:
+    python scripts/benchmark.py dates                # timestamp parsing, msgs/sec
+    python scripts/benchmark.py dates -n 1000000     # more samples
+    python scripts/benchmark.py json                 # JSONL decoding backends
+    python scripts/benchmark.py lookup -n 10000      # find_jsonl over a synthetic directory
+    python scripts/benchmark.py batch -n 2000        # --all-active export at 1/2/4/8 processes
+    python scripts/benchmark.py store                # --backend sqlite vs JSONL at 10k/1M/10M messages
+    python scripts/benchmark.py tokens               # --max-tokens estimator vs tiktoken cl100k_base
+    python scripts/benchmark.py tokens --tokenizer tokenizer.json  # ...and a Hugging Face tokenizer
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import quick_export
+from quick_export import format_time, parse_date, parse_ts, utc_offset
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:
+    Tokenizer = None
+
+CHAT_WORDS = (
+    "the to and a of you i it is that for on in we this be are with have just so but not can what was do "
+    "all if at my me will get like they about your up out one there now when know time yeah lol ok gm gn "
+    "ser fren ape floor mint launch token wallet chain fees deal call tomorrow tonight week meeting deck "
+    "raise round investors price pump liquidity trade position long short market thanks thx sounds good "
+    "send later check update team build shipping product users growth twitter telegram link doc"
+).split()
+CHAT_EMOJI = ["😂", "🔥", "🚀", "👀", "🙏", "💯", "🤝", "👍", "😅", "🫡"]
+
+
+def _rate(fn: Callable[[], None], n: int, repeat: int = 3) -> float:
+    """Best-of-`repeat` throughput of fn() in items per second."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return n / best
+
+
+def _report(rows: List[tuple]) -> None:
+    baseline = rows[0][1]
+    for name, rate in rows:
+        print(f"  {name:<28} {rate:>12,.0f} msgs/sec  {rate / baseline:5.1f}x")
+
+
+def sample_dates(n: int, days: int = 30) -> List[str]:
+    """Timestamps spread over `days`, in the formats the exporters emit."""
+    rng = random.Random(0)
+    end = datetime.now(timezone.utc)
+    dates = []
+    for i in range(n):
+        dt = end - timedelta(seconds=rng.randrange(days * 86400))
+        fmt = i % 4
+        if fmt == 0:
+            dates.append(dt.isoformat())
+        elif fmt == 1:
+            dates.append(dt.strftime("%Y-%m-%dT%H:%M:%SZ"))
+        elif fmt == 2:
+            dates.append(dt.replace(tzinfo=None, microsecond=0).isoformat())
+        else:
+            dates.append(dt.replace(microsecond=0).isoformat() + "Z")
+    return sorted(dates)
+
+
+def sample_line(i: int, d: str) -> bytes:
+    """One synthetic JSONL line shaped like exporter output, extra fields included."""
+    m = {
+        "id": 1_000_000 + i,
+        "date": d,
+        "text": f"message {i} about the deal, see you at {i % 24}:00" if i % 9 else None,
+        "is_from_me": i % 3 == 0,
+        "sender_id": 5_000_000 + i % 2,
+        "sender_username": "frankdegods" if i % 3 == 0 else "counterparty",
+        "reply_to_msg_id": 1_000_000 + i - 1 if i % 5 == 0 else None,
+        "media_type": "photo" if i % 9 == 0 else None,
+        "edit_date": None,
+        "reactions": [{"emoji": "👍", "count": 1}] if i % 11 == 0 else [],
+    }
+    return json.dumps(m).encode() + b"\n"
+
+
+def sample_lines(n: int, days: int = 30) -> List[bytes]:
+    return [sample_line(i, d) for i, d in enumerate(sample_dates(n, days))]
+
+
+def write_sample_jsonl(path: Path, n: int, days: int) -> None:
+    """n sample lines spaced evenly over `days` up to now, streamed to path (10M lines don't fit in a list)."""
+    end = datetime.now(timezone.utc).replace(microsecond=0)
+    step = days * 86400 / n
+    with open(path, 'wb') as f:
+        f.writelines(sample_line(i, (end - timedelta(seconds=int((n - i) * step))).isoformat()) for i in range(n))
+
+
+def sample_transcript(n: int) -> List[str]:
+    """Formatted transcript lines with chat-like text: short replies, links, addresses, emoji."""
+    rng = random.Random(0)
+    senders = ["you", "alice", "bob_trades", "John Doe", "klutch"]
+    lines = []
+    for ts in range(0, n * 60, 60):
+        words = [rng.choice(CHAT_WORDS) for _ in range(rng.choice((1, 2, 3, 5, 8, 12, 20, 40)))]
+        r = rng.random()
+        if r < 0.1:
+            words.append(f"https://x.com/{rng.choice(CHAT_WORDS)}/status/{rng.randrange(10**18, 10**19)}")
+        elif r < 0.15:
+            words.append("0x" + "".join(rng.choice("0123456789abcdef") for _ in range(40)))
+        elif r < 0.25:
+            words.append(f"${rng.randrange(1, 5000)}k")
+        if rng.random() < 0.2:
+            words.append(rng.choice(CHAT_EMOJI) * rng.randint(1, 3))
+        text = " ".join(words)
+        if rng.random() < 0.3:
+            text = text[0].upper() + text[1:] + rng.choice((".", "?", "!", ""))
+        if rng.random() < 0.05:
+            text += "\n    " + " ".join(rng.choice(CHAT_WORDS) for _ in range(6))
+        lines.append(f"[{format_time(ts)}] **{rng.choice(senders)}**: {text}")
+    return lines
+
+
+def sample_conversations(n: int) -> List[tuple]:
+    """(stem, contact name) pairs: phone numbers, emails and group chats."""
+    rng = random.Random(0)
+    syllables = ["al", "an", "ber", "chri", "da", "el", "fra", "jo", "ka", "li", "mar", "ni", "ro", "sa", "ti", "vin"]
+    convos = []
+    for i in range(n):
+        name = " ".join("".join(rng.choice(syllables) for _ in range(rng.randint(2, 3))).title() for _ in range(2))
+        if i % 10 == 0:
+            convos.append((f"chat{rng.randrange(10**12)}", None))
+        elif i % 4 == 0:
+            convos.append((f"{name.split()[0].lower()}{i}@example.com", name))
+        else:
+            convos.append((f"+1{rng.randrange(2 * 10**9, 10**10)}", name))
+    return convos
+
+
+def bench_lookup(n: int) -> None:
+    convos = sample_conversations(n)
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        quick_export.CONVERSATIONS_DIR = Path(tmp) / "conversations"
+        quick_export.LOOKUP_INDEX = Path(tmp) / "lookup-index.tsv"
+        quick_export.LOOKUP_GRAMS = Path(tmp) / "lookup-grams.bin"
+        quick_export.LOOKUP_NAMES = Path(tmp) / "lookup-names.json"
+        quick_export.CONVERSATIONS_DIR.mkdir()
+        for stem, name in convos:
+            m = {"date": "2026-01-02T10:00:00", "text": "hi", "is_from_me": False, "sender_username": name}
+            (quick_export.CONVERSATIONS_DIR / f"{stem}.jsonl").write_text(json.dumps(m) + "\n")
+
+        start = time.perf_counter()
+        index = quick_export.load_lookup_index()
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        quick_export.load_lookup_index()
+        load = time.perf_counter() - start
+
+        phone = next(stem for stem, _ in convos if stem.startswith("+"))
+        name = next(name for _, name in reversed(convos) if name)
+        queries = [
+            ("exact phone", f"({phone[2:5]}) {phone[5:8]}-{phone[8:]}"),
+            ("exact name", name),
+            ("prefix", name.split()[0][:4]),
+            ("substring", phone[-6:]),
+            ("typo", name[:2] + name[3:]),
+            ("no match", "qqqzzz"),
+        ]
+
+        print(f"Conversation lookup, {n:,} conversations")
+        print(f"  {'index build (cold)':<28} {build * 1000:>9.1f} ms")
+        print(f"  {'index open (warm)':<28} {load * 1000:>9.1f} ms")
+        calls = 20
+        for label, query in queries:
+            if label.startswith("exact"):
+                ranked = "-"
+            else:
+                quick_export.match_conversations(query.lower(), index)  # builds the trigram sidecar once
+                start = time.perf_counter()
+                for _ in range(calls):
+                    quick_export.match_conversations(query.lower(), index)
+                ranked = f"{(time.perf_counter() - start) / calls * 1000:.2f}"
+            # find_jsonl() reports fuzzy matches on stderr; keep that out of the timings and the table
+            with redirect_stderr(devnull):
+                start = time.perf_counter()
+                for _ in range(calls):
+                    found = quick_export.find_jsonl(query)
+                total = (time.perf_counter() - start) / calls
+            hit = (found[0] if isinstance(found, tuple) else found) is not None
+            print(f"  {label:<14} ranked {ranked:>6} ms  find_jsonl {total * 1000:6.2f} ms  "
+                  f"{'hit' if hit else 'miss'}  ({query})")
+
+
+def bench_batch(n: int, messages: int, days: int = 7) -> None:
+    body = b"".join(sample_lines(messages, days))
+    hours = days * 24
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        quick_export.CONVERSATIONS_DIR = Path(tmp) / "conversations"
+        quick_export.ACTIVITY_INDEX = Path(tmp) / "activity-index.json"
+        quick_export.CONVERSATIONS_DIR.mkdir()
+        for stem, _ in sample_conversations(n):
+            (quick_export.CONVERSATIONS_DIR / f"{stem}.jsonl").write_bytes(body)
+
+        def export(workers: int = 1, processes: int = 0) -> None:
+            with redirect_stdout(devnull):
+                quick_export.quick_export_batch([], hours, all_active=True, skip_sync=True, workers=workers,
+                                            processes=processes)
+
+        export()  # builds the activity index and column caches
+        rows = [(f"processes={p}", _rate(lambda: export(processes=p), n, repeat=2)) for p in (1, 2, 4, 8)]
+        rows.append((f"threads={quick_export.BATCH_WORKERS}",
+                     _rate(lambda: export(workers=quick_export.BATCH_WORKERS), n, repeat=2)))
+
+    print(f"--all-active export, {n:,} conversations x {messages} messages over {days}d "
+          f"({os.cpu_count()} CPUs)")
+    baseline = rows[0][1]
+    for name, rate in rows:
+        print(f"  {name:<28} {rate:>12,.0f} convos/sec  {rate / baseline:5.1f}x")
+
+
+def bench_store(sizes: List[int], days: int = 365) -> None:
+    """JSONL (column cache) vs --backend sqlite: initial load, window queries, incremental sync."""
+    print(f"Window queries, JSONL + column cache vs SQLite store, messages spread over {days}d")
+    print(f"  {'messages':>10} {'step':<22} {'jsonl':>10} {'sqlite':>10}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            quick_export.CONVERSATIONS_DIR = Path(tmp) / "conversations"
+            quick_export.CONVERSATIONS_DIR.mkdir()
+            path = quick_export.CONVERSATIONS_DIR / "+14155551234.jsonl"
+            quick_export.MESSAGE_STORE = Path(tmp) / "messages.db"
+            write_sample_jsonl(path, n, days)
+            store = quick_export.MessageStore(quick_export.MESSAGE_STORE)
+            now = int(time.time())
+
+            def timed(fn: Callable[[], None], repeat: int = 5) -> float:
+                return 1 / _rate(fn, 1, repeat)
+
+            rows = [("initial load", timed(lambda: quick_export.load_columns(path), 1),
+                     timed(lambda: store.sync(path), 1))]
+            for label, hours in (("1h window", 1), ("24h window", 24), ("30d window", 720)):
+                cutoff = now - hours * 3600
+                rows.append((label, timed(lambda: list(quick_export.read_window(path, cutoff)[0])),
+                             timed(lambda: list(store.window(path, cutoff)[0]))))
+            with open(path, 'ab') as f:
+                f.writelines(sample_line(n + i, datetime.now(timezone.utc).isoformat()) for i in range(100))
+            cutoff = now - 3600
+            rows.append(("append 100 + 1h window", timed(lambda: list(quick_export.read_window(path, cutoff)[0]), 1),
+                         timed(lambda: list(store.window(path, cutoff)[0]), 1)))
+            for label, jsonl, sqlite in rows:
+                print(f"  {n:>10,} {label:<22} {jsonl * 1000:>8.1f}ms {sqlite * 1000:>8.1f}ms")
+
+
+def bench_tokens(n: int, tokenizer_file: Optional[str] = None) -> None:
+    lines = sample_transcript(n)
+    references = []
+    if tiktoken is not None:
+        encoding = tiktoken.get_encoding("cl100k_base")
+        references.append(("tiktoken cl100k_base", lambda line: len(encoding.encode(line))))
+    if tokenizer_file:
+        if Tokenizer is None:
+            raise SystemExit("--tokenizer needs the tokenizers package (pip install tokenizers)")
+        tokenizer = Tokenizer.from_file(tokenizer_file)
+        references.append((Path(tokenizer_file).name, lambda line: len(tokenizer.encode(line).ids)))
+
+    estimate = quick_export.estimate_tokens
+    rows = [(name, _rate(lambda: [count(line) for line in lines], n)) for name, count in references]
+    rows.append(("estimate_tokens", _rate(lambda: [estimate(line) for line in lines], n)))
+
+    print(f"Token counting, {n:,} transcript lines")
+    _report(rows)
+    if not references:
+        print("  (pip install tiktoken to compare against cl100k_base)")
+    estimates = [estimate(line) for line in lines]
+    for name, count in references:
+        actual = [count(line) for line in lines]
+        total = (sum(estimates) - sum(actual)) / sum(actual)
+        per_line = sum(abs(e - a) / a for e, a in zip(estimates, actual)) / n
+        print(f"  vs {name:<25} total {total:+6.1%}   mean per line {per_line:6.1%}")
+
+
+def bench_dates(n: int) -> None:
+    dates = sample_dates(n)
+    cutoff = datetime.now(timezone.utc) - timedelta(days=60)
+    cutoff_ts = int(cutoff.timestamp())
+
+    def before():
+        # Filter and formatter each parse the date
+        for d in dates:
+            if parse_date(d) > cutoff:
+                parse_date(d).strftime("%H:%M")
+
+    def after():
+        for d in dates:
+            ts = parse_ts(d)
+            if ts > cutoff_ts:
+                format_time(ts + utc_offset(d))
+
+    print(f"Timestamp parse + format, {n:,} messages")
+    _report([("parse_date x2 + strftime", _rate(before, n)), ("parse_ts + format_time", _rate(after, n))])
+
+
+def bench_json(n: int) -> None:
+    lines = sample_lines(n)
+    text_lines = [line.decode() for line in lines]
+    rows = [("json.loads(str) -> dict", _rate(lambda: [json.loads(line) for line in text_lines if line.strip()], n))]
+
+    from_dict = quick_export.message_from_dict
+    rows.append(("json.loads(bytes) -> Message", _rate(lambda: [from_dict(json.loads(line)) for line in lines], n)))
+    if quick_export.orjson is not None:
+        loads = quick_export.orjson.loads
+        rows.append(("orjson -> Message", _rate(lambda: [from_dict(loads(line)) for line in lines], n)))
+    if quick_export.msgspec is not None:
+        decode = quick_export.msgspec.json.Decoder(quick_export.Message).decode
+        rows.append(("msgspec -> Message", _rate(lambda: [decode(line) for line in lines], n)))
+
+    print(f"JSONL decode, {n:,} lines (active backend: {quick_export.JSON_BACKEND})")
+    _report(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="quick_export micro-benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("dates", help="Timestamp parsing throughput")
+    p.add_argument("-n", type=int, default=200_000, help="Messages to parse (default: 200000)")
+    p = sub.add_parser("json", help="JSONL decoding throughput per backend")
+    p.add_argument("-n", type=int, default=200_000, help="Lines to decode (default: 200000)")
+    p = sub.add_parser("lookup", help="find_jsonl index build, load and ranked matching")
+    p.add_argument("-n", type=int, default=10_000, help="Conversations (default: 10000)")
+    p = sub.add_parser("batch", help="Parallel --all-active export speed-up per worker count")
+    p.add_argument("-n", type=int, default=2_000, help="Conversations (default: 2000)")
+    p.add_argument("-m", type=int, default=200, help="Messages per conversation (default: 200)")
+    p = sub.add_parser("store", help="--backend sqlite vs the JSONL path at several conversation sizes")
+    p.add_argument("--sizes", default="10000,1000000,10000000",
+                   help="Comma-separated messages per conversation (default: 10000,1000000,10000000)")
+    p = sub.add_parser("tokens", help="--max-tokens estimator accuracy and speed against reference tokenizers")
+    p.add_argument("-n", type=int, default=20_000, help="Transcript lines (default: 20000)")
+    p.add_argument("--tokenizer", metavar="FILE", help="Also compare against a Hugging Face tokenizer.json")
+    args = parser.parse_args()
+
+    if args.command == "dates":
+        bench_dates(args.n)
+    elif args.command == "json":
+        bench_json(args.n)
+    elif args.command == "lookup":
+        bench_lookup(args.n)
+    elif args.command == "batch":
+        bench_batch(args.n, args.m)
+    elif args.command == "store":
+        bench_store([int(n) for n in args.sizes.split(",")])
+    elif args.command == "tokens":
+        bench_tokens(args.n, args.tokenizer)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Thin client for the warm quick_export daemon: same flags, answered over a Unix socket.
+
+Usage:
+    python scripts/quick_export.py --serve &                  # start the daemon once
+    python scripts/export_client.py "John Doe" --hours 48     # any quick_export.py flags
+    python scripts/export_client.py --recent 10               # answered from memory
+
+Requests and replies are JSON lines. Without a daemon listening, for
+LOCAL_FLAGS, and whenever the daemon answers {"local": true} (the command
+would sync), it runs quick_export.py itself with the same arguments.
+"""
+import json
+import os
+import socket
+import sys
+
+# Must match DAEMON_SOCKET in quick_export.py
+REPO_ROOT = "/Users/satoshi/data/imsg-ingest"
+DAEMON_SOCKET = os.path.join(REPO_ROOT, "data/quick-export.sock")
+
+# Flags quick_export.py has to handle in this process; must match DAEMON_LOCAL_FLAGS
+LOCAL_FLAGS = ("--follow", "--serve", "--processes", "--migrate", "--compact")
+
+
+def run_local(argv: list) -> None:
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "quick_export.py")
+    os.execv(sys.executable, [sys.executable, script] + argv)
+
+
+def main():
+    argv = sys.argv[1:]
+    if any(flag in argv for flag in LOCAL_FLAGS):
+        run_local(argv)
+    try:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(DAEMON_SOCKET)
+    except OSError:
+        run_local(argv)
+
+    sock.sendall(json.dumps({'argv': argv, 'cwd': os.getcwd()}).encode() + b"\n")
+    code = 1  # Daemon died mid-request
+    pending = b""
+    while True:
+        chunk = sock.recv(256 * 1024)
+        if not chunk:
+            break
+        *lines, pending = (pending + chunk).split(b"\n")
+        for line in lines:
+            msg = json.loads(line)
+            if 'stdout' in msg:
+                sys.stdout.write(msg['stdout'])
+            elif 'stderr' in msg:
+                sys.stderr.write(msg['stderr'])
+                sys.stderr.flush()
+            elif 'local' in msg:
+                sock.close()
+                run_local(argv)
+            elif 'exit' in msg:
+                code = msg['exit']
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,18 +8,195 @@ Usage:
     python scripts/quick_export.py "+14155551234" | pbcopy  # clipboard
     python scripts/quick_export.py "+14155551234" | quick-view # browser
     python scripts/quick_export.py "+14155551234" --save    # exports/{id}_{date}.md
+    python scripts/quick_export.py "+14155551234" --max-staleness 1h  # reuse a sync < 1h old
+    python scripts/quick_export.py "+14155551234" --sync-timeout 5s   # cap time spent waiting on sync
+    python scripts/quick_export.py "+14155551234" --chat-db /tmp/chat.db  # sync from another chat.db
+    python scripts/quick_export.py --recent 10                 # most recently active conversations
+    python scripts/quick_export.py "John Doe" "+14155559876"   # several chats, one sync, one output
+    python scripts/quick_export.py --all-active --hours 12     # every chat active in the last 12h
+    python scripts/quick_export.py "John Doe" --follow         # keep printing new messages
+    python scripts/quick_export.py "John Doe" --hours 168 --max-tokens 4000  # newest messages that fit
+    python scripts/quick_export.py "John Doe" --around 27451181 --context 5  # a search.py hit (byte offset) in context
+    python scripts/quick_export.py "John Doe" --around id:48213  # same, by message id (chat.db ROWID)
+    python scripts/quick_export.py --migrate                   # load data/messages.db for --backend sqlite
+    python scripts/quick_export.py "John Doe" --compact        # drop duplicate lines from a JSONL, sorted by date
+    python scripts/quick_export.py "John Doe" --backend sqlite # window from one indexed range scan
+    python scripts/quick_export.py --serve                     # warm daemon for export_client.py
 """
+import fcntl
+import io
 import json
-import subprocess
+import mmap
+import os
+import re
+import select
+import socket
+import sqlite3
 import sys
-from datetime import datetime, timedelta, timezone
+import threading
+import time
+import traceback
+import zlib
+from array import array
+from bisect import bisect_right
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import redirect_stderr, redirect_stdout
+from functools import partial
+from itertools import chain, islice
+from datetime import date, datetime, timezone
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, TextIO, Tuple, Union
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Paths relative to imsg-ingest repo
 REPO_ROOT = Path("/Users/satoshi/data/imsg-ingest")
 CONVERSATIONS_DIR = REPO_ROOT / "data/conversations"
 EXPORTS_DIR = REPO_ROOT / "exports"
+SYNC_LOG = REPO_ROOT / "data/sync-log.jsonl"
+
+# When quick_export last synced each conversation from chat.db, by store_name()
+SYNC_TIMES = REPO_ROOT / "data/sync-times.json"
+
+# Unix socket the --serve daemon listens on (export_client.py has a copy)
+DAEMON_SOCKET = REPO_ROOT / "data/quick-export.sock"
+
+# Optional SQLite copy of every conversation (--backend sqlite, --migrate)
+MESSAGE_STORE = REPO_ROOT / "data/messages.db"
+
+# Per-conversation size, message count and last message time
+ACTIVITY_INDEX = REPO_ROOT / "data/activity-index.json"
+
+# Identifier -> conversation lookup index, its trigram postings, and the
+# contact names it was built from. Kept outside data/conversations so
+# writing them doesn't bump the directory mtime the index is validated against.
+LOOKUP_INDEX = REPO_ROOT / "data/lookup-index.tsv"
+LOOKUP_GRAMS = REPO_ROOT / "data/lookup-grams.bin"
+LOOKUP_NAMES = REPO_ROOT / "data/lookup-names.json"
+
+# Source database, opened read-only
+CHAT_DB = Path.home() / "Library/Messages/chat.db"
+
+# chat.db dates count from 2001-01-01 UTC
+APPLE_EPOCH = 978307200
+
+CHAT_MESSAGES_SQL = """
+SELECT m.ROWID, m.date, m.text, m.attributedBody, m.is_from_me, h.id
+FROM chat c
+JOIN chat_message_join cmj ON cmj.chat_id = c.ROWID
+JOIN message m ON m.ROWID = cmj.message_id
+LEFT JOIN handle h ON h.ROWID = m.handle_id
+WHERE c.chat_identifier = ? AND m.ROWID > ?
+ORDER BY m.ROWID
+"""
+
+# Top-level `"date": "..."` on a raw JSONL line; read without decoding the line
+DATE_RE = re.compile(rb'"date"\s*:\s*"([^"]*)"')
+
+# Messages held back to find the contact's display name for the header
+NAME_LOOKAHEAD = 1000
+
+# Lines read back from a JSONL's end for the newest chat.db ROWID it holds (see chat_watermark())
+WATERMARK_LOOKBACK = 1000
+
+# Skip the sync when the last sync is this recent
+DEFAULT_MAX_STALENESS = "5m"
+
+# Stop waiting for the sync after this long and export from cache
+DEFAULT_SYNC_TIMEOUT = "30s"
+
+# Threads reading conversations in a batch export
+BATCH_WORKERS = 8
+
+# Work items per worker process; fewer, larger chunks cut pickling round trips
+CHUNKS_PER_PROCESS = 4
+
+# Seconds between wakes in --follow: stat polls without kqueue/inotify, and sync checks
+FOLLOW_INTERVAL = 1.0
+
+# inotify event mask (linux/inotify.h): writes, plus the file being replaced
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+
+# --max-tokens estimate per transcript line: LINE_TOKENS + UTF-8 bytes / BYTES_PER_TOKEN,
+# fit against cl100k_base and Claude's tokenizer on chat transcripts (benchmark.py tokens)
+LINE_TOKENS = 6
+BYTES_PER_TOKEN = 4.5
+
+# Written under the header when --max-tokens leaves older messages out
+ELISION_MARKER = "[… older messages omitted to fit {max_tokens} tokens …]"
+
+# Messages shown either side of the --around message (default for --context)
+AROUND_CONTEXT = 10
+
+# Message keys remembered while dropping repeats from an export (see dedup())
+DEDUP_WINDOW = 100_000
+
+# Conversations whose recent window the --serve daemon keeps in memory
+WARM_WINDOWS = 256
+
+# Flags export_client.py runs locally instead of sending to the daemon: long-running, writing
+# or forking work that would hold up every other client
+DAEMON_LOCAL_FLAGS = ("--follow", "--serve", "--processes", "--migrate", "--compact")
+
+# Read size for the backwards tail scan
+BLOCK_SIZE = 64 * 1024
+
+# Column cache files: fixed-width columns as (name, array typecode); text and flags go alongside
+COLUMNS = (("ts", "q"), ("max_ts", "q"), ("offset", "q"), ("text_end", "q"), ("sender", "i"), ("id", "q"),
+           ("utc_offset", "i"))
+COLUMNS_VERSION = 4
+
+# The id column's value for a line without a message id
+NO_ID = -1 << 63
+
+# Message store tables; the primary key covers window queries, so they never touch another b-tree
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    tail_crc INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    conversation INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    byte_offset INTEGER NOT NULL,
+    utc_offset INTEGER NOT NULL,
+    id INTEGER,
+    direction INTEGER NOT NULL,
+    sender TEXT,
+    text TEXT,
+    PRIMARY KEY (conversation, ts, byte_offset)
+) WITHOUT ROWID;
+"""
+STORE_VERSION = 4
+LOOKUP_VERSION = 1
+ACTIVITY_VERSION = 1
+
+# Fuzzy matches below this quality are dropped; recency adds up to RECENCY_WEIGHT
+FUZZY_MIN_QUALITY = 0.25
+RECENCY_WEIGHT = 0.1
+FUZZY_ALTERNATIVES = 4
+
+
+# In-memory caches; set only inside the --serve daemon
+WARM: Optional["WarmCache"] = None
+
+# Message store behind --backend sqlite; None reads the JSONL files
+STORE: Optional["MessageStore"] = None
 
 
 def parse_date(d: str) -> datetime:
@@ -30,85 +207,1993 @@ def parse_date(d: str) -> datetime:
     return datetime.fromisoformat(d)
 
 
-def sync_messages():
-    """Quick sync to get latest messages."""
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_HOUR_CACHE: Dict[str, int] = {}
+
+
+def parse_ts(d: str) -> int:
+    """Epoch seconds for an export timestamp, without building datetimes.
+
+    Fast path for `YYYY-MM-DDTHH:MM:SS[.ffffff]` followed by nothing, `Z`,
+    `+00:00`, `+00:00Z` or a `±HH:MM` offset; anything else goes through
+    parse_date(). Epoch hours are cached per `YYYY-MM-DDTHH` prefix.
+    """
+    try:
+        hour = _HOUR_CACHE.get(d[:13])
+        if hour is None:
+            if d[4] != '-' or d[7] != '-':
+                raise ValueError(d)
+            days = date(int(d[:4]), int(d[5:7]), int(d[8:10])).toordinal() - _EPOCH_ORDINAL
+            hour = _HOUR_CACHE[d[:13]] = days * 86400 + int(d[11:13]) * 3600
+        if d[13] != ':' or d[16] != ':':
+            raise ValueError(d)
+        ts = hour + int(d[14:16]) * 60 + int(d[17:19])
+        tz = d[19:]
+        if tz and tz[0] == '.':
+            tz = tz.lstrip('.0123456789')
+        if not tz or tz == 'Z' or tz == '+00:00' or tz == '+00:00Z':
+            return ts
+        if len(tz) == 6 and tz[3] == ':' and tz[0] in '+-':
+            offset = int(tz[1:3]) * 3600 + int(tz[4:6]) * 60
+            return ts - offset if tz[0] == '+' else ts + offset
+    except (IndexError, ValueError):
+        pass
+    return int(parse_date(d).timestamp())
+
+
+def utc_offset(d: str) -> int:
+    """Seconds east of UTC of an export timestamp, or of a bare `±HH:MM` suffix.
+
+    A `Z` after an offset (`+05:30Z`) is dropped first, as parse_date() does.
+    """
+    zulu = d.endswith('Z')
+    if zulu:
+        d = d[:-1]
+    tz = d[-6:]
+    if len(tz) == 6 and tz[3] == ':' and tz[0] in '+-' and tz[1:3].isdigit() and tz[4:6].isdigit():
+        offset = int(tz[1:3]) * 3600 + int(tz[4:6]) * 60
+        return offset if tz[0] == '+' else -offset
+    if not d or zulu or len(d) == 19:
+        return 0
+    try:
+        return int(parse_date(d).utcoffset().total_seconds())
+    except (AttributeError, ValueError):
+        return 0
+
+
+def day_of(ts: int) -> str:
+    """`YYYY-MM-DD` of epoch seconds, already shifted to the wall clock wanted."""
+    return date.fromordinal(_EPOCH_ORDINAL + ts // 86400).isoformat()
+
+
+def offset_suffix(offset: int) -> str:
+    """The `±HH:MM` suffix for seconds east of UTC; empty for UTC itself."""
+    if not offset:
+        return ""
+    hours, minutes = divmod(abs(offset) // 60, 60)
+    return f"{'-' if offset < 0 else '+'}{hours:02d}:{minutes:02d}"
+
+
+_CLOCK = [f"{h:02d}:{m:02d}" for h in range(24) for m in range(60)]
+
+
+def format_time(ts: int) -> str:
+    """HH:MM for an epoch timestamp; add utc_offset() first for the stamp's own wall clock."""
+    return _CLOCK[ts // 60 % 1440]
+
+
+if msgspec is not None:
+    JSON_BACKEND = "msgspec"
+
+    class Message(msgspec.Struct):
+        """The fields quick_export reads; everything else on the line is skipped."""
+        date: str
+        text: Optional[str] = None
+        is_from_me: Optional[bool] = False
+        sender_username: Optional[str] = None
+        id: Optional[int] = None
+
+    _message_decoder = msgspec.json.Decoder(Message)
+
+    def decode_message(line: bytes) -> Message:
+        """Decode one JSONL line (bytes) into a Message."""
+        try:
+            return _message_decoder.decode(line)
+        except msgspec.ValidationError:
+            # Unexpected field types: take the permissive stdlib path
+            return message_from_dict(json.loads(line))
+else:
+    JSON_BACKEND = "orjson" if orjson is not None else "json"
+    _loads = orjson.loads if orjson is not None else json.loads
+
+    class Message(NamedTuple):
+        """The fields quick_export reads; everything else on the line is dropped."""
+        date: str
+        text: Optional[str] = None
+        is_from_me: Optional[bool] = False
+        sender_username: Optional[str] = None
+        id: Optional[int] = None
+
+    def decode_message(line: bytes) -> Message:
+        """Decode one JSONL line (bytes) into a Message."""
+        return message_from_dict(_loads(line))
+
+
+def message_from_dict(d: dict) -> Message:
+    return Message(d['date'], d.get('text'), d.get('is_from_me', False), d.get('sender_username'), d.get('id'))
+
+
+def line_ts(line: bytes) -> Optional[int]:
+    """Timestamp of a raw JSONL line, read without decoding the JSON.
+
+    Returns None when `"date"` appears more than once (e.g. a nested reply
+    also carries one), so callers fall back to a full decode.
+    """
+    if line.count(b'"date"') != 1:
+        return None
+    match = DATE_RE.search(line)
+    if match is None:
+        return None
+    return parse_ts(match.group(1).decode())
+
+
+def filter_lines(lines: Iterable[bytes], cutoff_ts: int) -> Iterator[tuple]:
+    """Yield (ts, message) for lines newer than cutoff_ts.
+
+    The date is checked on the raw bytes first, so out-of-window lines are
+    never JSON-decoded.
+    """
+    for line in lines:
+        if not line.strip():
+            continue
+        ts = line_ts(line)
+        if ts is None:
+            m = decode_message(line)
+            ts = parse_ts(m.date)
+            if ts > cutoff_ts:
+                yield ts, m
+        elif ts > cutoff_ts:
+            yield ts, decode_message(line)
+
+
+class RecentKeys:
+    """The last `size` message keys seen: a set for lookups, a queue to forget the oldest."""
+
+    def __init__(self, size: int = DEDUP_WINDOW):
+        self.size = size
+        self.keys = set()
+        self.order = deque()
+
+
+def message_key(ts: int, m: Message) -> int:
+    """What makes a message a repeat: its id, else a hash of its date and text."""
+    return m.id if m.id is not None else hash((ts, m.text))
+
+
+def dedup(pairs: Iterable[tuple], seen: Optional[RecentKeys] = None) -> Iterator[tuple]:
+    """Drop (ts, message) pairs repeating one of the last DEDUP_WINDOW passed through.
+
+    Repeated backfills and interrupted syncs can append a message to the
+    JSONL again; the first copy read is kept. A repeat further back than
+    the window slips through, which --compact clears for good when the
+    message has an id.
+    """
+    seen = RecentKeys() if seen is None else seen
+    keys, order, size = seen.keys, seen.order, seen.size
+    add, remember, forget = keys.add, order.append, order.popleft
+    for pair in pairs:
+        ts, m = pair
+        key = message_key(ts, m)
+        if key in keys:
+            continue
+        add(key)
+        remember(key)
+        if len(keys) > size:
+            keys.discard(forget())
+        yield pair
+
+
+def iter_lines_reverse(path: Path, block_size: int = BLOCK_SIZE,
+                       end: Optional[int] = None) -> Iterator[Tuple[int, bytes]]:
+    """Yield (offset, line) for non-empty lines from end (default EOF) backwards, newest first."""
+    with open(path, 'rb') as f:
+        pos = f.seek(0, os.SEEK_END) if end is None else end
+        tail = b''
+        while pos > 0:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            buf = f.read(step) + tail
+            lines = buf.split(b'\n')
+            # First piece may be cut mid-line; finish it with the next block
+            tail = lines[0]
+            start = pos + len(buf) + 1
+            for line in reversed(lines[1:]):
+                start -= len(line) + 1
+                if line.strip():
+                    yield start, line
+        if tail.strip():
+            yield 0, tail
+
+
+def find_window_start(path: Path, cutoff_ts: int) -> int:
+    """Byte offset of the oldest message newer than cutoff_ts, scanning back from EOF.
+
+    Files are append-only and chronological, so the scan stops at the
+    first message at or before the cutoff. Only dates are read.
+    """
+    start = path.stat().st_size
+    for offset, line in iter_lines_reverse(path):
+        ts = line_ts(line)
+        if ts is None:
+            ts = parse_ts(decode_message(line).date)
+        if ts <= cutoff_ts:
+            break
+        start = offset
+    return start
+
+
+def columns_path(jsonl_path: Path) -> Path:
+    """Column cache directory for a conversation."""
+    return jsonl_path.with_name(jsonl_path.name + ".cols")
+
+
+def tail_crc(f, size: int) -> int:
+    """Checksum of the bytes just before size, to spot rewritten files."""
+    start = max(0, size - 64)
+    f.seek(start)
+    return zlib.crc32(f.read(size - start))
+
+
+def _write_json_atomic(path: Path, obj) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(obj, separators=(',', ':')))
+    os.replace(tmp, path)
+
+
+def _map_column(path: Path, typecode: str, count: int) -> memoryview:
+    """The first count items of a column file, mapped read-only."""
+    if count == 0:
+        return memoryview(array(typecode))
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    size = count * array(typecode).itemsize
+    if len(mm) < size:
+        raise ValueError(f"{path} is shorter than its committed length")
+    return memoryview(mm)[:size].cast(typecode)
+
+
+def _append_column(path: Path, committed: int, data: bytes) -> None:
+    """Write data at offset `committed`, dropping any unfinished earlier append past it.
+
+    The file never shrinks below `committed`: readers (and the --serve
+    daemon's warm caches) may have that much mapped, and touching a
+    mapped page that a truncate cut off raises SIGBUS.
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o666)
+    try:
+        view = memoryview(data)
+        offset = committed
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view, offset = view[written:], offset + written
+        if os.fstat(fd).st_size > offset:
+            os.ftruncate(fd, offset)
+    finally:
+        os.close(fd)
+
+
+class ColumnCache:
+    """A conversation's parsed messages, memory-mapped from column files beside its JSONL.
+
+    {name}.jsonl.cols/ holds one append-only file per column: timestamps,
+    their running maxima (sorted even when a backfill appends older
+    messages, so the window start is a bisect), each line's offset in the
+    JSONL, text end offsets into one UTF-8 blob, sender ids into
+    meta.json's table, message ids, UTC offsets and a bitmap of is_from_me flags. meta.json is
+    replaced last and its counts are authoritative, so readers never see
+    half an append. A rebuild writes a new generation of files, leaving
+    open maps of the old one intact.
+    """
+
+    def __init__(self, directory: Path, meta: dict):
+        self.meta = meta
+        self.size = meta['size']
+        self.count = count = meta['count']
+        gen = meta['generation']
+        columns = {name: _map_column(directory / f"{name}.{gen}", typecode, count) for name, typecode in COLUMNS}
+        self.ts = columns['ts']
+        self.max_ts = columns['max_ts']
+        self.offset = columns['offset']
+        self.text_end = columns['text_end']
+        self.sender = columns['sender']
+        self.id = columns['id']
+        self.utc_offset = columns['utc_offset']
+        self.text = _map_column(directory / f"text.{gen}", 'B', meta['text_size'])
+        self.is_from_me = _map_column(directory / f"is_from_me.{gen}", 'B', (count + 7) // 8)
+        self.senders = meta['senders']
+
+    @classmethod
+    def open(cls, jsonl_path: Path) -> Optional['ColumnCache']:
+        directory = columns_path(jsonl_path)
+        try:
+            meta = json.loads((directory / "meta.json").read_bytes())
+            if meta.get('version') != COLUMNS_VERSION:
+                return None
+            return cls(directory, meta)
+        except (OSError, ValueError):
+            return None
+
+    def current(self, st: os.stat_result) -> bool:
+        """Whether the cache covers the JSONL as stat()ed, judged by size and mtime."""
+        return self.meta['size'] == st.st_size and self.meta['mtime_ns'] == st.st_mtime_ns
+
+    def window(self, cutoff_ts: int) -> Iterator[tuple]:
+        """(ts, message) pairs newer than cutoff_ts."""
+        return self.messages(bisect_right(self.max_ts, cutoff_ts), cutoff_ts)
+
+    def messages(self, start: int, cutoff_ts: int) -> Iterator[tuple]:
+        """(ts, message) pairs from row start on, newer than cutoff_ts. Only the text is decoded."""
+        ts, text_end, sender, ids, offsets, text, flags, senders = (
+            self.ts, self.text_end, self.sender, self.id, self.utc_offset, self.text, self.is_from_me, self.senders)
+        prev = text_end[start - 1] if start else 0
+        for i in range(start, self.count):
+            end = text_end[i]
+            if ts[i] > cutoff_ts:
+                s = sender[i]
+                msg_id, off = ids[i], offsets[i]
+                # date is only read for ts and its UTC offset, so a bare `±HH:MM` suffix stands in for it
+                yield ts[i], Message(offset_suffix(off) if off else "", str(text[prev:end], 'utf-8') or None,
+                                     bool(flags[i >> 3] >> (i & 7) & 1), senders[s] if s >= 0 else None,
+                                     None if msg_id == NO_ID else msg_id)
+            prev = end
+
+
+def update_columns(jsonl_path: Path) -> ColumnCache:
+    """Append lines added since the column cache was written, or rebuild it if the JSONL was rewritten.
+
+    Writers take an flock on the cache directory, so concurrent exports
+    append each line once.
+    """
+    directory = columns_path(jsonl_path)
+    directory.mkdir(exist_ok=True)
+    with open(directory / "lock", 'wb') as lock, open(jsonl_path, 'rb') as f:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        st = os.fstat(f.fileno())
+        cache = ColumnCache.open(jsonl_path)
+        if cache is not None and cache.current(st):
+            return cache  # Another writer just brought it up to date
+        if cache is not None and st.st_size >= cache.size and tail_crc(f, cache.size) == cache.meta['tail_crc']:
+            meta = cache.meta
+        else:
+            meta = {'version': COLUMNS_VERSION, 'generation': time.time_ns(), 'size': 0, 'count': 0,
+                    'text_size': 0, 'max_ts': 0, 'senders': []}
+
+        columns = {name: array(typecode) for name, typecode in COLUMNS}
+        texts, flags = [], []
+        senders = list(meta['senders'])
+        sender_ids = {s: i for i, s in enumerate(senders)}
+        running, text_size = meta['max_ts'], meta['text_size']
+        pos = meta['size']
+        f.seek(pos)
+        for line in f:
+            if not line.endswith(b'\n'):
+                break  # Partial trailing line, still being written
+            start = pos
+            pos += len(line)
+            if not line.strip():
+                continue
+            m = decode_message(line)
+            ts = parse_ts(m.date)
+            running = max(running, ts)
+            data = (m.text or '').encode()
+            text_size += len(data)
+            texts.append(data)
+            sid = -1
+            if m.sender_username is not None:
+                sid = sender_ids.get(m.sender_username)
+                if sid is None:
+                    sid = sender_ids[m.sender_username] = len(senders)
+                    senders.append(m.sender_username)
+            columns['ts'].append(ts)
+            columns['max_ts'].append(running)
+            columns['offset'].append(start)
+            columns['text_end'].append(text_size)
+            columns['sender'].append(sid)
+            columns['id'].append(NO_ID if m.id is None else m.id)
+            columns['utc_offset'].append(utc_offset(m.date))
+            flags.append(m.is_from_me)
+        crc = tail_crc(f, pos)
+
+        gen, count = meta['generation'], meta['count']
+        for name, typecode in COLUMNS:
+            _append_column(directory / f"{name}.{gen}", count * array(typecode).itemsize, columns[name].tobytes())
+        _append_column(directory / f"text.{gen}", meta['text_size'], b''.join(texts))
+        # The bitmap's last byte may be partly filled; rewrite it in place with the new flags
+        # added (its old bits are unchanged, so a reader mid-update still sees them)
+        flags_path = directory / f"is_from_me.{gen}"
+        full, used = divmod(count, 8)
+        bits = bytearray((used + len(flags) + 7) // 8)
+        if used:
+            with open(flags_path, 'rb') as bf:
+                bf.seek(full)
+                bits[0] = bf.read(1)[0]
+        for j, flag in enumerate(flags, used):
+            if flag:
+                bits[j >> 3] |= 1 << (j & 7)
+        _append_column(flags_path, full, bytes(bits))
+
+        meta = dict(meta, size=pos, mtime_ns=st.st_mtime_ns, tail_crc=crc, count=count + len(flags),
+                    text_size=text_size, max_ts=running, senders=senders)
+        _write_json_atomic(directory / "meta.json", meta)
+        if count == 0:
+            for p in directory.iterdir():
+                if p.suffix != f".{gen}" and p.name not in ("meta.json", "lock"):
+                    p.unlink(missing_ok=True)
+            # The day-bucket index this cache replaced
+            jsonl_path.with_name(jsonl_path.name + ".tsidx").unlink(missing_ok=True)
+        return ColumnCache(directory, meta)
+
+
+def load_columns(jsonl_path: Path) -> ColumnCache:
+    """The conversation's column cache, brought up to date with the JSONL.
+
+    It is valid while the JSONL's size and mtime match meta.json; past
+    that, appended lines are added. The --serve daemon keeps caches
+    mapped instead of re-reading meta.json.
+    """
+    st = jsonl_path.stat()
+    cache = WARM.columns.get(jsonl_path) if WARM is not None else None
+    if cache is None:
+        cache = ColumnCache.open(jsonl_path)
+    if cache is None or not cache.current(st):
+        cache = update_columns(jsonl_path)
+    if WARM is not None:
+        WARM.columns[jsonl_path] = cache
+    return cache
+
+
+def store_name(jsonl_path: Path) -> str:
+    """A conversation's key in the message store: its directory and stem, e.g. "conversations/+14155551234"."""
+    return f"{jsonl_path.parent.name}/{jsonl_path.stem}"
+
+
+class MessageStore:
+    """Optional SQLite copy of the conversations, for --backend sqlite.
+
+    MESSAGE_STORE (WAL mode) holds messages(conversation, ts, byte_offset,
+    utc_offset, id, direction, sender, text), clustered on (conversation, ts, byte_offset):
+    a window is one range scan of that key, which covers every column
+    read. conversations records how many bytes of each JSONL are loaded;
+    a sync inserts only the lines past that offset, and reloads a JSONL
+    whose tail no longer matches. Connections are per thread.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._local = threading.local()
+
+    def connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if conn.execute("PRAGMA user_version").fetchone()[0] != STORE_VERSION:
+                # An older layout; the store only mirrors the JSONL files, so start it over
+                conn.executescript(f"BEGIN IMMEDIATE; DROP TABLE IF EXISTS messages; "
+                                   f"DROP TABLE IF EXISTS conversations; {STORE_SCHEMA} "
+                                   f"PRAGMA user_version = {STORE_VERSION}; COMMIT;")
+            self._local.conn = conn
+        return conn
+
+    def sync(self, jsonl_path: Path) -> Tuple[int, int]:
+        """Load lines appended to jsonl_path since the last sync; returns (conversation id, offset loaded through)."""
+        conn = self.connect()
+        name = store_name(jsonl_path)
+        st = jsonl_path.stat()
+        row = conn.execute("SELECT id, size, mtime_ns FROM conversations WHERE name = ?", (name,)).fetchone()
+        if row is not None and row[1:] == (st.st_size, st.st_mtime_ns):
+            return row[0], row[1]
+
+        conn.execute("BEGIN IMMEDIATE")  # another process may be loading the same lines
+        try:
+            with open(jsonl_path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                row = conn.execute("SELECT id, size, tail_crc FROM conversations WHERE name = ?", (name,)).fetchone()
+                if row is None:
+                    conv = conn.execute("INSERT INTO conversations (name, size, mtime_ns, tail_crc) VALUES (?, 0, 0, 0)",
+                                        (name,)).lastrowid
+                    start = 0
+                else:
+                    conv, start, crc = row
+                    if st.st_size < start or tail_crc(f, start) != crc:
+                        conn.execute("DELETE FROM messages WHERE conversation = ?", (conv,))
+                        start = 0
+                end = [start]
+
+                def rows() -> Iterator[tuple]:
+                    pos = start
+                    f.seek(pos)
+                    for line in f:
+                        if not line.endswith(b'\n'):
+                            break  # Partial trailing line, still being written
+                        offset, pos = pos, pos + len(line)
+                        end[0] = pos
+                        if line.strip():
+                            m = decode_message(line)
+                            yield (conv, parse_ts(m.date), offset, utc_offset(m.date), m.id, int(bool(m.is_from_me)),
+                                   m.sender_username, m.text)
+                conn.executemany("INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows())
+                conn.execute("UPDATE conversations SET size = ?, mtime_ns = ?, tail_crc = ? WHERE id = ?",
+                             (end[0], st.st_mtime_ns, tail_crc(f, end[0]), conv))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return conv, end[0]
+
+    def window(self, jsonl_path: Path, cutoff_ts: int) -> Tuple[Iterator[tuple], int]:
+        """open_window() from the store, after loading any appended lines."""
+        conv, end = self.sync(jsonl_path)
+        rows = self.connect().execute(
+            "SELECT ts, utc_offset, id, direction, sender, text FROM messages WHERE conversation = ? AND ts > ? "
+            "ORDER BY ts, byte_offset", (conv, cutoff_ts))
+        return ((ts, Message(offset_suffix(off), text, bool(direction), sender, msg_id))
+                for ts, off, msg_id, direction, sender, text in rows), end
+
+    def newest(self, jsonl_path: Path, cutoff_ts: int) -> Tuple[Iterator[tuple], int]:
+        """read_newest() from the store: the same range scan, backwards."""
+        conv, end = self.sync(jsonl_path)
+        rows = self.connect().execute(
+            "SELECT ts, utc_offset, id, direction, sender, text FROM messages WHERE conversation = ? AND ts > ? "
+            "ORDER BY ts DESC, byte_offset DESC", (conv, cutoff_ts))
+        return ((ts, Message(offset_suffix(off), text, bool(direction), sender, msg_id))
+                for ts, off, msg_id, direction, sender, text in rows), end
+
+
+def use_backend(backend: str) -> None:
+    """Read windows from the JSONL files ("jsonl") or MESSAGE_STORE ("sqlite").
+
+    Also the initializer of batch worker processes, which don't inherit it.
+    """
+    global STORE
+    if backend != "sqlite":
+        STORE = None
+    elif STORE is None:
+        STORE = MessageStore(MESSAGE_STORE)
+
+
+def migrate_store(paths: List[Path]) -> None:
+    """Load every conversation into MESSAGE_STORE (--migrate); later syncs only add appended lines."""
+    store = MessageStore(MESSAGE_STORE)
+    start = time.time()
+    for path in paths:
+        store.sync(path)
+    conn = store.connect()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    count, = conn.execute("SELECT count(*) FROM messages").fetchone()
+    print(f"{MESSAGE_STORE}: {count:,} messages from {len(paths)} conversations "
+          f"({time.time() - start:.1f}s)", file=sys.stderr)
+
+
+def iter_range(f, start: int, end: Optional[int] = None) -> Iterator[bytes]:
+    """Yield lines of a binary file from start up to (not past) end."""
+    f.seek(start)
+    pos = start
+    for line in f:
+        if end is not None and pos >= end:
+            break
+        pos += len(line)
+        yield line
+
+
+def complete_size(path: Path) -> int:
+    """Offset just past the last newline; later bytes may be a line still being written."""
+    with open(path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - BLOCK_SIZE)
+            f.seek(start)
+            i = f.read(end - start).rfind(b'\n')
+            if i >= 0:
+                return start + i + 1
+            end = start
+    return 0
+
+
+def compact_jsonl(path: Path) -> Tuple[int, int]:
+    """Rewrite a JSONL sorted by date with repeated message ids removed; returns (messages kept, repeats).
+
+    Only an id marks a line as a repeat; lines without one are all kept.
+    Meant for when no sync is running: the file is replaced atomically,
+    and left as it was if it changed while being read. Lines are written
+    back byte for byte; a partial trailing line stays last. The column
+    cache, message store and search index see the rewrite and rebuild.
+    """
+    with open(path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        if st.st_size == 0:
+            return 0, 0
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    with mm:
+        end = mm.rfind(b'\n') + 1
+        seen = set()
+        lines = []
+        repeats = 0
+        changed = False
+        pos = 0
+        while pos < end:
+            line_end = mm.find(b'\n', pos) + 1
+            line = mm[pos:line_end]
+            start, pos = pos, line_end
+            if not line.strip():
+                changed = True
+                continue
+            m = decode_message(line)
+            ts = parse_ts(m.date)
+            if m.id is not None:
+                if m.id in seen:
+                    repeats += 1
+                    continue
+                seen.add(m.id)
+            if lines and ts < lines[-1][0]:
+                changed = True
+            lines.append((ts, start, line_end))
+        if not repeats and not changed:
+            return len(lines), 0
+
+        lines.sort(key=lambda line: line[0])
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, 'wb') as out:
+            for _ts, start, line_end in lines:
+                out.write(mm[start:line_end])
+            out.write(mm[end:])
+            out.flush()
+            os.fsync(out.fileno())
+    os.chmod(tmp, st.st_mode & 0o7777)
+    now = path.stat()
+    if (now.st_size, now.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+        tmp.unlink()
+        raise RuntimeError(f"{path.name} changed while compacting; re-run when no sync is writing")
+    os.replace(tmp, path)
+    return len(lines), repeats
+
+
+def open_window(path: Path, cutoff_ts: int) -> Tuple[Iterator[tuple], int]:
+    """Stream (ts, message) pairs newer than cutoff_ts, bisecting the column cache.
+
+    Returns (messages, end): only complete lines before `end` are read, so a
+    sync appending at the same time never hands us half a line. The --serve
+    daemon answers from its in-memory window instead, and --backend sqlite
+    from the message store.
+    """
+    if STORE is not None:
+        return STORE.window(path, cutoff_ts)
+    if WARM is not None:
+        return WARM.window(path, cutoff_ts)
+    return read_window(path, cutoff_ts)
+
+
+def read_window(path: Path, cutoff_ts: int) -> Tuple[Iterator[tuple], int]:
+    """open_window() from disk."""
+    if not os.access(path.parent, os.W_OK):
+        end = complete_size(path)
+        start = min(find_window_start(path, cutoff_ts), end)
+        return read_range(path, start, end, cutoff_ts), end
+
+    cache = load_columns(path)
+    return cache.window(cutoff_ts), cache.size
+
+
+def read_range(path: Path, start: int, end: int, cutoff_ts: int) -> Iterator[tuple]:
+    with open(path, 'rb') as f:
+        yield from filter_lines(iter_range(f, start, end), cutoff_ts)
+
+
+def read_newest(path: Path, cutoff_ts: int) -> Tuple[Iterator[tuple], int]:
+    """Stream (ts, message) pairs newer than cutoff_ts from EOF backwards, newest first.
+
+    Returns (messages, end) like open_window(). Lines are decoded only as
+    they are consumed, so a caller that stops early never parses the rest.
+    """
+    if STORE is not None:
+        return STORE.newest(path, cutoff_ts)
+    end = complete_size(path)
+
+    def newest() -> Iterator[tuple]:
+        for _offset, line in iter_lines_reverse(path, end=end):
+            ts = line_ts(line)
+            m = None
+            if ts is None:
+                m = decode_message(line)
+                ts = parse_ts(m.date)
+            if ts <= cutoff_ts:
+                return
+            yield ts, m or decode_message(line)
+    return newest(), end
+
+
+def parse_around(value: str) -> Tuple[str, int]:
+    """--around target: ("offset", n) for a byte offset as search.py prints it, ("id", n) for id:n."""
+    kind, _, number = value.rpartition(":")
+    if kind not in ("", "id"):
+        raise ValueError(value)
+    return kind or "offset", int(number)
+
+
+def find_message_id(mm: mmap.mmap, msg_id: int, end: int) -> Optional[int]:
+    """Byte offset of the line with id msg_id among mm[:end], or None.
+
+    Ids grow as messages are appended, so this bisects over line starts,
+    decoding each line it lands on; a file out of order there (a backfill)
+    falls back to one regex scan for the id, wherever it sits on the line.
+    """
+    lo, hi = 0, end
+    while lo < hi:
+        line_start = mm.rfind(b'\n', lo, (lo + hi) // 2) + 1 or lo
+        line_end = mm.find(b'\n', line_start, hi) + 1
+        line = mm[line_start:line_end]
+        line_id = decode_message(line).id if line.strip() else None
+        if line_id is None:
+            break
+        if line_id == msg_id:
+            return line_start
+        if line_id < msg_id:
+            lo = line_end
+        else:
+            hi = line_start
+    # Nested objects (a reply, say) have ids too, so each hit's line is decoded to check
+    for m in re.compile(rb'"id"\s*:\s*%d\b' % msg_id).finditer(mm, 0, end):
+        line_start = mm.rfind(b'\n', 0, m.start()) + 1
+        if decode_message(mm[line_start:mm.find(b'\n', m.end()) + 1]).id == msg_id:
+            return line_start
+    return None
+
+
+def read_around(path: Path, target: Tuple[str, int], context: int) -> Optional[Tuple[List[tuple], int]]:
+    """(pairs, i): the target message and up to `context` either side as (ts, message), pairs[i] the target.
+
+    None if there is no such message. The target is a byte offset anywhere in its line, or a message id (see
+    find_message_id()). Lines are found by scanning for newlines out from
+    the target, so only the lines returned are read, however large the
+    file is. Repeats are dropped as by dedup(); a repeated target is shown
+    as its first copy.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    with mm:
+        end = mm.rfind(b'\n') + 1
+        kind, value = target
+        offset = find_message_id(mm, value, end) if kind == "id" else value
+        if offset is None or not 0 <= offset < end:
+            return None
+        start = mm.rfind(b'\n', 0, offset) + 1
+
+        before = []
+        pos = start
+        while pos > 0 and len(before) < context:
+            line_start = mm.rfind(b'\n', 0, pos - 1) + 1
+            line = mm[line_start:pos]
+            pos = line_start
+            if line.strip():
+                before.append(line)
+        lines = before[::-1]
+        pos = start
+        while pos < end and len(lines) < len(before) + context + 1:
+            line_end = mm.find(b'\n', pos) + 1
+            line = mm[pos:line_end]
+            pos = line_end
+            if line.strip():
+                lines.append(line)
+    messages = [decode_message(line) for line in lines]
+    pairs = [(parse_ts(m.date), m) for m in messages]
+    key = message_key(*pairs[len(before)])
+    pairs = list(dedup(pairs))
+    return pairs, next(i for i, pair in enumerate(pairs) if message_key(*pair) == key)
+
+
+def parse_duration(value: str) -> int:
+    """Seconds for a duration like 90, 90s, 5m, 2h or 1d."""
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    value = value.strip().lower()
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(float(value))
+
+
+def format_age(seconds: float) -> str:
+    """Rough human age: 45s, 12m, 3h, 2d."""
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= size:
+            return f"{int(seconds // size)}{unit}"
+    return f"{int(seconds)}s"
+
+
+def read_sync_times() -> Dict[str, float]:
+    """SYNC_TIMES as {store_name(): epoch seconds}; empty if missing or unreadable."""
+    try:
+        return json.loads(SYNC_TIMES.read_bytes())
+    except (OSError, ValueError):
+        return {}
+
+
+def last_sync_time(jsonl_path: Path) -> float:
+    """When this conversation was last synced from chat.db (when that sync started); 0 if never."""
+    return read_sync_times().get(store_name(jsonl_path), 0.0)
+
+
+def chat_db_written_since(chat_db: Path, ts: float) -> bool:
+    """Whether chat.db or its WAL changed after ts; True when that can't be told."""
+    try:
+        mtimes = [p.stat().st_mtime for p in (chat_db, chat_db.with_name(chat_db.name + "-wal")) if p.exists()]
+    except OSError:
+        return True
+    return not mtimes or max(mtimes) > ts
+
+
+def record_sync(jsonl_paths: List[Path], started: float) -> None:
+    """Note in SYNC_TIMES that these conversations hold every chat.db row as of `started`."""
+    try:
+        with open(SYNC_TIMES.with_name(SYNC_TIMES.name + ".lock"), 'wb') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            times = read_sync_times()
+            times.update((store_name(path), started) for path in jsonl_paths)
+            _write_json_atomic(SYNC_TIMES, times)
+    except OSError:
+        pass
+
+
+def chat_watermark(jsonl_path: Path) -> Optional[int]:
+    """Highest chat.db ROWID already in this conversation's JSONL, from the ids on its last lines.
+
+    The data is the watermark, so quick_export and the full sync never
+    disagree about what is there. The last WATERMARK_LOOKBACK lines are
+    read, in case a backfill appended older rows after newer ones. None if
+    one of them has no id, since rows above a guessed watermark could
+    already be in the file, or if another writer is partway through a
+    line. An empty JSONL starts from 0.
+    """
+    end = complete_size(jsonl_path)
+    if end != jsonl_path.stat().st_size:
+        return None
+    newest = 0
+    for n, (_offset, line) in enumerate(iter_lines_reverse(jsonl_path, end=end)):
+        if n >= WATERMARK_LOOKBACK:
+            break
+        msg_id = decode_message(line).id
+        if not isinstance(msg_id, int):
+            return None
+        newest = max(newest, msg_id)
+    return newest
+
+
+def apple_time(value: Optional[int]) -> int:
+    """Epoch seconds for a chat.db date (seconds or nanoseconds since 2001-01-01)."""
+    value = value or 0
+    if value > 10**11:
+        value //= 10**9
+    return int(value) + APPLE_EPOCH
+
+
+def attributed_body_text(blob: Optional[bytes]) -> Optional[str]:
+    """Plain text from a message.attributedBody typedstream (newer macOS leaves text NULL)."""
+    if not blob or b"NSString" not in blob:
+        return None
+    data = blob.split(b"NSString", 1)[1][5:]
+    if not data:
+        return None
+    if data[0] == 0x81:
+        length, data = int.from_bytes(data[1:3], 'little'), data[3:]
+    else:
+        length, data = data[0], data[1:]
+    return data[:length].decode('utf-8', errors='replace')
+
+
+def known_sender_name(jsonl_path: Path) -> Optional[str]:
+    """Contact name the full sync resolved for this DM, from its latest incoming message."""
+    if jsonl_path.stem.startswith("chat"):
+        return None  # Group: several senders
+    for n, (_offset, line) in enumerate(iter_lines_reverse(jsonl_path)):
+        m = decode_message(line)
+        if not m.is_from_me and m.sender_username:
+            return m.sender_username
+        if n >= 500:
+            break
+    return None
+
+
+def chat_row_line(row: tuple, sender_name: Optional[str] = None) -> str:
+    """A CHAT_MESSAGES_SQL row as a JSONL line, laid out as imessage_export writes it.
+
+    Keys, their order, the UTC ISO date and json.dumps() defaults all match
+    the full sync's lines, so dedup(), --compact and the column cache see
+    the same bytes whichever writer appended a message.
+    """
+    rowid, apple_date, text, body, is_from_me, handle = row
+    record = {
+        'id': rowid,
+        'date': datetime.fromtimestamp(apple_time(apple_date), timezone.utc).isoformat(),
+        'text': text if text is not None else attributed_body_text(body),
+        'is_from_me': bool(is_from_me),
+        'sender_username': None if is_from_me else (sender_name or handle),
+    }
+    return json.dumps(record) + "\n"
+
+
+def append_chat_rows(jsonl_path: Path, rows: list) -> None:
+    """Append chat.db message rows to a conversation's JSONL in one write."""
+    name = known_sender_name(jsonl_path)
+    lines = [chat_row_line(row, name) for row in rows]
+
+    # Never glue our first line onto a half-written one
+    prefix = "\n" if complete_size(jsonl_path) != jsonl_path.stat().st_size else ""
+    with open(jsonl_path, 'a') as f:
+        f.write(prefix + "".join(lines))
+
+
+def sync_chats(jsonl_paths: List[Path], chat_db: Path = CHAT_DB, on_connect=None) -> int:
+    """Append chat.db rows above each conversation's watermark (see chat_watermark()) to its JSONL.
+
+    Reads chat.db in-process through one read-only SQLite connection,
+    querying only the requested chats. Returns the number of messages
+    appended, and records each conversation it brought up to date, even
+    with nothing new, in SYNC_TIMES (see last_sync_time()). Conversations
+    without a reliable watermark are left to the full sync; a RuntimeError
+    names them once the others are appended.
+    """
+    started = time.time()
+    marks = {path: chat_watermark(path) for path in jsonl_paths}
+    refused = [path.stem for path, mark in marks.items() if mark is None]
+    conn = sqlite3.connect(f"{chat_db.as_uri()}?mode=ro", uri=True, timeout=5, check_same_thread=False)
+    if on_connect is not None:
+        on_connect(conn)
+    try:
+        new = [(path, conn.execute(CHAT_MESSAGES_SQL, (path.stem, mark)).fetchall())
+               for path, mark in marks.items() if mark is not None]
+    finally:
+        conn.close()
+
+    appended = 0
+    for path, rows in new:
+        if rows:
+            append_chat_rows(path, rows)
+            appended += len(rows)
+    record_sync([path for path, _rows in new], started)
+    if refused:
+        raise RuntimeError(f"left {', '.join(refused)} to the full sync (no ids on the last lines, "
+                           "or a line still being written)")
+    return appended
+
+
+class RunLocally(Exception):
+    """Raised in the --serve daemon for work it leaves to the client: a sync or a worker pool.
+
+    handle_request() drops the request's output and tells export_client.py
+    to run the command itself, so the daemon stays read-only and a slow
+    sync never holds up other clients.
+    """
+
+
+class SyncJob:
+    """An in-process chat.db sync of one or more conversations on a background thread, with a deadline.
+
+    wait() gives up `timeout` seconds after the sync started and interrupts
+    the chat.db query, and the export carries on from cache. Every outcome
+    is appended to SYNC_LOG.
+    """
+
+    def __init__(self, jsonl_paths: List[Path], timeout: Optional[float] = None,
+                 last_synced: float = 0.0, chat_db: Path = CHAT_DB):
+        if WARM is not None:
+            raise RunLocally("sync")
+        self.jsonl_paths = jsonl_paths
+        self.timeout = timeout
+        self.target = ",".join(p.stem for p in jsonl_paths)
+        self.last_synced = last_synced
+        self.chat_db = chat_db
+        self.outcome: Optional[str] = None
+        self.error: Optional[Exception] = None
+        self.appended = 0
+        self.duration = 0.0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self) -> None:
+        try:
+            self.appended = sync_chats(self.jsonl_paths, self.chat_db, self._connected)
+        except (sqlite3.Error, OSError, RuntimeError) as e:
+            self.error = e
+
+    def _connected(self, conn: sqlite3.Connection) -> None:
+        self._conn = conn
+
+    def _remaining(self) -> Optional[float]:
+        if self.timeout is None:
+            return None
+        return max(0.0, self.started + self.timeout - time.time())
+
+    def done(self) -> bool:
+        """True once wait() would return without blocking."""
+        return self.outcome is not None or not self.thread.is_alive() or self._remaining() == 0
+
+    def wait(self) -> str:
+        """Block until the sync finishes or the deadline passes; returns 'ok', 'failed' or 'timeout'.
+
+        Safe to call from several threads; the first caller settles the outcome.
+        """
+        with self._lock:
+            if self.outcome is None:
+                self._settle()
+        return self.outcome
+
+    def _settle(self) -> None:
+        self.thread.join(self._remaining())
+        if self.thread.is_alive():
+            # Cancel a query stuck on a locked chat.db; an append already under way is short
+            if self._conn is not None:
+                self._conn.interrupt()
+            self.thread.join(0.25)
+            self.outcome = 'timeout'
+            print(f"Sync cancelled after {self.timeout:g}s, exporting from cache", file=sys.stderr)
+        else:
+            self.outcome = 'failed' if self.error else 'ok'
+        self.duration = time.time() - self.started
+        log_sync(self)
+
+    def banner(self) -> Optional[str]:
+        """Markdown warning for transcripts exported without a completed sync."""
+        if self.outcome == 'ok':
+            return None
+        if self.outcome == 'timeout':
+            what = f"Sync cancelled after {self.timeout:g}s"
+        else:
+            what = f"Sync failed ({self.error})"
+        if self.last_synced:
+            age = f"last synced {format_age(self.started - self.last_synced)} ago"
+        else:
+            age = "last sync time unknown"
+        return f"> ⚠️ {what}; newer messages may be missing ({age})."
+
+
+class SkippedSync:
+    """Stands in for a SyncJob when a sync within --max-staleness let this export skip its own.
+
+    chat.db has changed since, so the transcript says how old its data is.
+    """
+
+    outcome = 'skipped'
+
+    def __init__(self, last_synced: float):
+        self.last_synced = last_synced
+
+    def done(self) -> bool:
+        return True
+
+    def wait(self) -> str:
+        return self.outcome
+
+    def banner(self) -> Optional[str]:
+        when = datetime.fromtimestamp(self.last_synced).astimezone().strftime("%Y-%m-%d %H:%M")
+        age = format_age(time.time() - self.last_synced)
+        return f"> ℹ️ Not synced this run; data as of {when} ({age} ago, within --max-staleness)."
+
+
+def log_sync(job: SyncJob) -> None:
+    """Append a sync's duration and outcome to SYNC_LOG for later analysis."""
+    record = {
+        'started_at': datetime.fromtimestamp(job.started).astimezone().isoformat(timespec='seconds'),
+        'target': job.target,
+        'duration_s': round(job.duration, 3),
+        'outcome': job.outcome,
+        'appended': job.appended,
+        'error': str(job.error) if job.error else None,
+    }
+    try:
+        with open(SYNC_LOG, 'a') as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError:
+        pass
+
+
+def sync_messages(jsonl_path: Path, timeout: Optional[float] = None, chat_db: Path = CHAT_DB) -> SyncJob:
+    """Start a quick sync of this conversation from chat.db; call .wait() on the result."""
     print("Syncing latest messages...", file=sys.stderr)
-    subprocess.run(
-        [sys.executable, "-m", "imessage_export.cli", "sync"],
-        capture_output=True,
-        cwd=REPO_ROOT
-    )
+    return SyncJob([jsonl_path], timeout, last_sync_time(jsonl_path), chat_db)
 
 
-def find_jsonl(identifier: str) -> Tuple[Optional[Path], str]:
-    """Find JSONL file for identifier (phone, email, or name). Returns (path, display_name)."""
+def sync_batch(paths: List[Path], max_staleness: float, timeout: Optional[float] = None,
+               chat_db: Path = CHAT_DB) -> Dict[Path, Union[SyncJob, SkippedSync]]:
+    """What stands behind each conversation in a batch: one chat.db sync, a SkippedSync, or nothing.
 
-    # Normalize phone number for matching
-    normalized = identifier.replace(" ", "").replace("-", "").replace("(", "").replace(")", "")
+    Conversations synced since chat.db last changed need nothing; those
+    synced within max_staleness get a SkippedSync; one sync covers the rest.
+    """
+    now = time.time()
+    syncs: Dict[Path, Union[SyncJob, SkippedSync]] = {}
+    stale = []
+    for path in paths:
+        synced = last_sync_time(path)
+        if not chat_db_written_since(chat_db, synced):
+            continue
+        if now - synced <= max_staleness:
+            syncs[path] = SkippedSync(synced)
+        else:
+            stale.append(path)
+    if not stale:
+        print("All conversations synced recently, skipping sync", file=sys.stderr)
+        return syncs
+    print(f"Syncing latest messages ({len(stale)} conversations)...", file=sys.stderr)
+    job = SyncJob(stale, timeout, min(map(last_sync_time, stale)), chat_db)
+    syncs.update(dict.fromkeys(stale, job))
+    return syncs
 
-    for f in CONVERSATIONS_DIR.glob("*.jsonl"):
-        stem = f.stem
-        # Direct match
-        if identifier.lower() == stem.lower():
-            return f, stem
-        if normalized == stem.replace(" ", "").replace("-", ""):
-            return f, stem
-        # Partial match
-        if identifier.lower() in stem.lower():
-            return f, stem
 
-    return None, identifier
+def read_appended(sync: SyncJob, path: Path, offset: int, cutoff_ts: int) -> Iterator[tuple]:
+    """Once the sync exits (or times out), yield messages it appended past offset.
 
+    The generator returns the offset it read through.
+    """
+    sync.wait()
+    end = complete_size(path)
+    if end < offset:
+        print("Conversation was rewritten during sync; re-run to see new messages", file=sys.stderr)
+        return end
+    yield from read_range(path, offset, end, cutoff_ts)
+    return end
 
-def quick_export(identifier: str, hours: int = 24, skip_sync: bool = False) -> Optional[str]:
-    """Sync, filter, and format as markdown."""
 
-    jsonl_path, display_name = find_jsonl(identifier)
-    if not jsonl_path:
-        print(f"No synced data for '{identifier}'", file=sys.stderr)
-        convos = list(CONVERSATIONS_DIR.glob("*.jsonl"))[:10]
-        if convos:
-            print(f"Available: {', '.join(f.stem for f in sorted(convos))}", file=sys.stderr)
+def normalize_phone(value: str) -> Optional[str]:
+    """E.164 form of a phone number (US assumed without a country code), else None."""
+    digits = re.sub(r"[\s\-().]", "", value)
+    if not re.fullmatch(r"\+?\d{7,15}", digits):
         return None
+    if digits.startswith("+"):
+        return digits
+    if len(digits) == 10:
+        return "+1" + digits
+    if len(digits) == 11 and digits.startswith("1"):
+        return "+" + digits
+    return None
 
-    # Sync first (unless skipped)
-    if not skip_sync:
-        sync_messages()
 
-    # Load and filter
-    cutoff = datetime.now(timezone.utc) - timedelta(hours=hours)
-    with open(jsonl_path) as f:
-        msgs = [json.loads(line) for line in f if line.strip()]
+def lookup_keys(stem: str, name: Optional[str]) -> Iterator[str]:
+    """Lowercase keys a conversation can be found by: stem/email, E.164 phone, contact name."""
+    yield stem.lower()
+    phone = normalize_phone(stem)
+    if phone:
+        yield phone
+    if name:
+        yield name.lower()
+
+
+def conversation_stems() -> List[str]:
+    return sorted(e.name[:-6] for e in os.scandir(CONVERSATIONS_DIR) if e.name.endswith(".jsonl") and "\n" not in e.name)
+
+
+class LookupIndex:
+    """Sorted `key<TAB>value` lines after a JSON header line, searched in place.
+
+    Keys are compared as UTF-8 bytes, which sorts them like str, so exact
+    and prefix lookups are a binary search over line boundaries. Nothing
+    is parsed up front; the file is mmapped.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        end = data.find(b"\n")
+        self.header = json.loads(data[:end])
+        self.body = end + 1
+
+    @classmethod
+    def open(cls, path: Path) -> Optional['LookupIndex']:
+        try:
+            with open(path, 'rb') as f:
+                index = cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except (OSError, ValueError):
+            return None
+        return index if index.header.get('version') == LOOKUP_VERSION else None
+
+    def _bisect(self, key: bytes) -> int:
+        """Offset of the first line whose key is >= key."""
+        data, lo, hi = self.data, self.body, len(self.data)
+        while lo < hi:
+            start = data.rfind(b"\n", lo, (lo + hi) // 2) + 1 or lo
+            end = data.find(b"\n", start)
+            if data[start:data.find(b"\t", start, end)] < key:
+                lo = end + 1
+            else:
+                hi = start
+        return lo
+
+    def line_at(self, offset: int) -> Tuple[str, str]:
+        """(key, value) of the line starting at offset."""
+        key, _, value = self.data[offset:self.data.find(b"\n", offset)].decode().partition("\t")
+        return key, value
+
+    def get(self, key: str) -> Optional[str]:
+        offset = self._bisect(key.encode())
+        if offset < len(self.data):
+            found, value = self.line_at(offset)
+            if found == key:
+                return value
+        return None
+
+    def with_prefix(self, prefix: str) -> Iterator[Tuple[int, str, str]]:
+        """(offset, key, value) for every key starting with prefix, in order."""
+        offset = self._bisect(prefix.encode())
+        while offset < len(self.data):
+            key, value = self.line_at(offset)
+            if not key.startswith(prefix):
+                break
+            yield offset, key, value
+            offset = self.data.find(b"\n", offset) + 1
+
+    def lines(self) -> Iterator[Tuple[int, str, str]]:
+        return self.with_prefix("")
+
+
+def write_lookup_index(header: dict, body: bytes) -> LookupIndex:
+    """Write header and sorted `key<TAB>value` lines to LOOKUP_INDEX; returns the index.
+
+    Falls back to an in-memory index when the data dir isn't writable.
+    """
+    data = json.dumps(header, separators=(',', ':')).encode() + b"\n" + body
+    tmp = LOOKUP_INDEX.with_name(LOOKUP_INDEX.name + ".tmp")
+    try:
+        tmp.write_bytes(data)
+        os.replace(tmp, LOOKUP_INDEX)
+    except OSError:
+        pass  # Read-only data dir: still answer this lookup
+    return LookupIndex(data)
+
+
+def _fingerprint(names: Iterable[str]) -> int:
+    return zlib.crc32("\n".join(names).encode())
+
+
+def _grams(s: str) -> set:
+    """Trigrams of s, padded with newlines so word edges count."""
+    p = f"\n{s}\n"
+    return {p[i:i + 3] for i in range(len(p) - 2)}
+
+
+def match_quality(query: str, key: str, shared: Optional[int] = None, query_grams: int = 0) -> float:
+    """How well key matches query: prefix > substring > trigram similarity, in (0, 1].
+
+    Trigram similarity averages the share of the query's trigrams found in
+    the key with their Dice coefficient, so a short query with a typo still
+    matches a longer key. `shared` is the number of trigrams in common, if
+    known; a key then counts as len(key) trigrams, its padded trigram count.
+    """
+    if key.startswith(query):
+        return 0.9 + 0.1 * len(query) / len(key)
+    if query in key:
+        return 0.7 + 0.1 * len(query) / len(key)
+    if shared is None:
+        grams = _grams(query)
+        shared, query_grams = len(grams & _grams(key)), len(grams)
+    return 0.3 * (shared / query_grams + 2 * shared / (query_grams + len(key)))
+
+
+def build_gram_index(index: LookupIndex) -> Tuple[Dict[str, list], array]:
+    """Trigram postings: gram -> [start, count] into one flat array of 4-byte line offsets."""
+    postings: Dict[str, List[int]] = {}
+    for offset, key, _value in index.lines():
+        for g in _grams(key):
+            postings.setdefault(g, []).append(offset)
+    grams, offsets = {}, array('I')
+    for g, key_offsets in postings.items():
+        grams[g] = [len(offsets), len(key_offsets)]
+        offsets.extend(key_offsets)
+    return grams, offsets
+
+
+def gram_postings(index: LookupIndex, grams: Iterable[str]) -> Iterator[array]:
+    """Offsets of the index lines containing each of `grams`, from the trigram sidecar.
+
+    The sidecar is a JSON header line (gram -> [start, count]) followed by
+    the raw offset array, so a lookup parses the header and reads just the
+    postings it needs. It is rebuilt lazily after the lookup index was;
+    exact lookups never touch it.
+    """
+    try:
+        with open(LOOKUP_GRAMS, 'rb') as f:
+            header = json.loads(f.readline())
+            if header.get('built') == index.header['built']:
+                base = f.tell()
+                for g in grams:
+                    span = header['grams'].get(g)
+                    if span:
+                        f.seek(base + span[0] * 4)
+                        offsets = array('I')
+                        offsets.frombytes(f.read(span[1] * 4))
+                        yield offsets
+                return
+    except (OSError, ValueError):
+        pass
+
+    table, offsets = build_gram_index(index)
+    tmp = LOOKUP_GRAMS.with_name(LOOKUP_GRAMS.name + ".tmp")
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(json.dumps({'built': index.header['built'], 'grams': table}, separators=(',', ':')).encode() + b"\n")
+            offsets.tofile(f)
+        os.replace(tmp, LOOKUP_GRAMS)
+    except OSError:
+        pass  # Read-only data dir: rebuilt next time
+    for g in grams:
+        span = table.get(g)
+        if span:
+            yield offsets[span[0]:span[0] + span[1]]
+
+
+def fuzzy_candidates(query: str, index: LookupIndex) -> List[Tuple[float, str, str]]:
+    """(match_quality, key, value) for the index keys that match query.
+
+    Prefix matches are a contiguous run found by binary search. Without
+    any, keys are scored by trigrams shared with the query, counted from
+    the postings of the query's trigrams only.
+    """
+    found = [(match_quality(query, key), key, value) for _, key, value in index.with_prefix(query)]
+    if found or not query:
+        return found
+
+    if len(query) < 3:
+        # Too short for trigrams to say much
+        return [(match_quality(query, key), key, value) for _, key, value in index.lines() if query in key]
+
+    grams = _grams(query)
+    shared: Counter = Counter()
+    for offsets in gram_postings(index, grams):
+        shared.update(offsets)
+    # Similarity is at most 1.5 * shared / len(grams): skip keys that can't reach the minimum
+    need = FUZZY_MIN_QUALITY / 0.6 * len(grams) / 1.5
+    for offset, count in shared.items():
+        if count >= need:
+            key, value = index.line_at(offset)
+            quality = match_quality(query, key, count, len(grams))
+            if quality >= FUZZY_MIN_QUALITY:
+                found.append((quality, key, value))
+    return found
+
+
+def recency(path: Path, now: float) -> float:
+    """1.0 for a conversation active right now, decaying over weeks."""
+    try:
+        age_days = max(0.0, now - path.stat().st_mtime) / 86400
+    except OSError:
+        return 0.0
+    return 1 / (1 + age_days / 7)
+
+
+def build_lookup_index(stems: List[str], mtime: int) -> LookupIndex:
+    """Lookup index over `stems`: lowercase stem/email, E.164 phone and contact name -> stem.
+
+    Contact names already resolved are reused from LOOKUP_NAMES, so only
+    new conversations are read.
+    """
+    try:
+        known = json.loads(LOOKUP_NAMES.read_bytes())
+    except (OSError, ValueError):
+        known = {}
+    names = {stem: known[stem] if stem in known else known_sender_name(CONVERSATIONS_DIR / f"{stem}.jsonl")
+             for stem in stems}
+    try:
+        _write_json_atomic(LOOKUP_NAMES, names)
+    except OSError:
+        pass
+
+    keys: Dict[str, str] = {}
+    for stem, name in names.items():
+        for key in lookup_keys(stem, name):
+            if "\t" not in key and "\n" not in key:
+                keys.setdefault(key, stem)
+    header = {'version': LOOKUP_VERSION, 'mtime': mtime, 'built': time.time(), 'stems': _fingerprint(stems)}
+    return write_lookup_index(header, "".join(f"{k}\t{v}\n" for k, v in sorted(keys.items())).encode())
+
+
+def load_lookup_index() -> Optional[LookupIndex]:
+    """read_lookup_index(), held in memory by the --serve daemon until its directory changes."""
+    if WARM is None:
+        return read_lookup_index()
+    if WARM.lookup is None:
+        WARM.lookup = read_lookup_index()
+    return WARM.lookup
+
+
+def read_lookup_index() -> Optional[LookupIndex]:
+    """Lookup index for CONVERSATIONS_DIR, rebuilt when the set of conversations changes.
+
+    It is validated against the directory's mtime. Sidecar writes bump the
+    mtime too, so a changed mtime over the same conversations only
+    re-stamps the index.
+    """
+    try:
+        mtime = CONVERSATIONS_DIR.stat().st_mtime_ns
+    except OSError:
+        return None
+    index = LookupIndex.open(LOOKUP_INDEX)
+    if index is not None and index.header['mtime'] == mtime:
+        return index
+    stems = conversation_stems()
+    if index is not None and index.header['stems'] == _fingerprint(stems):
+        return write_lookup_index(dict(index.header, mtime=mtime), index.data[index.body:])
+    return build_lookup_index(stems, mtime)
+
+
+def match_conversations(query: str, index: LookupIndex, limit: int = FUZZY_ALTERNATIVES + 1) -> List[Tuple[float, str]]:
+    """Best (score, stem) matches for query: match quality plus a recency bonus, best first."""
+    best: Dict[str, float] = {}
+    for quality, _key, stem in fuzzy_candidates(query, index):
+        best[stem] = max(quality, best.get(stem, 0.0))
+    # Only stat the files that can still make the cut
+    shortlist = sorted(best.items(), key=lambda kv: (-kv[1], kv[0]))[:limit * 4]
+    now = time.time()
+    scored = [(quality + RECENCY_WEIGHT * recency(CONVERSATIONS_DIR / f"{stem}.jsonl", now), stem)
+              for stem, quality in shortlist]
+    scored.sort(key=lambda sm: (-sm[0], sm[1]))
+    return scored[:limit]
+
+
+def find_jsonl(identifier: str, index: Optional[LookupIndex] = None) -> Tuple[Optional[Path], str]:
+    """Find JSONL file for identifier (phone, email, or name). Returns (path, display_name).
+
+    Exact matches come from the lookup index. Otherwise candidates are
+    ranked by match quality and recent activity, and the runners-up are
+    listed on stderr. Pass `index` to resolve several identifiers against
+    one load.
+    """
+    if index is None:
+        index = load_lookup_index()
+    if index is None:
+        return None, identifier
+    query = identifier.lower()
+    phone = normalize_phone(identifier)
+
+    stem = index.get(query) or (phone and index.get(phone))
+    if not stem:
+        matches = match_conversations(query, index)
+        if not matches:
+            return None, identifier
+        stem = matches[0][1]
+        if len(matches) > 1:
+            others = ', '.join(s for _, s in matches[1:])
+            print(f"Matched '{identifier}' to {stem} (also: {others})", file=sys.stderr)
+    return CONVERSATIONS_DIR / f"{stem}.jsonl", stem
+
+
+def scan_activity(path: Path, size: int, entry: Optional[dict] = None) -> dict:
+    """Activity entry for one conversation, extending `entry` by the lines appended since.
+
+    Lines are counted and their dates matched on raw bytes; no JSON is
+    decoded. A file rewritten before the previous scan's end (by a
+    compaction, say) is rescanned from the start.
+    """
+    with open(path, 'rb') as f:
+        if entry and entry['end'] <= size and tail_crc(f, entry['end']) == entry['crc']:
+            end, count, last_ts = entry['end'], entry['count'], entry['last_ts']
+        else:
+            end, count, last_ts = 0, 0, 0
+        f.seek(end)
+        partial = b""
+        while True:
+            block = f.read(BLOCK_SIZE * 16)
+            if not block:
+                break
+            block = partial + block
+            cut = block.rfind(b"\n") + 1
+            block, partial = block[:cut], block[cut:]
+            count += block.count(b"\n") - block.count(b"\n\n")
+            for d in DATE_RE.findall(block):
+                try:
+                    last_ts = max(last_ts, parse_ts(d.decode()))
+                except ValueError:
+                    pass
+            end += cut
+        crc = tail_crc(f, end)
+    return {'size': size, 'mtime': 0, 'end': end, 'count': count, 'last_ts': last_ts, 'crc': crc}
+
+
+def refresh_activity(d: Path, old: Dict[str, dict]) -> Tuple[Dict[str, dict], bool]:
+    """Activity entries for every conversation in d, and whether any changed.
+
+    Only files whose size or mtime moved since `old` are read, and only
+    from where the previous scan stopped.
+    """
+    entries, changed = {}, False
+    try:
+        listing = [e for e in os.scandir(d) if e.name.endswith(".jsonl")]
+    except OSError:
+        listing = []
+    for e in listing:
+        stem = e.name[:-6]
+        try:
+            st = e.stat()
+            entry = old.get(stem)
+            if entry is None or entry['size'] != st.st_size or entry['mtime'] != st.st_mtime_ns:
+                entry = scan_activity(Path(e.path), st.st_size, entry)
+                entry['mtime'] = st.st_mtime_ns
+                changed = True
+        except OSError:
+            continue  # Vanished mid-scan
+        entries[stem] = entry
+    return entries, changed or len(entries) != len(old)
+
+
+def format_activity(stem: str, entry: dict) -> str:
+    when = datetime.fromtimestamp(entry['last_ts'], timezone.utc).strftime("%Y-%m-%d %H:%M")
+    return f"{when}  {entry['count']:>7,} msgs  {stem}"
+
 
-    recent = [m for m in msgs if parse_date(m['date']) > cutoff]
+def load_activity() -> Dict[str, dict]:
+    """Per-conversation {size, mtime, end, count, last_ts, crc}, kept current in ACTIVITY_INDEX.
 
-    if not recent:
-        return f"No messages in last {hours}h with {display_name}"
+    The --serve daemon refreshes its in-memory copy rather than re-reading the file.
+    """
+    if WARM is not None and WARM.activity is not None:
+        index = WARM.activity
+    else:
+        try:
+            index = json.loads(ACTIVITY_INDEX.read_bytes())
+            if index.get('version') != ACTIVITY_VERSION:
+                index = None
+        except (OSError, ValueError):
+            index = None
+    old = index['dirs'].get(CONVERSATIONS_DIR.name, {}) if index else {}
+    entries, changed = refresh_activity(CONVERSATIONS_DIR, old)
+    if WARM is not None:
+        WARM.activity = {'version': ACTIVITY_VERSION, 'dirs': {CONVERSATIONS_DIR.name: entries}}
+    if changed:
+        try:
+            _write_json_atomic(ACTIVITY_INDEX, {'version': ACTIVITY_VERSION, 'dirs': {CONVERSATIONS_DIR.name: entries}})
+        except OSError:
+            pass
+    return entries
+
+
+def recent_conversations(limit: Optional[int] = None) -> List[Tuple[str, dict]]:
+    """(stem, activity) pairs, most recent message first."""
+    ranked = sorted(load_activity().items(), key=lambda se: (-se[1]['last_ts'], se[0]))
+    return ranked[:limit]
+
+
+def format_messages(recent: Iterable[tuple], display_name: str) -> Iterator[str]:
+    """Format (ts, message) pairs as markdown transcript lines."""
+    for ts, m in recent:
+        time_str = format_time(ts + utc_offset(m.date))
+        sender = "you" if m.is_from_me else display_name
+        text = m.text or '[media]'
+        # Handle multiline messages
+        text = text.replace('\n', '\n    ')
+        yield f"[{time_str}] **{sender}**: {text}"
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate LLM tokens in one transcript line, from its UTF-8 length.
+
+    Within a few percent of cl100k_base and Claude's tokenizer summed over
+    a transcript; single lines can be off by more.
+    """
+    size = len(text) if text.isascii() else len(text.encode())
+    return LINE_TOKENS + int(size / BYTES_PER_TOKEN)
+
+
+def fit_tokens(lines: Iterable[str], budget: int) -> Tuple[List[str], bool]:
+    """Take newest-first transcript lines while their estimated tokens fit in budget.
+
+    Returns (lines oldest first, whether older lines were left out). lines
+    is consumed lazily, so nothing past the budget is read or decoded.
+    """
+    kept = []
+    elided = False
+    for line in lines:
+        budget -= estimate_tokens(line)
+        if budget < 0:
+            elided = True
+            break
+        kept.append(line)
+    kept.reverse()
+    return kept, elided
+
+
+def write_transcript(jsonl_path: Path, display_name: str, hours: int, out: TextIO,
+                     sync: Optional[SyncJob] = None, max_tokens: Optional[int] = None) -> int:
+    """Stream the markdown transcript for the last `hours` to out.
+
+    read -> filter -> format -> write runs as one generator pipeline, so
+    memory stays flat no matter how large the window is. Only the first
+    NAME_LOOKAHEAD messages are held back to pick the header name. With a
+    running sync, cached messages are written first and the bytes the
+    sync appended are read once it exits. Returns the byte offset read
+    through, where --follow picks up.
+
+    With max_tokens, only the newest messages that fit are written, read
+    from EOF backwards (see read_newest()), after any sync finishes.
+    """
+    cutoff_ts = int(time.time()) - hours * 3600
+    if max_tokens is not None:
+        return write_newest(jsonl_path, display_name, hours, cutoff_ts, max_tokens, out, sync)
+    cached, offset = open_window(jsonl_path, cutoff_ts)
+    read_through = [offset]
+
+    def read_sync() -> Iterator[tuple]:
+        read_through[0] = yield from read_appended(sync, jsonl_path, offset, cutoff_ts)
+    appended = read_sync() if sync is not None else iter(())
+
+    # Look ahead in cached data first so the header doesn't wait on the sync
+    head = list(islice(cached, NAME_LOOKAHEAD)) or list(islice(appended, NAME_LOOKAHEAD))
+    recent = chain(cached, appended)
+    if not head:
+        out.write(f"No messages in last {hours}h with {display_name}\n")
+        write_banner(sync, out)
+        return read_through[0]
 
     # Try to get a better display name from messages
-    for m in recent:
-        if not m.get('is_from_me') and m.get('sender_username'):
-            display_name = m['sender_username']
+    for _ts, m in head:
+        if not m.is_from_me and m.sender_username:
+            display_name = m.sender_username
             break
 
     # Format as markdown transcript
-    lines = [f"## Chat with {display_name} (last {hours}h)", ""]
-
-    for m in recent:
-        dt = parse_date(m['date'])
-        time_str = dt.strftime("%H:%M")
-        is_from_me = m.get('is_from_me', False)
-        sender = "you" if is_from_me else display_name
-        text = m.get('text', '') or '[media]'
-        # Handle multiline messages
-        text = text.replace('\n', '\n    ')
-        lines.append(f"[{time_str}] **{sender}**: {text}")
+    out.write(f"## Chat with {display_name} (last {hours}h)\n\n")
+
+    for line in format_messages(dedup(chain(head, recent)), display_name):
+        out.write(line)
+        out.write("\n")
+    write_banner(sync, out)
+    return read_through[0]
+
+
+def write_newest(jsonl_path: Path, display_name: str, hours: int, cutoff_ts: int, max_tokens: int,
+                 out: TextIO, sync: Optional[SyncJob] = None) -> int:
+    """write_transcript() for --max-tokens: the newest messages that fit, oldest first."""
+    if sync is not None:
+        sync.wait()  # the newest messages are the ones the sync appends
+    newest, offset = read_newest(jsonl_path, cutoff_ts)
+
+    # Read back only until a message names the other side
+    head = []
+    for ts, m in newest:
+        head.append((ts, m))
+        if not m.is_from_me and m.sender_username:
+            display_name = m.sender_username
+            break
+        if len(head) >= NAME_LOOKAHEAD:
+            break
+    if not head:
+        out.write(f"No messages in last {hours}h with {display_name}\n")
+        write_banner(sync, out)
+        return offset
+
+    header = f"## Chat with {display_name} (last {hours}h)\n\n"
+    marker = ELISION_MARKER.format(max_tokens=max_tokens)
+    budget = max_tokens - estimate_tokens(header) - estimate_tokens(marker)
+    lines, elided = fit_tokens(format_messages(dedup(chain(head, newest)), display_name), budget)
+
+    out.write(header)
+    if elided:
+        out.write(f"{marker}\n")
+    for line in lines:
+        out.write(line)
+        out.write("\n")
+    write_banner(sync, out)
+    return offset
+
+
+def write_around(jsonl_path: Path, display_name: str, target: Tuple[str, int], context: int, out: TextIO) -> bool:
+    """Write the target message and `context` messages either side (see read_around()); False if not found."""
+    found = read_around(jsonl_path, target, context)
+    if found is None:
+        kind, value = target
+        print(f"No message at {'id' if kind == 'id' else 'byte'} {value} with {display_name}", file=sys.stderr)
+        return False
+
+    around, i = found
+    for _ts, m in around:
+        if not m.is_from_me and m.sender_username:
+            display_name = m.sender_username
+            break
+    ts, m = around[i]
+    ts += utc_offset(m.date)
+    when = f"{day_of(ts)} {format_time(ts)}"
+    out.write(f"## Chat with {display_name} around {when}\n\n")
+    for line in format_messages(around, display_name):
+        out.write(line)
+        out.write("\n")
+    return True
+
+
+def render_transcript(jsonl_path: Path, display_name: str, hours: int,
+                      sync: Optional[SyncJob] = None, max_tokens: Optional[int] = None) -> Tuple[str, int]:
+    """(markdown transcript, offset read through), for batch workers (threads or processes)."""
+    buf = io.StringIO()
+    offset = write_transcript(jsonl_path, display_name, hours, buf, sync, max_tokens)
+    return buf.getvalue(), offset
+
+
+def banner_text(sync: Optional[SyncJob]) -> str:
+    """Trailer flagging a transcript exported without a completed sync, else ''."""
+    banner = sync.banner() if sync is not None else None
+    return f"\n{banner}\n" if banner else ""
+
+
+def write_banner(sync: Optional[SyncJob], out: TextIO) -> None:
+    """Flag a transcript exported without a completed sync."""
+    out.write(banner_text(sync))
+
+
+class FileWatcher:
+    """Wakes when any of several files changes: kqueue on macOS, inotify on Linux, else stat polling.
+
+    wait() returns the paths whose inode, size or mtime changed. The
+    event backends only cut latency: stats are compared on every wake
+    either way, so a missed or coalesced event costs one interval at most.
+    """
+
+    def __init__(self, paths: List[Path], interval: float = FOLLOW_INTERVAL):
+        self.interval = interval
+        self.stats = {path: self._stat(path) for path in paths}
+        self._fds: Dict[Path, int] = {}
+        self._kqueue = select.kqueue() if hasattr(select, 'kqueue') else None
+        self._libc = None
+        self._inotify = -1
+        if self._kqueue is None and sys.platform.startswith('linux'):
+            try:
+                import ctypes
+                import ctypes.util
+                self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+                self._inotify = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            except (ImportError, OSError, AttributeError):
+                self._libc = None
+        for path in paths:
+            self._watch(path)
+
+    @staticmethod
+    def _stat(path: Path) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def _watch(self, path: Path) -> None:
+        """(Re-)register path; a replaced file needs a watch on its new inode."""
+        if self._kqueue is not None:
+            old = self._fds.pop(path, None)
+            if old is not None:
+                os.close(old)
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except OSError:
+                return
+            self._fds[path] = fd
+            flags = select.KQ_NOTE_WRITE | select.KQ_NOTE_EXTEND | select.KQ_NOTE_DELETE | select.KQ_NOTE_RENAME
+            self._kqueue.control([select.kevent(fd, select.KQ_FILTER_VNODE,
+                                                select.KQ_EV_ADD | select.KQ_EV_CLEAR, flags)], 0)
+        elif self._inotify >= 0:
+            self._libc.inotify_add_watch(self._inotify, os.fsencode(path),
+                                         IN_MODIFY | IN_ATTRIB | IN_DELETE_SELF | IN_MOVE_SELF)
+
+    def wait(self, timeout: Optional[float] = None) -> List[Path]:
+        """Block until a watched file changes or `timeout` (default: interval) passes."""
+        timeout = self.interval if timeout is None else timeout
+        if self._kqueue is not None:
+            self._kqueue.control(None, max(1, len(self._fds)), timeout)
+        elif self._inotify >= 0:
+            if select.select([self._inotify], [], [], timeout)[0]:
+                try:
+                    os.read(self._inotify, 64 * 1024)  # drain; the stat pass below says what changed
+                except BlockingIOError:
+                    pass
+        else:
+            time.sleep(timeout)
+
+        changed = []
+        for path, old in self.stats.items():
+            new = self._stat(path)
+            if new != old:
+                self.stats[path] = new
+                if new is not None and (old is None or new[0] != old[0]):
+                    self._watch(path)
+                changed.append(path)
+        return changed
 
-    return "\n".join(lines)
+    def close(self) -> None:
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds.clear()
+        if self._kqueue is not None:
+            self._kqueue.close()
+        if self._inotify >= 0:
+            os.close(self._inotify)
+            self._inotify = -1
 
 
-def save_export(content: str, identifier: str) -> Path:
-    """Save to exports/ with timestamp."""
+def follow(paths: List[Path], names: Dict[Path, str], offsets: Dict[Path, int], out: TextIO,
+           chat_db: Optional[Path] = None, sync_timeout: Optional[float] = None) -> None:
+    """Write messages appended to paths as they land, until interrupted.
+
+    Reading starts at each path's offset and only complete lines are read,
+    so a line still being written is picked up on a later wake. With
+    several conversations, a heading marks each switch between them. With
+    `chat_db`, its database and WAL files are watched too, and a change
+    there syncs the conversations in the background. Repeats among the
+    lines followed are dropped (see dedup()).
+    """
+    seen = {path: RecentKeys() for path in paths}
+    db_files = [chat_db, chat_db.with_name(chat_db.name + "-wal")] if chat_db is not None else []
+    watcher = FileWatcher(paths + db_files)
+    names = {path: known_sender_name(path) or name for path, name in names.items()}
+    job: Optional[SyncJob] = None
+    pending = False
+    last = paths[0] if len(paths) == 1 else None
+    try:
+        while True:
+            for path in watcher.wait():
+                if path in db_files:
+                    pending = True
+                    continue
+                try:
+                    end = complete_size(path)
+                except OSError:
+                    continue
+                if end < offsets[path]:
+                    print(f"{path.stem} was rewritten; following from its new end", file=sys.stderr)
+                    offsets[path] = end
+                if end <= offsets[path]:
+                    continue
+                if path != last:
+                    heading = names[path] if names[path] == path.stem else f"{names[path]} ({path.stem})"
+                    out.write(f"\n### {heading}\n")
+                    last = path
+                for line in format_messages(dedup(read_range(path, offsets[path], end, 0), seen[path]), names[path]):
+                    out.write(line)
+                    out.write("\n")
+                out.flush()
+                offsets[path] = end
+
+            if job is not None and job.done():
+                job.wait()
+                job = None
+            if pending and job is None:
+                # A change during a running sync may land after its query; sync again once it's done
+                job = SyncJob(paths, sync_timeout, min(map(last_sync_time, paths)), chat_db)
+                pending = False
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+def quick_export(identifier: str, hours: int = 24, skip_sync: bool = False, save: bool = False,
+                 max_staleness: int = parse_duration(DEFAULT_MAX_STALENESS),
+                 sync_timeout: Optional[int] = parse_duration(DEFAULT_SYNC_TIMEOUT),
+                 chat_db: Path = CHAT_DB, follow_new: bool = False, max_tokens: Optional[int] = None,
+                 around: Optional[Tuple[str, int]] = None, context: int = AROUND_CONTEXT) -> bool:
+    """Sync, filter, and stream markdown to stdout (or exports/ with save).
+
+    With follow_new, keep writing messages as they arrive (see follow()).
+    With max_tokens, keep only the newest messages that fit (see write_newest()).
+    With around, write just that message and its neighbours (see write_around()).
+    """
+
+    jsonl_path, display_name = find_jsonl(identifier)
+    if not jsonl_path:
+        print(f"No synced data for '{identifier}'", file=sys.stderr)
+        recent = recent_conversations(10)
+        if recent:
+            print(f"Available (most recent first): {', '.join(stem for stem, _ in recent)}", file=sys.stderr)
+        return False
+    if around is not None:
+        # The message is on disk already; a sync would only append after it
+        return write_around(jsonl_path, display_name, around, context, sys.stdout)
+
+    # Sync in the background while cached data streams out (unless skipped or fresh enough)
+    sync = None
+    if not skip_sync:
+        synced = last_sync_time(jsonl_path)
+        age = time.time() - synced
+        if not chat_db_written_since(chat_db, synced):
+            print(f"Synced {age:.0f}s ago and chat.db unchanged since, skipping sync", file=sys.stderr)
+        elif age > max_staleness:
+            sync = sync_messages(jsonl_path, sync_timeout, chat_db)
+        else:
+            print(f"Synced {age:.0f}s ago, skipping sync", file=sys.stderr)
+            sync = SkippedSync(synced)
+
+    if save:
+        path = export_path(identifier)
+        with open(path, 'w') as out:
+            write_transcript(jsonl_path, display_name, hours, out, sync, max_tokens)
+        print(f"Saved to {path}", file=sys.stderr)
+    else:
+        offset = write_transcript(jsonl_path, display_name, hours, sys.stdout, sync, max_tokens)
+        if follow_new:
+            sys.stdout.flush()
+            follow([jsonl_path], {jsonl_path: display_name}, {jsonl_path: offset}, sys.stdout,
+                   None if skip_sync else chat_db, sync_timeout)
+    return True
+
+
+def quick_export_batch(identifiers: List[str], hours: int = 24, all_active: bool = False,
+                       skip_sync: bool = False, save: bool = False,
+                       max_staleness: int = parse_duration(DEFAULT_MAX_STALENESS),
+                       sync_timeout: Optional[int] = parse_duration(DEFAULT_SYNC_TIMEOUT),
+                       chat_db: Path = CHAT_DB, workers: int = BATCH_WORKERS, processes: int = 0,
+                       follow_new: bool = False, max_tokens: Optional[int] = None) -> bool:
+    """Export several conversations in one invocation, as markdown sections (or one file each with save).
+
+    Identifiers resolve against one lookup index load; `all_active` adds
+    every conversation with a message in the window, from the activity
+    index. One chat.db sync covers them all, and transcripts are read on a
+    thread pool and written in order. With `processes`, transcripts are
+    formatted in that many worker processes instead, in chunks; the sync
+    finishes first, since it can't be shared across processes. With
+    follow_new, one watcher then follows them all (see follow()).
+    max_tokens applies to each transcript separately.
+    """
+    if processes > 0 and WARM is not None:
+        raise RunLocally("processes")  # No forking from the daemon and its watcher thread
+    targets: Dict[Path, str] = {}
+    if all_active:
+        cutoff = time.time() - hours * 3600
+        targets = {CONVERSATIONS_DIR / f"{stem}.jsonl": stem
+                   for stem, entry in recent_conversations() if entry['last_ts'] >= cutoff}
+    if identifiers:
+        index = load_lookup_index()
+        for identifier in identifiers:
+            path, display_name = find_jsonl(identifier, index)
+            if path is None:
+                print(f"No synced data for '{identifier}'", file=sys.stderr)
+            else:
+                targets.setdefault(path, display_name)
+    if not targets:
+        print(f"No conversations to export (last {hours}h)", file=sys.stderr)
+        return False
+
+    paths = list(targets)
+    syncs = {} if skip_sync else sync_batch(paths, max_staleness, sync_timeout, chat_db)
+
+    names = [targets[path] for path in paths]
+    if processes > 0:
+        for job in set(syncs.values()):
+            job.wait()
+        pool = ProcessPoolExecutor(max_workers=min(processes, len(paths)), initializer=use_backend,
+                                   initargs=("sqlite" if STORE is not None else "jsonl",))
+        chunksize = max(1, len(paths) // (processes * CHUNKS_PER_PROCESS))
+        texts = pool.map(partial(render_transcript, hours=hours, max_tokens=max_tokens), paths, names,
+                         chunksize=chunksize)
+    else:
+        pool = ThreadPoolExecutor(max_workers=min(workers, len(paths)))
+        texts = pool.map(lambda path, name: render_transcript(path, name, hours, syncs.get(path), max_tokens),
+                         paths, names)
+
+    offsets = {}
+    with pool:
+        for i, (path, (text, offset)) in enumerate(zip(paths, texts)):
+            offsets[path] = offset
+            if processes > 0:
+                text += banner_text(syncs.get(path))
+            if save:
+                out_path = export_path(path.stem)
+                out_path.write_text(text)
+                print(f"Saved to {out_path}", file=sys.stderr)
+            else:
+                sys.stdout.write(f"\n{text}" if i else text)
+    if follow_new and not save:
+        sys.stdout.flush()
+        follow(paths, targets, offsets, sys.stdout, None if skip_sync else chat_db, sync_timeout)
+    return True
+
+
+def export_path(identifier: str) -> Path:
+    """Path in exports/ with timestamp."""
     EXPORTS_DIR.mkdir(exist_ok=True)
 
     # Sanitize identifier for filename
@@ -121,27 +2206,282 @@ def save_export(content: str, identifier: str) -> Path:
         time_str = datetime.now().strftime("%H-%M")
         output_path = EXPORTS_DIR / f"{safe_id}_{date_str}_{time_str}.md"
 
-    output_path.write_text(content)
     return output_path
 
 
-def main():
+class WarmWindow:
+    """A conversation's recent messages as the daemon holds them, newer than cutoff_ts up to end."""
+
+    def __init__(self, stat: os.stat_result, cutoff_ts: int, end: int, crc: int, messages: List[tuple]):
+        self.ino = stat.st_ino
+        self.stat = (stat.st_size, stat.st_mtime_ns)
+        self.cutoff_ts = cutoff_ts
+        self.end = end
+        self.crc = crc
+        self.messages = messages
+
+
+class WarmCache:
+    """In-memory state for the --serve daemon.
+
+    Holds the lookup index, activity entries, per-file column caches
+    and the recent window of the last WARM_WINDOWS conversations exported.
+    A FileWatcher thread over CONVERSATIONS_DIR drops the lookup
+    index when conversations come or go. Per-file entries are checked
+    with one stat per request instead: a watcher event can trail an
+    append that the request right behind it must see. Windows of a
+    grown file are extended from where they stopped.
+    """
+
+    def __init__(self, dirs: List[Path]):
+        self.lookup: Optional[LookupIndex] = None
+        self.activity: Optional[dict] = None
+        self.columns: Dict[Path, ColumnCache] = {}
+        self.windows: "OrderedDict[Path, WarmWindow]" = OrderedDict()
+        self.watcher = FileWatcher(dirs)
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    def _watch(self) -> None:
+        while True:
+            if self.watcher.wait():
+                self.lookup = None
+
+    def window(self, path: Path, cutoff_ts: int) -> Tuple[Iterator[tuple], int]:
+        """open_window() from memory, reading only bytes appended since the last request."""
+        st = path.stat()
+        entry = self.windows.pop(path, None)
+        if entry is not None and (entry.ino != st.st_ino or entry.cutoff_ts > cutoff_ts):
+            entry = None
+        if entry is not None and entry.stat != (st.st_size, st.st_mtime_ns):
+            with open(path, 'rb') as f:
+                unchanged = st.st_size >= entry.end and tail_crc(f, entry.end) == entry.crc
+            if unchanged:
+                end = complete_size(path)
+                entry.messages.extend(read_range(path, entry.end, end, entry.cutoff_ts))
+                with open(path, 'rb') as f:
+                    entry.crc = tail_crc(f, end)
+                entry.end, entry.stat = end, (st.st_size, st.st_mtime_ns)
+            else:
+                entry = None
+        if entry is None:
+            messages, end = read_window(path, cutoff_ts)
+            messages = list(messages)
+            with open(path, 'rb') as f:
+                entry = WarmWindow(st, cutoff_ts, end, tail_crc(f, end), messages)
+
+        messages = [tm for tm in entry.messages if tm[0] > cutoff_ts]
+        if cutoff_ts > entry.cutoff_ts:
+            # Forget what has aged out, so an entry kept for days stays the size of its window
+            entry.messages, entry.cutoff_ts = messages[:], cutoff_ts
+        self.windows[path] = entry
+        while len(self.windows) > WARM_WINDOWS:
+            self.windows.popitem(last=False)
+        return iter(messages), entry.end
+
+
+class SocketStream(io.TextIOBase):
+    """Text stream relaying writes to a daemon client as {"<name>": text} JSON lines.
+
+    Writes are buffered, so a request handed back to the client (see
+    RunLocally) can be dropped before anything reached it.
+    """
+
+    def __init__(self, conn: socket.socket, name: str, buffer_size: int = BLOCK_SIZE):
+        self.conn = conn
+        self.name = name
+        self.buffer_size = buffer_size
+        self._parts: List[str] = []
+        self._size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        self._parts.append(s)
+        self._size += len(s)
+        if self._size >= self.buffer_size:
+            self.flush()
+        return len(s)
+
+    def flush(self) -> None:
+        if self._parts:
+            text, self._parts, self._size = "".join(self._parts), [], 0
+            self.conn.sendall(json.dumps({self.name: text}).encode() + b"\n")
+
+    def discard(self) -> None:
+        self._parts, self._size = [], 0
+
+
+def handle_request(conn: socket.socket) -> None:
+    """Run one client's command line against the warm caches, relaying its output and exit code.
+
+    A command that would sync or fork is handed back with {"local": true}
+    instead (see RunLocally).
+    """
+    request = json.loads(conn.makefile('rb').readline())
+    argv = request['argv']
+    out, err = SocketStream(conn, 'stdout'), SocketStream(conn, 'stderr')
+    code = 0
+    with redirect_stdout(out), redirect_stderr(err):
+        try:
+            if any(flag in argv for flag in DAEMON_LOCAL_FLAGS):
+                print(f"{', '.join(DAEMON_LOCAL_FLAGS)} can't run in the daemon", file=sys.stderr)
+                code = 2
+            else:
+                main(argv, Path(request['cwd']) if request.get('cwd') else None)
+        except RunLocally:
+            out.discard()
+            err.discard()
+            conn.sendall(json.dumps({'local': True}).encode() + b"\n")
+            return
+        except SystemExit as e:
+            if isinstance(e.code, str):
+                print(e.code, file=sys.stderr)
+            code = e.code if isinstance(e.code, int) else int(e.code is not None)
+        except Exception:
+            traceback.print_exc()
+            code = 1
+    out.flush()
+    err.flush()
+    conn.sendall(json.dumps({'exit': code}).encode() + b"\n")
+
+
+def serve(socket_path: Path = DAEMON_SOCKET) -> None:
+    """Answer export_client.py requests over a Unix socket, one at a time, until interrupted.
+
+    Requests never sync or fork here (see RunLocally), so each one is a
+    quick read of the warm caches.
+    """
+    global WARM
+    WARM = WarmCache([CONVERSATIONS_DIR])
+    try:
+        socket_path.unlink()
+    except FileNotFoundError:
+        pass
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Created owner-only: a chmod after bind() would leave a moment when anyone could connect
+    umask = os.umask(0o177)
+    try:
+        server.bind(str(socket_path))
+    finally:
+        os.umask(umask)
+    server.listen(16)
+    print(f"Serving quick_export on {socket_path}", file=sys.stderr)
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                try:
+                    handle_request(conn)
+                except (OSError, ValueError, KeyError):
+                    pass  # Client went away or sent garbage
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        try:
+            socket_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def compact(identifiers: List[str]) -> None:
+    """--compact: compact_jsonl() each named conversation, or all of them, reporting the repeats removed."""
+    if identifiers:
+        paths = []
+        for identifier in identifiers:
+            path, _display_name = find_jsonl(identifier)
+            if path is None:
+                print(f"No synced data for '{identifier}'", file=sys.stderr)
+            else:
+                paths.append(path)
+    else:
+        paths = [CONVERSATIONS_DIR / f"{stem}.jsonl" for stem in conversation_stems()]
+    total = 0
+    for path in paths:
+        try:
+            kept, repeats = compact_jsonl(path)
+        except RuntimeError as e:
+            print(e, file=sys.stderr)
+            continue
+        total += repeats
+        if repeats:
+            print(f"{store_name(path)}: removed {repeats:,} duplicates, {kept:,} messages left")
+    print(f"{total:,} duplicates removed across {len(paths)} conversations")
+
+
+def main(argv: Optional[List[str]] = None, cwd: Optional[Path] = None):
+    """Command line entry point; relative paths in argv resolve against cwd (the daemon's client's)."""
     import argparse
     parser = argparse.ArgumentParser(description="Quick export iMessage conversations for AI context")
-    parser.add_argument("identifier", help="Phone number, email, or contact name")
+    parser.add_argument("identifiers", nargs="*", metavar="identifier",
+                        help="Phone number, email, or contact name; several export as one batch")
     parser.add_argument("--hours", type=int, default=24, help="Hours to look back (default: 24)")
     parser.add_argument("--no-sync", action="store_true", help="Skip sync, use cached data")
+    parser.add_argument("--max-staleness", type=parse_duration, default=DEFAULT_MAX_STALENESS,
+                        help=f"Skip sync if synced within this long, e.g. 30s, 5m, 1h (default: {DEFAULT_MAX_STALENESS})")
+    parser.add_argument("--sync-timeout", type=parse_duration, default=DEFAULT_SYNC_TIMEOUT,
+                        help=f"Stop waiting for sync after this long and use cache (default: {DEFAULT_SYNC_TIMEOUT})")
+    parser.add_argument("--chat-db", type=Path, default=CHAT_DB, help="chat.db to sync from (default: ~/Library/Messages/chat.db)")
     parser.add_argument("--save", action="store_true", help="Save to exports/ instead of stdout")
-    args = parser.parse_args()
+    parser.add_argument("--max-tokens", type=int, metavar="N",
+                        help="Keep only the newest messages that fit in about N LLM tokens (per conversation)")
+    parser.add_argument("--around", type=parse_around, metavar="OFFSET|id:N",
+                        help="Show one message and its neighbours instead: a byte offset from search.py, or id:N")
+    parser.add_argument("--context", type=int, default=AROUND_CONTEXT, metavar="N",
+                        help=f"Messages either side of --around (default: {AROUND_CONTEXT})")
+    parser.add_argument("--all-active", action="store_true",
+                        help="Export every conversation with messages in the --hours window")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS,
+                        help=f"Threads reading conversations in a batch (default: {BATCH_WORKERS})")
+    parser.add_argument("--processes", type=int, default=0, metavar="N",
+                        help="Format a batch in N worker processes instead of threads, for thousands of chats")
+    parser.add_argument("--follow", action="store_true",
+                        help="After the export, keep printing new messages (syncing when chat.db changes)")
+    parser.add_argument("--backend", choices=("jsonl", "sqlite"), default="jsonl",
+                        help="Read from the JSONL files or the SQLite message store, data/messages.db (default: jsonl)")
+    parser.add_argument("--migrate", action="store_true",
+                        help="Load every conversation into data/messages.db for --backend sqlite and exit")
+    parser.add_argument("--compact", action="store_true",
+                        help="Rewrite the named conversations (default: all) sorted, without repeated message ids, "
+                             "and exit; run while no sync is writing")
+    parser.add_argument("--serve", action="store_true",
+                        help=f"Run the warm daemon export_client.py talks to, on {DAEMON_SOCKET}")
+    parser.add_argument("--recent", type=int, nargs="?", const=20, metavar="N",
+                        help="List the N most recently active conversations (default: 20) and exit")
+    args = parser.parse_args(argv)
+    args.chat_db = (cwd or Path.cwd()) / args.chat_db
 
-    result = quick_export(args.identifier, args.hours, args.no_sync)
+    if args.serve:
+        serve(DAEMON_SOCKET)
+        return
+    if args.migrate:
+        migrate_store([CONVERSATIONS_DIR / f"{stem}.jsonl" for stem in conversation_stems()])
+        return
+    if args.compact:
+        compact(args.identifiers)
+        return
+    if args.recent is not None:
+        for stem, entry in recent_conversations(args.recent):
+            print(format_activity(stem, entry))
+        return
+    if not args.identifiers and not args.all_active:
+        parser.error("identifier is required unless --all-active, --recent or --migrate is given")
+    if args.follow and args.save:
+        parser.error("--follow writes to stdout; it can't be combined with --save")
+    if args.around is not None and (len(args.identifiers) != 1 or args.all_active or args.save or args.follow
+                                    or args.max_tokens is not None):
+        parser.error("--around takes one identifier; it can't be combined with --all-active, --save, --follow "
+                     "or --max-tokens")
+    use_backend(args.backend)
 
-    if result:
-        if args.save:
-            path = save_export(result, args.identifier)
-            print(f"Saved to {path}", file=sys.stderr)
-        else:
-            print(result)
+    if len(args.identifiers) == 1 and not args.all_active:
+        quick_export(args.identifiers[0], args.hours, args.no_sync, args.save, args.max_staleness,
+                     args.sync_timeout, args.chat_db, args.follow, args.max_tokens, args.around, args.context)
+    else:
+        quick_export_batch(args.identifiers, args.hours, args.all_active, args.no_sync, args.save,
+                           args.max_staleness, args.sync_timeout, args.chat_db, args.workers, args.processes,
+                           args.follow, args.max_tokens)
 
 
 if __name__ == "__main__":
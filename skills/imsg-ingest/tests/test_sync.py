@@ -0,0 +1,171 @@
+"""
+In-process chat.db sync against a fixture database.
+
+Run from the skill directory:
+    python -m unittest discover -s tests
+"""
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import quick_export  # noqa: E402
+
+CHAT = "+14155551234"
+OTHER_CHAT = "+14155559876"
+
+# Wide enough to reach the fixture's 2001 dates
+ALL_HOURS = 24 * 365 * 30
+
+FIXTURE_SCHEMA = """
+CREATE TABLE chat (ROWID INTEGER PRIMARY KEY, chat_identifier TEXT);
+CREATE TABLE handle (ROWID INTEGER PRIMARY KEY, id TEXT);
+CREATE TABLE message (ROWID INTEGER PRIMARY KEY, guid TEXT, date INTEGER, text TEXT, attributedBody BLOB,
+                      is_from_me INTEGER, handle_id INTEGER);
+CREATE TABLE chat_message_join (chat_id INTEGER, message_id INTEGER);
+"""
+
+
+def make_chat_db(path: Path, chats: dict) -> None:
+    """A chat.db holding, for each chat identifier, messages with the given rowids a minute apart."""
+    db = sqlite3.connect(path)
+    db.executescript(FIXTURE_SCHEMA)
+    for chat_id, (chat, rowids) in enumerate(chats.items(), 1):
+        db.execute("INSERT INTO chat VALUES (?, ?)", (chat_id, chat))
+        db.execute("INSERT INTO handle VALUES (?, ?)", (chat_id, chat))
+        for rowid in rowids:
+            db.execute("INSERT INTO message VALUES (?, ?, ?, ?, NULL, ?, ?)",
+                       (rowid, f"g{rowid}", rowid * 60 * 10**9, f"message {rowid}", rowid % 2, chat_id))
+            db.execute("INSERT INTO chat_message_join VALUES (?, ?)", (chat_id, rowid))
+    db.commit()
+    db.close()
+
+
+def jsonl_line(rowid: int, with_id: bool = True) -> str:
+    """The line imessage_export writes for fixture row `rowid` (the contact is Bob)."""
+    is_from_me = bool(rowid % 2)
+    sent = datetime.fromtimestamp(quick_export.APPLE_EPOCH + rowid * 60, timezone.utc)
+    record = {'id': rowid, 'date': sent.isoformat(),
+              'text': f"message {rowid}", 'is_from_me': is_from_me, 'sender_username': None if is_from_me else "Bob"}
+    if not with_id:
+        del record['id']
+    return json.dumps(record) + "\n"
+
+
+class SyncChatsTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        # Every data path quick_export writes, moved under the temporary root
+        for name, value in list(vars(quick_export).items()):
+            if isinstance(value, Path) and quick_export.REPO_ROOT in value.parents:
+                patch = mock.patch.object(quick_export, name, self.root / value.relative_to(quick_export.REPO_ROOT))
+                patch.start()
+                self.addCleanup(patch.stop)
+        quick_export.CONVERSATIONS_DIR.mkdir(parents=True)
+        self.chat_db = self.root / "chat.db"
+        make_chat_db(self.chat_db, {CHAT: range(1, 206), OTHER_CHAT: range(301, 314)})
+        self.jsonl = quick_export.CONVERSATIONS_DIR / f"{CHAT}.jsonl"
+        self.jsonl.write_text("".join(jsonl_line(i) for i in range(1, 201)))
+        self.other = quick_export.CONVERSATIONS_DIR / f"{OTHER_CHAT}.jsonl"
+        self.other.write_text("".join(jsonl_line(i) for i in range(301, 311)))
+
+    def ids(self, jsonl=None):
+        return [json.loads(line)['id'] for line in (jsonl or self.jsonl).read_text().splitlines()]
+
+    def export(self, identifier: str) -> str:
+        out = io.StringIO()
+        with redirect_stdout(out), redirect_stderr(io.StringIO()):
+            quick_export.quick_export(identifier, hours=ALL_HOURS, chat_db=self.chat_db)
+        return out.getvalue()
+
+    def test_watermark_is_newest_id_in_jsonl(self):
+        self.assertEqual(quick_export.chat_watermark(self.jsonl), 200)
+        self.assertEqual(quick_export.sync_chats([self.jsonl], self.chat_db), 5)
+        self.assertEqual(self.ids(), list(range(1, 206)))
+
+    def test_appended_lines_match_full_export(self):
+        quick_export.sync_chats([self.jsonl], self.chat_db)
+        self.assertEqual(self.jsonl.read_text(), "".join(jsonl_line(i) for i in range(1, 206)))
+
+    def test_rerun_appends_nothing(self):
+        quick_export.sync_chats([self.jsonl], self.chat_db)
+        before = self.jsonl.read_bytes()
+        self.assertEqual(quick_export.sync_chats([self.jsonl], self.chat_db), 0)
+        self.assertEqual(self.jsonl.read_bytes(), before)
+
+    def test_backfilled_tail_keeps_newest_watermark(self):
+        with open(self.jsonl, 'a') as f:
+            f.write("".join(jsonl_line(i) for i in range(50, 60)))
+        quick_export.sync_chats([self.jsonl], self.chat_db)
+        self.assertEqual(self.ids()[-5:], list(range(201, 206)))
+        self.assertEqual(len(self.ids()), 215)
+
+    def test_partial_line_tail_is_left_alone(self):
+        with open(self.jsonl, 'a') as f:
+            f.write('{"id": 201, "da')
+        before = self.jsonl.read_bytes()
+        self.assertIsNone(quick_export.chat_watermark(self.jsonl))
+        with self.assertRaises(RuntimeError):
+            quick_export.sync_chats([self.jsonl], self.chat_db)
+        self.assertEqual(self.jsonl.read_bytes(), before)
+
+    def test_lines_without_ids_refuse_to_sync(self):
+        self.jsonl.write_text("".join(jsonl_line(i, with_id=False) for i in range(1, 201)))
+        before = self.jsonl.read_bytes()
+        with self.assertRaises(RuntimeError):
+            quick_export.sync_chats([self.jsonl], self.chat_db)
+        self.assertEqual(self.jsonl.read_bytes(), before)
+
+    def test_sync_of_one_chat_leaves_the_other_stale(self):
+        self.assertIn("message 205", self.export(CHAT))
+        self.assertEqual(quick_export.last_sync_time(self.other), 0.0)
+        self.assertIn("message 313", self.export(OTHER_CHAT))
+        self.assertEqual(self.ids(self.other), list(range(301, 314)))
+
+    def test_sync_with_nothing_new_still_counts(self):
+        quick_export.sync_chats([self.jsonl], self.chat_db)
+        first = quick_export.last_sync_time(self.jsonl)
+        self.assertEqual(quick_export.sync_chats([self.jsonl], self.chat_db), 0)
+        self.assertGreaterEqual(quick_export.last_sync_time(self.jsonl), first)
+        self.assertGreater(first, 0)
+
+    def test_skip_within_max_staleness_is_flagged(self):
+        self.export(CHAT)
+        db = sqlite3.connect(self.chat_db)
+        db.execute("INSERT INTO message VALUES (206, 'g206', ?, 'message 206', NULL, 0, 1)", (206 * 60 * 10**9,))
+        db.execute("INSERT INTO chat_message_join VALUES (1, 206)")
+        db.commit()
+        db.close()
+        later = time.time() + 5
+        os.utime(self.chat_db, (later, later))
+        out = self.export(CHAT)
+        self.assertNotIn("message 206", out)
+        self.assertIn("data as of", out)
+
+    def test_unchanged_chat_db_needs_no_sync_or_banner(self):
+        self.export(CHAT)
+        earlier = time.time() - 60
+        os.utime(self.chat_db, (earlier, earlier))
+        self.assertNotIn("data as of", self.export(CHAT))
+
+    def test_empty_jsonl_syncs_everything(self):
+        self.jsonl.write_text("")
+        self.assertEqual(quick_export.sync_chats([self.jsonl], self.chat_db), 205)
+        self.assertEqual(self.ids(), list(range(1, 206)))
+
+
+if __name__ == "__main__":
+    unittest.main()
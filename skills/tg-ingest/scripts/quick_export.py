@@ -8,18 +8,175 @@ Usage:
     python scripts/quick_export.py klutch_trades | pbcopy     # clipboard
     python scripts/quick_export.py klutch_trades | quick-view # browser
     python scripts/quick_export.py klutch_trades --save       # exports/{user}_{date}.md
+    python scripts/quick_export.py crypto_trenches --hours 2  # group chat (data/groups/)
+    python scripts/quick_export.py klutch_trades --max-staleness 1h  # reuse a sync < 1h old
+    python scripts/quick_export.py klutch_trades --sync-timeout 5s   # cap time spent waiting on sync
+    python scripts/quick_export.py --recent 10                # most recently active DMs and groups
+    python scripts/quick_export.py alice bob crypto_trenches  # several chats, one sync, one output
+    python scripts/quick_export.py --all-active --hours 12    # every chat active in the last 12h
+    python scripts/quick_export.py alice crypto_trenches --follow  # keep printing new messages
+    python scripts/quick_export.py klutch_trades --hours 168 --max-tokens 4000  # newest messages that fit
+    python scripts/quick_export.py alice --around 27451598 --context 5  # a search.py hit (byte offset) in context
+    python scripts/quick_export.py alice --around id:48213    # same, by message id
+    python scripts/quick_export.py --migrate                  # load data/messages.db for --backend sqlite
+    python scripts/quick_export.py alice --compact            # drop duplicate lines from a JSONL, sorted by date
+    python scripts/quick_export.py klutch_trades --backend sqlite  # window from one indexed range scan
+    python scripts/quick_export.py --serve                    # warm daemon for export_client.py
 """
+import fcntl
+import io
 import json
+import mmap
+import os
+import re
+import select
+import socket
+import sqlite3
 import subprocess
 import sys
-from datetime import datetime, timedelta, timezone
+import threading
+import time
+import traceback
+import zlib
+from array import array
+from bisect import bisect_right
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import redirect_stderr, redirect_stdout
+from functools import partial
+from itertools import chain
+from datetime import date, datetime, timezone
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, TextIO, Tuple, Union
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Paths relative to tg-ingest repo
 REPO_ROOT = Path("/Users/satoshi/data/tg-ingest")
 DMS_DIR = REPO_ROOT / "data/dms"
+GROUPS_DIR = REPO_ROOT / "data/groups"
+SYNC_LOG = REPO_ROOT / "data/sync-log.jsonl"
+
+# When a quick_export-started sync last covered each conversation, by store_name()
+SYNC_TIMES = REPO_ROOT / "data/sync-times.json"
+
+# Per-conversation size, message count and last message time
+ACTIVITY_INDEX = REPO_ROOT / "data/activity-index.json"
+
+# Username/slug/name -> conversation lookup index and its trigram postings.
+# Kept outside dms/ and groups/ so writing them doesn't bump the directory
+# mtimes the index is validated against.
+LOOKUP_INDEX = REPO_ROOT / "data/lookup-index.tsv"
+LOOKUP_GRAMS = REPO_ROOT / "data/lookup-grams.bin"
 EXPORTS_DIR = REPO_ROOT / "exports"
+CONTACTS_DIR = REPO_ROOT / "contacts"
+
+# Unix socket the --serve daemon listens on (export_client.py has a copy)
+DAEMON_SOCKET = REPO_ROOT / "data/quick-export.sock"
+
+# Optional SQLite copy of every conversation (--backend sqlite, --migrate)
+MESSAGE_STORE = REPO_ROOT / "data/messages.db"
+
+# Top-level `"date": "..."` on a raw JSONL line; read without decoding the line
+DATE_RE = re.compile(rb'"date"\s*:\s*"([^"]*)"')
+
+# Skip the sync subprocess when the conversation was synced this recently
+DEFAULT_MAX_STALENESS = "5m"
+
+# Stop waiting for the sync after this long and export from cache
+DEFAULT_SYNC_TIMEOUT = "30s"
+
+# Read size for the backwards tail scan
+BLOCK_SIZE = 64 * 1024
+
+# Threads reading conversations in a batch export
+BATCH_WORKERS = 8
+
+# Work items per worker process; fewer, larger chunks cut pickling round trips
+CHUNKS_PER_PROCESS = 4
+
+# Seconds between wakes in --follow: stat polls without kqueue/inotify, and sync checks
+FOLLOW_INTERVAL = 1.0
+
+# inotify event mask (linux/inotify.h): writes, plus the file being replaced
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+
+# --max-tokens estimate per transcript line: LINE_TOKENS + UTF-8 bytes / BYTES_PER_TOKEN,
+# fit against cl100k_base and Claude's tokenizer on chat transcripts (benchmark.py tokens)
+LINE_TOKENS = 6
+BYTES_PER_TOKEN = 4.5
+
+# Written under the header when --max-tokens leaves older messages out
+ELISION_MARKER = "[… older messages omitted to fit {max_tokens} tokens …]"
+
+# Messages shown either side of the --around message (default for --context)
+AROUND_CONTEXT = 10
+
+# Message keys remembered while dropping repeats from an export (see dedup())
+DEDUP_WINDOW = 100_000
+
+# Conversations whose recent window the --serve daemon keeps in memory
+WARM_WINDOWS = 256
+
+# Flags export_client.py runs locally instead of sending to the daemon: long-running, writing
+# or forking work that would hold up every other client
+DAEMON_LOCAL_FLAGS = ("--follow", "--serve", "--processes", "--migrate", "--compact")
+
+# Column cache files: fixed-width columns as (name, array typecode); text and flags go alongside
+COLUMNS = (("ts", "q"), ("max_ts", "q"), ("offset", "q"), ("text_end", "q"), ("sender", "i"), ("id", "q"),
+           ("utc_offset", "i"))
+COLUMNS_VERSION = 4
+
+# The id column's value for a line without a message id
+NO_ID = -1 << 63
+
+# Message store tables; the primary key covers window queries, so they never touch another b-tree
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    tail_crc INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    conversation INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    byte_offset INTEGER NOT NULL,
+    utc_offset INTEGER NOT NULL,
+    id INTEGER,
+    direction INTEGER NOT NULL,
+    sender TEXT,
+    text TEXT,
+    PRIMARY KEY (conversation, ts, byte_offset)
+) WITHOUT ROWID;
+"""
+STORE_VERSION = 4
+LOOKUP_VERSION = 1
+ACTIVITY_VERSION = 1
+
+# Fuzzy matches below this quality are dropped; recency adds up to RECENCY_WEIGHT
+FUZZY_MIN_QUALITY = 0.25
+RECENCY_WEIGHT = 0.1
+FUZZY_ALTERNATIVES = 4
+
+
+# In-memory caches; set only inside the --serve daemon
+WARM: Optional["WarmCache"] = None
+
+# Message store behind --backend sqlite; None reads the JSONL files
+STORE: Optional["MessageStore"] = None
 
 
 def parse_date(d: str) -> datetime:
@@ -30,80 +187,1881 @@ def parse_date(d: str) -> datetime:
     return datetime.fromisoformat(d)
 
 
-def sync_dms():
-    """Quick sync to get latest messages."""
-    print("Syncing latest messages...", file=sys.stderr)
-    subprocess.run(
-        [sys.executable, "-m", "tg_export.cli", "sync-dms", "--dir", str(DMS_DIR)],
-        capture_output=True,
-        cwd=REPO_ROOT
-    )
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_HOUR_CACHE: Dict[str, int] = {}
 
 
-def find_jsonl(username: str) -> Optional[Path]:
-    """Find JSONL file for username (flexible matching)."""
-    # Exact match first
-    exact = DMS_DIR / f"{username}.jsonl"
-    if exact.exists():
-        return exact
+def parse_ts(d: str) -> int:
+    """Epoch seconds for an export timestamp, without building datetimes.
+
+    Fast path for `YYYY-MM-DDTHH:MM:SS[.ffffff]` followed by nothing, `Z`,
+    `+00:00`, `+00:00Z` or a `±HH:MM` offset; anything else goes through
+    parse_date(). Epoch hours are cached per `YYYY-MM-DDTHH` prefix.
+    """
+    try:
+        hour = _HOUR_CACHE.get(d[:13])
+        if hour is None:
+            if d[4] != '-' or d[7] != '-':
+                raise ValueError(d)
+            days = date(int(d[:4]), int(d[5:7]), int(d[8:10])).toordinal() - _EPOCH_ORDINAL
+            hour = _HOUR_CACHE[d[:13]] = days * 86400 + int(d[11:13]) * 3600
+        if d[13] != ':' or d[16] != ':':
+            raise ValueError(d)
+        ts = hour + int(d[14:16]) * 60 + int(d[17:19])
+        tz = d[19:]
+        if tz and tz[0] == '.':
+            tz = tz.lstrip('.0123456789')
+        if not tz or tz == 'Z' or tz == '+00:00' or tz == '+00:00Z':
+            return ts
+        if len(tz) == 6 and tz[3] == ':' and tz[0] in '+-':
+            offset = int(tz[1:3]) * 3600 + int(tz[4:6]) * 60
+            return ts - offset if tz[0] == '+' else ts + offset
+    except (IndexError, ValueError):
+        pass
+    return int(parse_date(d).timestamp())
+
+
+def utc_offset(d: str) -> int:
+    """Seconds east of UTC of an export timestamp, or of a bare `±HH:MM` suffix.
+
+    A `Z` after an offset (`+05:30Z`) is dropped first, as parse_date() does.
+    """
+    zulu = d.endswith('Z')
+    if zulu:
+        d = d[:-1]
+    tz = d[-6:]
+    if len(tz) == 6 and tz[3] == ':' and tz[0] in '+-' and tz[1:3].isdigit() and tz[4:6].isdigit():
+        offset = int(tz[1:3]) * 3600 + int(tz[4:6]) * 60
+        return offset if tz[0] == '+' else -offset
+    if not d or zulu or len(d) == 19:
+        return 0
+    try:
+        return int(parse_date(d).utcoffset().total_seconds())
+    except (AttributeError, ValueError):
+        return 0
+
+
+def day_of(ts: int) -> str:
+    """`YYYY-MM-DD` of epoch seconds, already shifted to the wall clock wanted."""
+    return date.fromordinal(_EPOCH_ORDINAL + ts // 86400).isoformat()
+
+
+def offset_suffix(offset: int) -> str:
+    """The `±HH:MM` suffix for seconds east of UTC; empty for UTC itself."""
+    if not offset:
+        return ""
+    hours, minutes = divmod(abs(offset) // 60, 60)
+    return f"{'-' if offset < 0 else '+'}{hours:02d}:{minutes:02d}"
+
+
+_CLOCK = [f"{h:02d}:{m:02d}" for h in range(24) for m in range(60)]
+
+
+def format_time(ts: int) -> str:
+    """HH:MM for an epoch timestamp; add utc_offset() first for the stamp's own wall clock."""
+    return _CLOCK[ts // 60 % 1440]
+
+
+if msgspec is not None:
+    JSON_BACKEND = "msgspec"
+
+    class Message(msgspec.Struct):
+        """The fields quick_export reads; everything else on the line is skipped."""
+        date: str
+        text: Optional[str] = None
+        is_outgoing: Optional[bool] = False
+        sender_username: Optional[str] = None
+        id: Optional[int] = None
+
+    _message_decoder = msgspec.json.Decoder(Message)
+
+    def decode_message(line: bytes) -> Message:
+        """Decode one JSONL line (bytes) into a Message."""
+        try:
+            return _message_decoder.decode(line)
+        except msgspec.ValidationError:
+            # Unexpected field types: take the permissive stdlib path
+            return message_from_dict(json.loads(line))
+else:
+    JSON_BACKEND = "orjson" if orjson is not None else "json"
+    _loads = orjson.loads if orjson is not None else json.loads
+
+    class Message(NamedTuple):
+        """The fields quick_export reads; everything else on the line is dropped."""
+        date: str
+        text: Optional[str] = None
+        is_outgoing: Optional[bool] = False
+        sender_username: Optional[str] = None
+        id: Optional[int] = None
+
+    def decode_message(line: bytes) -> Message:
+        """Decode one JSONL line (bytes) into a Message."""
+        return message_from_dict(_loads(line))
+
+
+def message_from_dict(d: dict) -> Message:
+    return Message(d['date'], d.get('text'), d.get('is_outgoing', False), d.get('sender_username'), d.get('id'))
+
+
+def line_ts(line: bytes) -> Optional[int]:
+    """Timestamp of a raw JSONL line, read without decoding the JSON.
+
+    Returns None when `"date"` appears more than once (e.g. a nested reply
+    also carries one), so callers fall back to a full decode.
+    """
+    if line.count(b'"date"') != 1:
+        return None
+    match = DATE_RE.search(line)
+    if match is None:
+        return None
+    return parse_ts(match.group(1).decode())
+
+
+def filter_lines(lines: Iterable[bytes], cutoff_ts: int) -> Iterator[tuple]:
+    """Yield (ts, message) for lines newer than cutoff_ts.
+
+    The date is checked on the raw bytes first, so out-of-window lines are
+    never JSON-decoded.
+    """
+    for line in lines:
+        if not line.strip():
+            continue
+        ts = line_ts(line)
+        if ts is None:
+            m = decode_message(line)
+            ts = parse_ts(m.date)
+            if ts > cutoff_ts:
+                yield ts, m
+        elif ts > cutoff_ts:
+            yield ts, decode_message(line)
+
+
+class RecentKeys:
+    """The last `size` message keys seen: a set for lookups, a queue to forget the oldest."""
+
+    def __init__(self, size: int = DEDUP_WINDOW):
+        self.size = size
+        self.keys = set()
+        self.order = deque()
+
+
+def message_key(ts: int, m: Message) -> int:
+    """What makes a message a repeat: its id, else a hash of its date and text."""
+    return m.id if m.id is not None else hash((ts, m.text))
+
+
+def dedup(pairs: Iterable[tuple], seen: Optional[RecentKeys] = None) -> Iterator[tuple]:
+    """Drop (ts, message) pairs repeating one of the last DEDUP_WINDOW passed through.
+
+    Repeated backfills and interrupted syncs can append a message to the
+    JSONL again; the first copy read is kept. A repeat further back than
+    the window slips through, which --compact clears for good when the
+    message has an id.
+    """
+    seen = RecentKeys() if seen is None else seen
+    keys, order, size = seen.keys, seen.order, seen.size
+    add, remember, forget = keys.add, order.append, order.popleft
+    for pair in pairs:
+        ts, m = pair
+        key = message_key(ts, m)
+        if key in keys:
+            continue
+        add(key)
+        remember(key)
+        if len(keys) > size:
+            keys.discard(forget())
+        yield pair
+
+
+def iter_lines_reverse(path: Path, block_size: int = BLOCK_SIZE,
+                       end: Optional[int] = None) -> Iterator[Tuple[int, bytes]]:
+    """Yield (offset, line) for non-empty lines from end (default EOF) backwards, newest first."""
+    with open(path, 'rb') as f:
+        pos = f.seek(0, os.SEEK_END) if end is None else end
+        tail = b''
+        while pos > 0:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            buf = f.read(step) + tail
+            lines = buf.split(b'\n')
+            # First piece may be cut mid-line; finish it with the next block
+            tail = lines[0]
+            start = pos + len(buf) + 1
+            for line in reversed(lines[1:]):
+                start -= len(line) + 1
+                if line.strip():
+                    yield start, line
+        if tail.strip():
+            yield 0, tail
+
+
+def find_window_start(path: Path, cutoff_ts: int) -> int:
+    """Byte offset of the oldest message newer than cutoff_ts, scanning back from EOF.
+
+    Files are append-only and chronological, so the scan stops at the
+    first message at or before the cutoff. Only dates are read.
+    """
+    start = path.stat().st_size
+    for offset, line in iter_lines_reverse(path):
+        ts = line_ts(line)
+        if ts is None:
+            ts = parse_ts(decode_message(line).date)
+        if ts <= cutoff_ts:
+            break
+        start = offset
+    return start
+
+
+def columns_path(jsonl_path: Path) -> Path:
+    """Column cache directory, kept next to tg_export's own .jsonl.idx."""
+    return jsonl_path.with_name(jsonl_path.name + ".cols")
+
+
+def tail_crc(f, size: int) -> int:
+    """Checksum of the bytes just before size, to spot rewritten files."""
+    start = max(0, size - 64)
+    f.seek(start)
+    return zlib.crc32(f.read(size - start))
+
+
+def _write_json_atomic(path: Path, obj) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(obj, separators=(',', ':')))
+    os.replace(tmp, path)
+
+
+def _map_column(path: Path, typecode: str, count: int) -> memoryview:
+    """The first count items of a column file, mapped read-only."""
+    if count == 0:
+        return memoryview(array(typecode))
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    size = count * array(typecode).itemsize
+    if len(mm) < size:
+        raise ValueError(f"{path} is shorter than its committed length")
+    return memoryview(mm)[:size].cast(typecode)
+
+
+def _append_column(path: Path, committed: int, data: bytes) -> None:
+    """Write data at offset `committed`, dropping any unfinished earlier append past it.
+
+    The file never shrinks below `committed`: readers (and the --serve
+    daemon's warm caches) may have that much mapped, and touching a
+    mapped page that a truncate cut off raises SIGBUS.
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o666)
+    try:
+        view = memoryview(data)
+        offset = committed
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view, offset = view[written:], offset + written
+        if os.fstat(fd).st_size > offset:
+            os.ftruncate(fd, offset)
+    finally:
+        os.close(fd)
+
+
+class ColumnCache:
+    """A conversation's parsed messages, memory-mapped from column files beside its JSONL.
+
+    {name}.jsonl.cols/ holds one append-only file per column: timestamps,
+    their running maxima (sorted even when a backfill appends older
+    messages, so the window start is a bisect), each line's offset in the
+    JSONL, text end offsets into one UTF-8 blob, sender ids into
+    meta.json's table, message ids, UTC offsets and a bitmap of is_outgoing flags. meta.json is
+    replaced last and its counts are authoritative, so readers never see
+    half an append. A rebuild writes a new generation of files, leaving
+    open maps of the old one intact.
+    """
+
+    def __init__(self, directory: Path, meta: dict):
+        self.meta = meta
+        self.size = meta['size']
+        self.count = count = meta['count']
+        gen = meta['generation']
+        columns = {name: _map_column(directory / f"{name}.{gen}", typecode, count) for name, typecode in COLUMNS}
+        self.ts = columns['ts']
+        self.max_ts = columns['max_ts']
+        self.offset = columns['offset']
+        self.text_end = columns['text_end']
+        self.sender = columns['sender']
+        self.id = columns['id']
+        self.utc_offset = columns['utc_offset']
+        self.text = _map_column(directory / f"text.{gen}", 'B', meta['text_size'])
+        self.is_outgoing = _map_column(directory / f"is_outgoing.{gen}", 'B', (count + 7) // 8)
+        self.senders = meta['senders']
+
+    @classmethod
+    def open(cls, jsonl_path: Path) -> Optional['ColumnCache']:
+        directory = columns_path(jsonl_path)
+        try:
+            meta = json.loads((directory / "meta.json").read_bytes())
+            if meta.get('version') != COLUMNS_VERSION:
+                return None
+            return cls(directory, meta)
+        except (OSError, ValueError):
+            return None
+
+    def current(self, st: os.stat_result) -> bool:
+        """Whether the cache covers the JSONL as stat()ed, judged by size and mtime."""
+        return self.meta['size'] == st.st_size and self.meta['mtime_ns'] == st.st_mtime_ns
 
-    # Case-insensitive search
-    for f in DMS_DIR.glob("*.jsonl"):
-        if username.lower() in f.stem.lower():
-            return f
+    def window(self, cutoff_ts: int) -> Iterator[tuple]:
+        """(ts, message) pairs newer than cutoff_ts."""
+        return self.messages(bisect_right(self.max_ts, cutoff_ts), cutoff_ts)
 
+    def messages(self, start: int, cutoff_ts: int) -> Iterator[tuple]:
+        """(ts, message) pairs from row start on, newer than cutoff_ts. Only the text is decoded."""
+        ts, text_end, sender, ids, offsets, text, flags, senders = (
+            self.ts, self.text_end, self.sender, self.id, self.utc_offset, self.text, self.is_outgoing, self.senders)
+        prev = text_end[start - 1] if start else 0
+        for i in range(start, self.count):
+            end = text_end[i]
+            if ts[i] > cutoff_ts:
+                s = sender[i]
+                msg_id, off = ids[i], offsets[i]
+                # date is only read for ts and its UTC offset, so a bare `±HH:MM` suffix stands in for it
+                yield ts[i], Message(offset_suffix(off) if off else "", str(text[prev:end], 'utf-8') or None,
+                                     bool(flags[i >> 3] >> (i & 7) & 1), senders[s] if s >= 0 else None,
+                                     None if msg_id == NO_ID else msg_id)
+            prev = end
+
+
+def update_columns(jsonl_path: Path) -> ColumnCache:
+    """Append lines added since the column cache was written, or rebuild it if the JSONL was rewritten.
+
+    Writers take an flock on the cache directory, so concurrent exports
+    append each line once.
+    """
+    directory = columns_path(jsonl_path)
+    directory.mkdir(exist_ok=True)
+    with open(directory / "lock", 'wb') as lock, open(jsonl_path, 'rb') as f:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        st = os.fstat(f.fileno())
+        cache = ColumnCache.open(jsonl_path)
+        if cache is not None and cache.current(st):
+            return cache  # Another writer just brought it up to date
+        if cache is not None and st.st_size >= cache.size and tail_crc(f, cache.size) == cache.meta['tail_crc']:
+            meta = cache.meta
+        else:
+            meta = {'version': COLUMNS_VERSION, 'generation': time.time_ns(), 'size': 0, 'count': 0,
+                    'text_size': 0, 'max_ts': 0, 'senders': []}
+
+        columns = {name: array(typecode) for name, typecode in COLUMNS}
+        texts, flags = [], []
+        senders = list(meta['senders'])
+        sender_ids = {s: i for i, s in enumerate(senders)}
+        running, text_size = meta['max_ts'], meta['text_size']
+        pos = meta['size']
+        f.seek(pos)
+        for line in f:
+            if not line.endswith(b'\n'):
+                break  # Partial trailing line, still being written
+            start = pos
+            pos += len(line)
+            if not line.strip():
+                continue
+            m = decode_message(line)
+            ts = parse_ts(m.date)
+            running = max(running, ts)
+            data = (m.text or '').encode()
+            text_size += len(data)
+            texts.append(data)
+            sid = -1
+            if m.sender_username is not None:
+                sid = sender_ids.get(m.sender_username)
+                if sid is None:
+                    sid = sender_ids[m.sender_username] = len(senders)
+                    senders.append(m.sender_username)
+            columns['ts'].append(ts)
+            columns['max_ts'].append(running)
+            columns['offset'].append(start)
+            columns['text_end'].append(text_size)
+            columns['sender'].append(sid)
+            columns['id'].append(NO_ID if m.id is None else m.id)
+            columns['utc_offset'].append(utc_offset(m.date))
+            flags.append(m.is_outgoing)
+        crc = tail_crc(f, pos)
+
+        gen, count = meta['generation'], meta['count']
+        for name, typecode in COLUMNS:
+            _append_column(directory / f"{name}.{gen}", count * array(typecode).itemsize, columns[name].tobytes())
+        _append_column(directory / f"text.{gen}", meta['text_size'], b''.join(texts))
+        # The bitmap's last byte may be partly filled; rewrite it in place with the new flags
+        # added (its old bits are unchanged, so a reader mid-update still sees them)
+        flags_path = directory / f"is_outgoing.{gen}"
+        full, used = divmod(count, 8)
+        bits = bytearray((used + len(flags) + 7) // 8)
+        if used:
+            with open(flags_path, 'rb') as bf:
+                bf.seek(full)
+                bits[0] = bf.read(1)[0]
+        for j, flag in enumerate(flags, used):
+            if flag:
+                bits[j >> 3] |= 1 << (j & 7)
+        _append_column(flags_path, full, bytes(bits))
+
+        meta = dict(meta, size=pos, mtime_ns=st.st_mtime_ns, tail_crc=crc, count=count + len(flags),
+                    text_size=text_size, max_ts=running, senders=senders)
+        _write_json_atomic(directory / "meta.json", meta)
+        if count == 0:
+            for p in directory.iterdir():
+                if p.suffix != f".{gen}" and p.name not in ("meta.json", "lock"):
+                    p.unlink(missing_ok=True)
+            # The sparse timestamp index this cache replaced
+            jsonl_path.with_name(jsonl_path.name + ".tsidx").unlink(missing_ok=True)
+        return ColumnCache(directory, meta)
+
+
+def load_columns(jsonl_path: Path) -> ColumnCache:
+    """The conversation's column cache, brought up to date with the JSONL.
+
+    It is valid while the JSONL's size and mtime match meta.json; past
+    that, appended lines are added. The --serve daemon keeps caches
+    mapped instead of re-reading meta.json.
+    """
+    st = jsonl_path.stat()
+    cache = WARM.columns.get(jsonl_path) if WARM is not None else None
+    if cache is None:
+        cache = ColumnCache.open(jsonl_path)
+    if cache is None or not cache.current(st):
+        cache = update_columns(jsonl_path)
+    if WARM is not None:
+        WARM.columns[jsonl_path] = cache
+    return cache
+
+
+def store_name(jsonl_path: Path) -> str:
+    """A conversation's key in the message store: its directory and stem, e.g. "dms/klutch_trades"."""
+    return f"{jsonl_path.parent.name}/{jsonl_path.stem}"
+
+
+class MessageStore:
+    """Optional SQLite copy of the conversations, for --backend sqlite.
+
+    MESSAGE_STORE (WAL mode) holds messages(conversation, ts, byte_offset,
+    utc_offset, id, direction, sender, text), clustered on (conversation, ts, byte_offset):
+    a window is one range scan of that key, which covers every column
+    read. conversations records how many bytes of each JSONL are loaded;
+    a sync inserts only the lines past that offset, and reloads a JSONL
+    whose tail no longer matches. Connections are per thread.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._local = threading.local()
+
+    def connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if conn.execute("PRAGMA user_version").fetchone()[0] != STORE_VERSION:
+                # An older layout; the store only mirrors the JSONL files, so start it over
+                conn.executescript(f"BEGIN IMMEDIATE; DROP TABLE IF EXISTS messages; "
+                                   f"DROP TABLE IF EXISTS conversations; {STORE_SCHEMA} "
+                                   f"PRAGMA user_version = {STORE_VERSION}; COMMIT;")
+            self._local.conn = conn
+        return conn
+
+    def sync(self, jsonl_path: Path) -> Tuple[int, int]:
+        """Load lines appended to jsonl_path since the last sync; returns (conversation id, offset loaded through)."""
+        conn = self.connect()
+        name = store_name(jsonl_path)
+        st = jsonl_path.stat()
+        row = conn.execute("SELECT id, size, mtime_ns FROM conversations WHERE name = ?", (name,)).fetchone()
+        if row is not None and row[1:] == (st.st_size, st.st_mtime_ns):
+            return row[0], row[1]
+
+        conn.execute("BEGIN IMMEDIATE")  # another process may be loading the same lines
+        try:
+            with open(jsonl_path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                row = conn.execute("SELECT id, size, tail_crc FROM conversations WHERE name = ?", (name,)).fetchone()
+                if row is None:
+                    conv = conn.execute("INSERT INTO conversations (name, size, mtime_ns, tail_crc) VALUES (?, 0, 0, 0)",
+                                        (name,)).lastrowid
+                    start = 0
+                else:
+                    conv, start, crc = row
+                    if st.st_size < start or tail_crc(f, start) != crc:
+                        conn.execute("DELETE FROM messages WHERE conversation = ?", (conv,))
+                        start = 0
+                end = [start]
+
+                def rows() -> Iterator[tuple]:
+                    pos = start
+                    f.seek(pos)
+                    for line in f:
+                        if not line.endswith(b'\n'):
+                            break  # Partial trailing line, still being written
+                        offset, pos = pos, pos + len(line)
+                        end[0] = pos
+                        if line.strip():
+                            m = decode_message(line)
+                            yield (conv, parse_ts(m.date), offset, utc_offset(m.date), m.id, int(bool(m.is_outgoing)),
+                                   m.sender_username, m.text)
+                conn.executemany("INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows())
+                conn.execute("UPDATE conversations SET size = ?, mtime_ns = ?, tail_crc = ? WHERE id = ?",
+                             (end[0], st.st_mtime_ns, tail_crc(f, end[0]), conv))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return conv, end[0]
+
+    def window(self, jsonl_path: Path, cutoff_ts: int) -> Tuple[Iterator[tuple], int]:
+        """open_window() from the store, after loading any appended lines."""
+        conv, end = self.sync(jsonl_path)
+        rows = self.connect().execute(
+            "SELECT ts, utc_offset, id, direction, sender, text FROM messages WHERE conversation = ? AND ts > ? "
+            "ORDER BY ts, byte_offset", (conv, cutoff_ts))
+        return ((ts, Message(offset_suffix(off), text, bool(direction), sender, msg_id))
+                for ts, off, msg_id, direction, sender, text in rows), end
+
+    def newest(self, jsonl_path: Path, cutoff_ts: int) -> Tuple[Iterator[tuple], int]:
+        """read_newest() from the store: the same range scan, backwards."""
+        conv, end = self.sync(jsonl_path)
+        rows = self.connect().execute(
+            "SELECT ts, utc_offset, id, direction, sender, text FROM messages WHERE conversation = ? AND ts > ? "
+            "ORDER BY ts DESC, byte_offset DESC", (conv, cutoff_ts))
+        return ((ts, Message(offset_suffix(off), text, bool(direction), sender, msg_id))
+                for ts, off, msg_id, direction, sender, text in rows), end
+
+
+def use_backend(backend: str) -> None:
+    """Read windows from the JSONL files ("jsonl") or MESSAGE_STORE ("sqlite").
+
+    Also the initializer of batch worker processes, which don't inherit it.
+    """
+    global STORE
+    if backend != "sqlite":
+        STORE = None
+    elif STORE is None:
+        STORE = MessageStore(MESSAGE_STORE)
+
+
+def migrate_store(paths: List[Path]) -> None:
+    """Load every conversation into MESSAGE_STORE (--migrate); later syncs only add appended lines."""
+    store = MessageStore(MESSAGE_STORE)
+    start = time.time()
+    for path in paths:
+        store.sync(path)
+    conn = store.connect()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    count, = conn.execute("SELECT count(*) FROM messages").fetchone()
+    print(f"{MESSAGE_STORE}: {count:,} messages from {len(paths)} conversations "
+          f"({time.time() - start:.1f}s)", file=sys.stderr)
+
+
+def iter_range(f, start: int, end: Optional[int] = None) -> Iterator[bytes]:
+    """Yield lines of a binary file from start up to (not past) end."""
+    f.seek(start)
+    pos = start
+    for line in f:
+        if end is not None and pos >= end:
+            break
+        pos += len(line)
+        yield line
+
+
+def complete_size(path: Path) -> int:
+    """Offset just past the last newline; later bytes may be a line still being written."""
+    with open(path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - BLOCK_SIZE)
+            f.seek(start)
+            i = f.read(end - start).rfind(b'\n')
+            if i >= 0:
+                return start + i + 1
+            end = start
+    return 0
+
+
+def compact_jsonl(path: Path) -> Tuple[int, int]:
+    """Rewrite a JSONL sorted by date with repeated message ids removed; returns (messages kept, repeats).
+
+    Only an id marks a line as a repeat; lines without one are all kept.
+    Meant for when no sync is running: the file is replaced atomically,
+    and left as it was if it changed while being read. Lines are written
+    back byte for byte; a partial trailing line stays last. The column
+    cache, message store and search index see the rewrite and rebuild.
+    """
+    with open(path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        if st.st_size == 0:
+            return 0, 0
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    with mm:
+        end = mm.rfind(b'\n') + 1
+        seen = set()
+        lines = []
+        repeats = 0
+        changed = False
+        pos = 0
+        while pos < end:
+            line_end = mm.find(b'\n', pos) + 1
+            line = mm[pos:line_end]
+            start, pos = pos, line_end
+            if not line.strip():
+                changed = True
+                continue
+            m = decode_message(line)
+            ts = parse_ts(m.date)
+            if m.id is not None:
+                if m.id in seen:
+                    repeats += 1
+                    continue
+                seen.add(m.id)
+            if lines and ts < lines[-1][0]:
+                changed = True
+            lines.append((ts, start, line_end))
+        if not repeats and not changed:
+            return len(lines), 0
+
+        lines.sort(key=lambda line: line[0])
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, 'wb') as out:
+            for _ts, start, line_end in lines:
+                out.write(mm[start:line_end])
+            out.write(mm[end:])
+            out.flush()
+            os.fsync(out.fileno())
+    os.chmod(tmp, st.st_mode & 0o7777)
+    now = path.stat()
+    if (now.st_size, now.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+        tmp.unlink()
+        raise RuntimeError(f"{path.name} changed while compacting; re-run when no sync is writing")
+    os.replace(tmp, path)
+    return len(lines), repeats
+
+
+def open_window(path: Path, cutoff_ts: int) -> Tuple[Iterator[tuple], int]:
+    """Stream (ts, message) pairs newer than cutoff_ts, bisecting the column cache.
+
+    Returns (messages, end): only complete lines before `end` are read, so a
+    sync appending at the same time never hands us half a line. The --serve
+    daemon answers from its in-memory window instead, and --backend sqlite
+    from the message store.
+    """
+    if STORE is not None:
+        return STORE.window(path, cutoff_ts)
+    if WARM is not None:
+        return WARM.window(path, cutoff_ts)
+    return read_window(path, cutoff_ts)
+
+
+def read_window(path: Path, cutoff_ts: int) -> Tuple[Iterator[tuple], int]:
+    """open_window() from disk."""
+    if os.access(path.parent, os.W_OK):
+        cache = load_columns(path)
+        return cache.window(cutoff_ts), cache.size
+    end = complete_size(path)
+    start = min(find_window_start(path, cutoff_ts), end)
+    return read_range(path, start, end, cutoff_ts), end
+
+
+def read_range(path: Path, start: int, end: int, cutoff_ts: int) -> Iterator[tuple]:
+    with open(path, 'rb') as f:
+        yield from filter_lines(iter_range(f, start, end), cutoff_ts)
+
+
+def read_newest(path: Path, cutoff_ts: int) -> Tuple[Iterator[tuple], int]:
+    """Stream (ts, message) pairs newer than cutoff_ts from EOF backwards, newest first.
+
+    Returns (messages, end) like open_window(). Lines are decoded only as
+    they are consumed, so a caller that stops early never parses the rest.
+    """
+    if STORE is not None:
+        return STORE.newest(path, cutoff_ts)
+    end = complete_size(path)
+
+    def newest() -> Iterator[tuple]:
+        for _offset, line in iter_lines_reverse(path, end=end):
+            ts = line_ts(line)
+            m = None
+            if ts is None:
+                m = decode_message(line)
+                ts = parse_ts(m.date)
+            if ts <= cutoff_ts:
+                return
+            yield ts, m or decode_message(line)
+    return newest(), end
+
+
+def parse_around(value: str) -> Tuple[str, int]:
+    """--around target: ("offset", n) for a byte offset as search.py prints it, ("id", n) for id:n."""
+    kind, _, number = value.rpartition(":")
+    if kind not in ("", "id"):
+        raise ValueError(value)
+    return kind or "offset", int(number)
+
+
+def find_message_id(mm: mmap.mmap, msg_id: int, end: int) -> Optional[int]:
+    """Byte offset of the line with id msg_id among mm[:end], or None.
+
+    Ids grow as messages are appended, so this bisects over line starts,
+    decoding each line it lands on; a file out of order there (a backfill)
+    falls back to one regex scan for the id, wherever it sits on the line.
+    """
+    lo, hi = 0, end
+    while lo < hi:
+        line_start = mm.rfind(b'\n', lo, (lo + hi) // 2) + 1 or lo
+        line_end = mm.find(b'\n', line_start, hi) + 1
+        line = mm[line_start:line_end]
+        line_id = decode_message(line).id if line.strip() else None
+        if line_id is None:
+            break
+        if line_id == msg_id:
+            return line_start
+        if line_id < msg_id:
+            lo = line_end
+        else:
+            hi = line_start
+    # Nested objects (a reply, say) have ids too, so each hit's line is decoded to check
+    for m in re.compile(rb'"id"\s*:\s*%d\b' % msg_id).finditer(mm, 0, end):
+        line_start = mm.rfind(b'\n', 0, m.start()) + 1
+        if decode_message(mm[line_start:mm.find(b'\n', m.end()) + 1]).id == msg_id:
+            return line_start
     return None
 
 
-def quick_export(username: str, hours: int = 24, skip_sync: bool = False) -> Optional[str]:
-    """Sync, filter, and format as markdown."""
+def read_around(path: Path, target: Tuple[str, int], context: int) -> Optional[Tuple[List[tuple], int]]:
+    """(pairs, i): the target message and up to `context` either side as (ts, message), pairs[i] the target.
 
-    jsonl_path = find_jsonl(username)
-    if not jsonl_path:
-        print(f"No synced data for '{username}'", file=sys.stderr)
-        print(f"Available DMs: {', '.join(f.stem for f in sorted(DMS_DIR.glob('*.jsonl'))[:10])}", file=sys.stderr)
+    None if there is no such message. The target is a byte offset anywhere in its line, or a message id (see
+    find_message_id()). Lines are found by scanning for newlines out from
+    the target, so only the lines returned are read, however large the
+    file is. Repeats are dropped as by dedup(); a repeated target is shown
+    as its first copy.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    with mm:
+        end = mm.rfind(b'\n') + 1
+        kind, value = target
+        offset = find_message_id(mm, value, end) if kind == "id" else value
+        if offset is None or not 0 <= offset < end:
+            return None
+        start = mm.rfind(b'\n', 0, offset) + 1
+
+        before = []
+        pos = start
+        while pos > 0 and len(before) < context:
+            line_start = mm.rfind(b'\n', 0, pos - 1) + 1
+            line = mm[line_start:pos]
+            pos = line_start
+            if line.strip():
+                before.append(line)
+        lines = before[::-1]
+        pos = start
+        while pos < end and len(lines) < len(before) + context + 1:
+            line_end = mm.find(b'\n', pos) + 1
+            line = mm[pos:line_end]
+            pos = line_end
+            if line.strip():
+                lines.append(line)
+    messages = [decode_message(line) for line in lines]
+    pairs = [(parse_ts(m.date), m) for m in messages]
+    key = message_key(*pairs[len(before)])
+    pairs = list(dedup(pairs))
+    return pairs, next(i for i, pair in enumerate(pairs) if message_key(*pair) == key)
+
+
+def parse_duration(value: str) -> int:
+    """Seconds for a duration like 90, 90s, 5m, 2h or 1d."""
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    value = value.strip().lower()
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(float(value))
+
+
+def format_age(seconds: float) -> str:
+    """Rough human age: 45s, 12m, 3h, 2d."""
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= size:
+            return f"{int(seconds // size)}{unit}"
+    return f"{int(seconds)}s"
+
+
+def read_sync_times() -> Dict[str, float]:
+    """SYNC_TIMES as {store_name(): epoch seconds}; empty if missing or unreadable."""
+    try:
+        return json.loads(SYNC_TIMES.read_bytes())
+    except (OSError, ValueError):
+        return {}
+
+
+def last_sync_time(jsonl_path: Path) -> float:
+    """When a completed sync last covered this conversation (when it started); 0 if never seen."""
+    return read_sync_times().get(store_name(jsonl_path), 0.0)
+
+
+def record_sync(jsonl_paths: List[Path], started: float) -> None:
+    """Note in SYNC_TIMES that a sync started at `started` covered these conversations."""
+    try:
+        with open(SYNC_TIMES.with_name(SYNC_TIMES.name + ".lock"), 'wb') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            times = read_sync_times()
+            times.update((store_name(path), started) for path in jsonl_paths)
+            _write_json_atomic(SYNC_TIMES, times)
+    except OSError:
+        pass
+
+
+def sync_command(jsonl_path: Optional[Path] = None) -> Tuple[List[str], List[Path]]:
+    """(tg_export command, conversations it covers) for this conversation's source; DMs if None.
+
+    tg_export can't sync a single conversation: `sync-dms` syncs every DM
+    in DMS_DIR and `groups sync` every registered group. Only the group
+    asked about is claimed, since the registry decides which ones it syncs.
+    """
+    cli = [sys.executable, "-m", "tg_export.cli"]
+    if jsonl_path is not None and jsonl_path.parent == GROUPS_DIR:
+        return cli + ["groups", "sync"], [jsonl_path]
+    dms = [DMS_DIR / f"{stem}.jsonl" for stem in conversation_stems(DMS_DIR)]
+    return cli + ["sync-dms", "--dir", str(DMS_DIR)], dms
+
+
+class RunLocally(Exception):
+    """Raised in the --serve daemon for work it leaves to the client: a sync or a worker pool.
+
+    handle_request() drops the request's output and tells export_client.py
+    to run the command itself, so the daemon stays read-only and a slow
+    sync never holds up other clients.
+    """
+
+
+class SyncJob:
+    """A tg_export sync subprocess running in the background, with a deadline.
+
+    wait() gives up `timeout` seconds after the sync started. The subprocess
+    is then left running (detached) rather than killed mid-write, and the
+    export carries on from cache. Every outcome is appended to SYNC_LOG; a
+    clean exit stamps the conversations in `covers` (see record_sync()).
+    """
+
+    def __init__(self, cmd: List[str], covers: List[Path], timeout: Optional[float] = None,
+                 target: str = "", last_synced: float = 0.0):
+        if WARM is not None:
+            raise RunLocally("sync")
+        self.covers = covers
+        self.timeout = timeout
+        self.target = target
+        self.last_synced = last_synced
+        self.outcome: Optional[str] = None
+        self.returncode: Optional[int] = None
+        self.duration = 0.0
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.proc = self._start(cmd)
+
+    @staticmethod
+    def _start(cmd: List[str]) -> subprocess.Popen:
+        return subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=REPO_ROOT)
+
+    def _remaining(self) -> Optional[float]:
+        if self.timeout is None:
+            return None
+        return max(0.0, self.started + self.timeout - time.time())
+
+    def done(self) -> bool:
+        """True once wait() would return without blocking."""
+        return self.outcome is not None or self.proc.poll() is not None or self._remaining() == 0
+
+    def wait(self) -> str:
+        """Block until the sync exits or the deadline passes; returns 'ok', 'failed' or 'timeout'.
+
+        Safe to call from several threads; the first caller settles the outcome.
+        """
+        with self._lock:
+            if self.outcome is None:
+                self._settle()
+        return self.outcome
+
+    def _settle(self) -> None:
+        try:
+            code = self.proc.wait(self._remaining())
+        except subprocess.TimeoutExpired:
+            self.outcome = 'timeout'
+            print(f"Sync still running after {self.timeout:g}s, exporting from cache", file=sys.stderr)
+        else:
+            self.returncode = code
+            self.outcome = 'ok' if code == 0 else 'failed'
+            if code == 0:
+                record_sync(self.covers, self.started)
+        self.duration = time.time() - self.started
+        log_sync(self)
+
+    def banner(self) -> Optional[str]:
+        """Markdown warning for transcripts exported without a completed sync."""
+        if self.outcome == 'ok':
+            return None
+        if self.outcome == 'timeout':
+            what = f"Sync still running after {self.timeout:g}s"
+        else:
+            what = f"Sync failed (exit {self.returncode})"
+        if self.last_synced:
+            age = f"last synced {format_age(self.started - self.last_synced)} ago"
+        else:
+            age = "last sync time unknown"
+        return f"> ⚠️ {what}; newer messages may be missing ({age})."
+
+
+class SkippedSync:
+    """Stands in for a SyncJob when a sync within --max-staleness let this export skip its own.
+
+    Telegram may have had messages since, so the transcript says how old its data is.
+    """
+
+    outcome = 'skipped'
+
+    def __init__(self, last_synced: float):
+        self.last_synced = last_synced
+
+    def done(self) -> bool:
+        return True
+
+    def wait(self) -> str:
+        return self.outcome
+
+    def banner(self) -> Optional[str]:
+        when = datetime.fromtimestamp(self.last_synced).astimezone().strftime("%Y-%m-%d %H:%M")
+        age = format_age(time.time() - self.last_synced)
+        return f"> ℹ️ Not synced this run; data as of {when} ({age} ago, within --max-staleness)."
+
+
+def log_sync(job: SyncJob) -> None:
+    """Append a sync's duration and outcome to SYNC_LOG for later analysis."""
+    record = {
+        'started_at': datetime.fromtimestamp(job.started).astimezone().isoformat(timespec='seconds'),
+        'target': job.target,
+        'duration_s': round(job.duration, 3),
+        'outcome': job.outcome,
+        'returncode': job.returncode,
+    }
+    try:
+        with open(SYNC_LOG, 'a') as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError:
+        pass
+
+
+def sync_dms(jsonl_path: Optional[Path] = None, timeout: Optional[float] = None) -> SyncJob:
+    """Start a quick sync to get latest messages; call .wait() on the result."""
+    print("Syncing latest messages...", file=sys.stderr)
+    cmd, covers = sync_command(jsonl_path)
+    target = jsonl_path.stem if jsonl_path else ""
+    return SyncJob(cmd, covers, timeout, target, last_sync_time(jsonl_path) if jsonl_path else 0.0)
+
+
+def sync_batch(paths: List[Path], max_staleness: float, timeout: Optional[float] = None,
+               quiet: bool = False) -> Dict[Path, Union[SyncJob, SkippedSync]]:
+    """What stands behind each conversation in a batch: a sync, or a SkippedSync if synced recently.
+
+    Stale DMs share one sync-dms run and stale groups one `groups sync`.
+    `quiet` drops the progress lines.
+    """
+    syncs: Dict[Path, Union[SyncJob, SkippedSync]] = {}
+    now = time.time()
+    synced = {path: last_sync_time(path) for path in paths}
+    for d in (DMS_DIR, GROUPS_DIR):
+        stale = []
+        for path in paths:
+            if path.parent != d:
+                continue
+            if now - synced[path] <= max_staleness:
+                syncs[path] = SkippedSync(synced[path])
+            else:
+                stale.append(path)
+        if not stale:
+            continue
+        cmd, covers = sync_command(stale[0])
+        if d == GROUPS_DIR:
+            covers = stale
+        if not quiet:
+            print(f"Syncing latest messages ({len(stale)} {d.name})...", file=sys.stderr)
+        target = ",".join(p.stem for p in stale)
+        syncs.update(dict.fromkeys(stale, SyncJob(cmd, covers, timeout, target, min(synced[p] for p in stale))))
+    if paths and not any(isinstance(sync, SyncJob) for sync in syncs.values()) and not quiet:
+        print("All conversations synced recently, skipping sync", file=sys.stderr)
+    return syncs
+
+
+def read_appended(sync: SyncJob, path: Path, offset: int, cutoff_ts: int) -> Iterator[tuple]:
+    """Once the sync exits (or times out), yield messages it appended past offset.
+
+    The generator returns the offset it read through.
+    """
+    sync.wait()
+    end = complete_size(path)
+    if end < offset:
+        print("Conversation was rewritten during sync; re-run to see new messages", file=sys.stderr)
+        return end
+    yield from read_range(path, offset, end, cutoff_ts)
+    return end
+
+
+def _dir_mtime(d: Path) -> Optional[int]:
+    try:
+        return d.stat().st_mtime_ns
+    except OSError:
         return None
 
-    # Sync first (unless skipped)
-    if not skip_sync:
-        sync_dms()
 
-    # Load and filter
-    cutoff = datetime.now(timezone.utc) - timedelta(hours=hours)
-    with open(jsonl_path) as f:
-        msgs = [json.loads(line) for line in f if line.strip()]
+def conversation_stems(d: Path) -> List[str]:
+    """Names of the conversations in a source directory (DMS_DIR or GROUPS_DIR), sorted."""
+    try:
+        return sorted(e.name[:-6] for e in os.scandir(d) if e.name.endswith(".jsonl") and "\n" not in e.name)
+    except OSError:
+        return []
 
-    recent = [m for m in msgs if parse_date(m['date']) > cutoff]
 
-    if not recent:
-        return f"No messages in last {hours}h with @{jsonl_path.stem}"
+def contact_names() -> Dict[str, str]:
+    """telegram_username -> display_name from the contact database in CONTACTS_DIR."""
+    names = {}
+    for f in sorted(CONTACTS_DIR.glob("*.json")):
+        try:
+            data = json.loads(f.read_bytes())
+        except (OSError, ValueError):
+            continue
+        if isinstance(data, dict):
+            data = [data] if 'telegram_username' in data else list(data.values())
+        for c in data if isinstance(data, list) else ():
+            if isinstance(c, dict) and c.get('telegram_username') and c.get('display_name'):
+                names[c['telegram_username']] = c['display_name']
+    return names
 
-    # Determine username from file
-    chat_username = jsonl_path.stem
 
-    # Format as markdown transcript
-    lines = [f"## Chat with @{chat_username} (last {hours}h)", ""]
+class LookupIndex:
+    """Sorted `key<TAB>value` lines after a JSON header line, searched in place.
+
+    Keys are compared as UTF-8 bytes, which sorts them like str, so exact
+    and prefix lookups are a binary search over line boundaries. Nothing
+    is parsed up front; the file is mmapped.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        end = data.find(b"\n")
+        self.header = json.loads(data[:end])
+        self.body = end + 1
+
+    @classmethod
+    def open(cls, path: Path) -> Optional['LookupIndex']:
+        try:
+            with open(path, 'rb') as f:
+                index = cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except (OSError, ValueError):
+            return None
+        return index if index.header.get('version') == LOOKUP_VERSION else None
+
+    def _bisect(self, key: bytes) -> int:
+        """Offset of the first line whose key is >= key."""
+        data, lo, hi = self.data, self.body, len(self.data)
+        while lo < hi:
+            start = data.rfind(b"\n", lo, (lo + hi) // 2) + 1 or lo
+            end = data.find(b"\n", start)
+            if data[start:data.find(b"\t", start, end)] < key:
+                lo = end + 1
+            else:
+                hi = start
+        return lo
+
+    def line_at(self, offset: int) -> Tuple[str, str]:
+        """(key, value) of the line starting at offset."""
+        key, _, value = self.data[offset:self.data.find(b"\n", offset)].decode().partition("\t")
+        return key, value
+
+    def get(self, key: str) -> Optional[str]:
+        offset = self._bisect(key.encode())
+        if offset < len(self.data):
+            found, value = self.line_at(offset)
+            if found == key:
+                return value
+        return None
+
+    def with_prefix(self, prefix: str) -> Iterator[Tuple[int, str, str]]:
+        """(offset, key, value) for every key starting with prefix, in order."""
+        offset = self._bisect(prefix.encode())
+        while offset < len(self.data):
+            key, value = self.line_at(offset)
+            if not key.startswith(prefix):
+                break
+            yield offset, key, value
+            offset = self.data.find(b"\n", offset) + 1
+
+    def lines(self) -> Iterator[Tuple[int, str, str]]:
+        return self.with_prefix("")
+
+
+def write_lookup_index(header: dict, body: bytes) -> LookupIndex:
+    """Write header and sorted `key<TAB>value` lines to LOOKUP_INDEX; returns the index.
+
+    Falls back to an in-memory index when the data dir isn't writable.
+    """
+    data = json.dumps(header, separators=(',', ':')).encode() + b"\n" + body
+    tmp = LOOKUP_INDEX.with_name(LOOKUP_INDEX.name + ".tmp")
+    try:
+        tmp.write_bytes(data)
+        os.replace(tmp, LOOKUP_INDEX)
+    except OSError:
+        pass  # Read-only data dir: still answer this lookup
+    return LookupIndex(data)
+
+
+def _fingerprint(names: Iterable[str]) -> int:
+    return zlib.crc32("\n".join(names).encode())
+
+
+def _grams(s: str) -> set:
+    """Trigrams of s, padded with newlines so word edges count."""
+    p = f"\n{s}\n"
+    return {p[i:i + 3] for i in range(len(p) - 2)}
+
+
+def match_quality(query: str, key: str, shared: Optional[int] = None, query_grams: int = 0) -> float:
+    """How well key matches query: prefix > substring > trigram similarity, in (0, 1].
+
+    Trigram similarity averages the share of the query's trigrams found in
+    the key with their Dice coefficient, so a short query with a typo still
+    matches a longer key. `shared` is the number of trigrams in common, if
+    known; a key then counts as len(key) trigrams, its padded trigram count.
+    """
+    if key.startswith(query):
+        return 0.9 + 0.1 * len(query) / len(key)
+    if query in key:
+        return 0.7 + 0.1 * len(query) / len(key)
+    if shared is None:
+        grams = _grams(query)
+        shared, query_grams = len(grams & _grams(key)), len(grams)
+    return 0.3 * (shared / query_grams + 2 * shared / (query_grams + len(key)))
+
+
+def build_gram_index(index: LookupIndex) -> Tuple[Dict[str, list], array]:
+    """Trigram postings: gram -> [start, count] into one flat array of 4-byte line offsets."""
+    postings: Dict[str, List[int]] = {}
+    for offset, key, _value in index.lines():
+        for g in _grams(key):
+            postings.setdefault(g, []).append(offset)
+    grams, offsets = {}, array('I')
+    for g, key_offsets in postings.items():
+        grams[g] = [len(offsets), len(key_offsets)]
+        offsets.extend(key_offsets)
+    return grams, offsets
+
+
+def gram_postings(index: LookupIndex, grams: Iterable[str]) -> Iterator[array]:
+    """Offsets of the index lines containing each of `grams`, from the trigram sidecar.
+
+    The sidecar is a JSON header line (gram -> [start, count]) followed by
+    the raw offset array, so a lookup parses the header and reads just the
+    postings it needs. It is rebuilt lazily after the lookup index was;
+    exact lookups never touch it.
+    """
+    try:
+        with open(LOOKUP_GRAMS, 'rb') as f:
+            header = json.loads(f.readline())
+            if header.get('built') == index.header['built']:
+                base = f.tell()
+                for g in grams:
+                    span = header['grams'].get(g)
+                    if span:
+                        f.seek(base + span[0] * 4)
+                        offsets = array('I')
+                        offsets.frombytes(f.read(span[1] * 4))
+                        yield offsets
+                return
+    except (OSError, ValueError):
+        pass
+
+    table, offsets = build_gram_index(index)
+    tmp = LOOKUP_GRAMS.with_name(LOOKUP_GRAMS.name + ".tmp")
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(json.dumps({'built': index.header['built'], 'grams': table}, separators=(',', ':')).encode() + b"\n")
+            offsets.tofile(f)
+        os.replace(tmp, LOOKUP_GRAMS)
+    except OSError:
+        pass  # Read-only data dir: rebuilt next time
+    for g in grams:
+        span = table.get(g)
+        if span:
+            yield offsets[span[0]:span[0] + span[1]]
 
-    for m in recent:
-        dt = parse_date(m['date'])
-        time_str = dt.strftime("%H:%M")
+
+def fuzzy_candidates(query: str, index: LookupIndex) -> List[Tuple[float, str, str]]:
+    """(match_quality, key, value) for the index keys that match query.
+
+    Prefix matches are a contiguous run found by binary search. Without
+    any, keys are scored by trigrams shared with the query, counted from
+    the postings of the query's trigrams only.
+    """
+    found = [(match_quality(query, key), key, value) for _, key, value in index.with_prefix(query)]
+    if found or not query:
+        return found
+
+    if len(query) < 3:
+        # Too short for trigrams to say much
+        return [(match_quality(query, key), key, value) for _, key, value in index.lines() if query in key]
+
+    grams = _grams(query)
+    shared: Counter = Counter()
+    for offsets in gram_postings(index, grams):
+        shared.update(offsets)
+    # Similarity is at most 1.5 * shared / len(grams): skip keys that can't reach the minimum
+    need = FUZZY_MIN_QUALITY / 0.6 * len(grams) / 1.5
+    for offset, count in shared.items():
+        if count >= need:
+            key, value = index.line_at(offset)
+            quality = match_quality(query, key, count, len(grams))
+            if quality >= FUZZY_MIN_QUALITY:
+                found.append((quality, key, value))
+    return found
+
+
+def recency(path: Path, now: float) -> float:
+    """1.0 for a conversation active right now, decaying over weeks."""
+    try:
+        age_days = max(0.0, now - path.stat().st_mtime) / 86400
+    except OSError:
+        return 0.0
+    return 1 / (1 + age_days / 7)
+
+
+def build_lookup_index(dms: List[str], groups: List[str], mtime: list) -> LookupIndex:
+    """Lookup index over DM and group stems plus contact display names.
+
+    Each lowercase stem or name maps to `kind<TAB>stem` (kind 0 = DM,
+    1 = group). Stems win over names, DMs over groups.
+    """
+    keys: Dict[str, str] = {}
+    for kind, stems in enumerate((dms, groups)):
+        for stem in stems:
+            keys.setdefault(stem.lower(), f"{kind}\t{stem}")
+    dm_stems = set(dms)
+    for username, name in contact_names().items():
+        key = name.lower()
+        if username in dm_stems and "\t" not in key and "\n" not in key:
+            keys.setdefault(key, f"0\t{username}")
+    header = {'version': LOOKUP_VERSION, 'mtime': mtime, 'built': time.time(),
+              'stems': _fingerprint(dms + ["/"] + groups)}
+    return write_lookup_index(header, "".join(f"{k}\t{v}\n" for k, v in sorted(keys.items())).encode())
+
+
+def load_lookup_index() -> LookupIndex:
+    """read_lookup_index(), held in memory by the --serve daemon until its directories change."""
+    if WARM is None:
+        return read_lookup_index()
+    if WARM.lookup is None:
+        WARM.lookup = read_lookup_index()
+    return WARM.lookup
+
+
+def read_lookup_index() -> LookupIndex:
+    """Lookup index for DMS_DIR and GROUPS_DIR, rebuilt when the set of conversations changes.
+
+    It is validated against the directories' mtimes. Sidecar writes bump
+    them too, so changed mtimes over the same conversations only re-stamp
+    the index. CONTACTS_DIR's mtime is tracked so new display names are
+    picked up.
+    """
+    mtime = [_dir_mtime(DMS_DIR), _dir_mtime(GROUPS_DIR), _dir_mtime(CONTACTS_DIR)]
+    index = LookupIndex.open(LOOKUP_INDEX)
+    if index is not None and index.header['mtime'] == mtime:
+        return index
+    dms, groups = conversation_stems(DMS_DIR), conversation_stems(GROUPS_DIR)
+    if (index is not None and index.header['mtime'][2:] == mtime[2:]
+            and index.header['stems'] == _fingerprint(dms + ["/"] + groups)):
+        return write_lookup_index(dict(index.header, mtime=mtime), index.data[index.body:])
+    return build_lookup_index(dms, groups, mtime)
+
+
+def _chat_path(value: str) -> Path:
+    kind, _, stem = value.partition("\t")
+    return (DMS_DIR if kind == "0" else GROUPS_DIR) / f"{stem}.jsonl"
+
+
+def match_conversations(query: str, index: LookupIndex, limit: int = FUZZY_ALTERNATIVES + 1) -> List[Tuple[float, Path]]:
+    """Best (score, path) matches for query: match quality plus a recency bonus, best first.
+
+    Groups rank just below DMs of the same quality.
+    """
+    best: Dict[str, float] = {}
+    for quality, _key, value in fuzzy_candidates(query, index):
+        quality -= 0.01 * (value[0] != "0")
+        best[value] = max(quality, best.get(value, 0.0))
+    # Only stat the files that can still make the cut
+    shortlist = sorted(best.items(), key=lambda kv: (-kv[1], kv[0]))[:limit * 4]
+    now = time.time()
+    scored = [(quality + RECENCY_WEIGHT * recency(_chat_path(value), now), _chat_path(value))
+              for value, quality in shortlist]
+    scored.sort(key=lambda sp: (-sp[0], sp[1]))
+    return scored[:limit]
+
+
+def find_jsonl(username: str, index: Optional[LookupIndex] = None) -> Optional[Path]:
+    """Find JSONL file for username or group slug (flexible matching, DMs first).
+
+    Exact matches on usernames, slugs and contact display names come from
+    the lookup index. Otherwise candidates are ranked by match quality and
+    recent activity, and the runners-up are listed on stderr. Pass `index`
+    to resolve several names against one load.
+    """
+    # Exact match first
+    for d in (DMS_DIR, GROUPS_DIR):
+        exact = d / f"{username}.jsonl"
+        if exact.exists():
+            return exact
+
+    if index is None:
+        index = load_lookup_index()
+    value = index.get(username.lower())
+    if value:
+        return _chat_path(value)
+    matches = match_conversations(username.lower(), index)
+    if not matches:
+        return None
+    if len(matches) > 1:
+        others = ', '.join(p.stem for _, p in matches[1:])
+        print(f"Matched '{username}' to {matches[0][1].stem} (also: {others})", file=sys.stderr)
+    return matches[0][1]
+
+
+def scan_activity(path: Path, size: int, entry: Optional[dict] = None) -> dict:
+    """Activity entry for one conversation, extending `entry` by the lines appended since.
+
+    Lines are counted and their dates matched on raw bytes; no JSON is
+    decoded. A file rewritten before the previous scan's end (by a
+    compaction, say) is rescanned from the start.
+    """
+    with open(path, 'rb') as f:
+        if entry and entry['end'] <= size and tail_crc(f, entry['end']) == entry['crc']:
+            end, count, last_ts = entry['end'], entry['count'], entry['last_ts']
+        else:
+            end, count, last_ts = 0, 0, 0
+        f.seek(end)
+        partial = b""
+        while True:
+            block = f.read(BLOCK_SIZE * 16)
+            if not block:
+                break
+            block = partial + block
+            cut = block.rfind(b"\n") + 1
+            block, partial = block[:cut], block[cut:]
+            count += block.count(b"\n") - block.count(b"\n\n")
+            for d in DATE_RE.findall(block):
+                try:
+                    last_ts = max(last_ts, parse_ts(d.decode()))
+                except ValueError:
+                    pass
+            end += cut
+        crc = tail_crc(f, end)
+    return {'size': size, 'mtime': 0, 'end': end, 'count': count, 'last_ts': last_ts, 'crc': crc}
+
+
+def refresh_activity(d: Path, old: Dict[str, dict]) -> Tuple[Dict[str, dict], bool]:
+    """Activity entries for every conversation in d, and whether any changed.
+
+    Only files whose size or mtime moved since `old` are read, and only
+    from where the previous scan stopped.
+    """
+    entries, changed = {}, False
+    try:
+        listing = [e for e in os.scandir(d) if e.name.endswith(".jsonl")]
+    except OSError:
+        listing = []
+    for e in listing:
+        stem = e.name[:-6]
+        try:
+            st = e.stat()
+            entry = old.get(stem)
+            if entry is None or entry['size'] != st.st_size or entry['mtime'] != st.st_mtime_ns:
+                entry = scan_activity(Path(e.path), st.st_size, entry)
+                entry['mtime'] = st.st_mtime_ns
+                changed = True
+        except OSError:
+            continue  # Vanished mid-scan
+        entries[stem] = entry
+    return entries, changed or len(entries) != len(old)
+
+
+def format_activity(stem: str, entry: dict) -> str:
+    when = datetime.fromtimestamp(entry['last_ts'], timezone.utc).strftime("%Y-%m-%d %H:%M")
+    return f"{when}  {entry['count']:>7,} msgs  {stem}"
+
+
+def load_activity() -> Dict[Path, dict]:
+    """Per-conversation {size, mtime, end, count, last_ts, crc} for DMs and groups, kept current in ACTIVITY_INDEX.
+
+    The --serve daemon refreshes its in-memory copy rather than re-reading the file.
+    """
+    if WARM is not None and WARM.activity is not None:
+        index = WARM.activity
+    else:
+        try:
+            index = json.loads(ACTIVITY_INDEX.read_bytes())
+            if index.get('version') != ACTIVITY_VERSION:
+                index = None
+        except (OSError, ValueError):
+            index = None
+    dirs, activity, changed = {}, {}, index is None
+    for d in (DMS_DIR, GROUPS_DIR):
+        old = index['dirs'].get(d.name, {}) if index else {}
+        dirs[d.name], dir_changed = refresh_activity(d, old)
+        changed = changed or dir_changed
+        activity.update((d / f"{stem}.jsonl", entry) for stem, entry in dirs[d.name].items())
+    if WARM is not None:
+        WARM.activity = {'version': ACTIVITY_VERSION, 'dirs': dirs}
+    if changed:
+        try:
+            _write_json_atomic(ACTIVITY_INDEX, {'version': ACTIVITY_VERSION, 'dirs': dirs})
+        except OSError:
+            pass
+    return activity
+
+
+def recent_conversations(limit: Optional[int] = None, groups: bool = True) -> List[Tuple[Path, dict]]:
+    """(path, activity) pairs, most recent message first."""
+    ranked = sorted(((path, entry) for path, entry in load_activity().items()
+                     if groups or path.parent == DMS_DIR),
+                    key=lambda pe: (-pe[1]['last_ts'], pe[0].stem))
+    return ranked[:limit]
+
+
+def format_messages(recent: Iterable[tuple], chat_username: str, is_group: bool) -> Iterator[str]:
+    """Format (ts, message) pairs as markdown transcript lines."""
+    for ts, m in recent:
+        time_str = format_time(ts + utc_offset(m.date))
         # Determine sender
-        is_outgoing = m.get('is_outgoing', False)
-        sender_username = m.get('sender_username', '')
-        if is_outgoing or sender_username == 'frankdegods':
+        if m.is_outgoing or m.sender_username == 'frankdegods':
             sender = "you"
+        elif is_group:
+            sender = m.sender_username or "unknown"
         else:
             sender = chat_username
-        text = m.get('text', '') or '[media]'
+        text = m.text or '[media]'
         # Handle multiline messages
         text = text.replace('\n', '\n    ')
-        lines.append(f"[{time_str}] **{sender}**: {text}")
+        yield f"[{time_str}] **{sender}**: {text}"
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate LLM tokens in one transcript line, from its UTF-8 length.
+
+    Within a few percent of cl100k_base and Claude's tokenizer summed over
+    a transcript; single lines can be off by more.
+    """
+    size = len(text) if text.isascii() else len(text.encode())
+    return LINE_TOKENS + int(size / BYTES_PER_TOKEN)
+
 
-    return "\n".join(lines)
+def fit_tokens(lines: Iterable[str], budget: int) -> Tuple[List[str], bool]:
+    """Take newest-first transcript lines while their estimated tokens fit in budget.
 
+    Returns (lines oldest first, whether older lines were left out). lines
+    is consumed lazily, so nothing past the budget is read or decoded.
+    """
+    kept = []
+    elided = False
+    for line in lines:
+        budget -= estimate_tokens(line)
+        if budget < 0:
+            elided = True
+            break
+        kept.append(line)
+    kept.reverse()
+    return kept, elided
 
-def save_export(content: str, username: str) -> Path:
-    """Save to exports/ with timestamp."""
+
+def write_transcript(jsonl_path: Path, hours: int, out: TextIO, sync: Optional[SyncJob] = None,
+                     max_tokens: Optional[int] = None) -> int:
+    """Stream the markdown transcript for the last `hours` to out.
+
+    read -> filter -> format -> write runs as one generator pipeline, so
+    memory stays flat no matter how large the window is. With a running
+    sync, cached messages are written first and the bytes the sync
+    appended are read once it exits. Returns the byte offset read
+    through, where --follow picks up.
+
+    With max_tokens, only the newest messages that fit are written, read
+    from EOF backwards (see read_newest()), after any sync finishes.
+    """
+    cutoff_ts = int(time.time()) - hours * 3600
+    if max_tokens is not None:
+        return write_newest(jsonl_path, hours, cutoff_ts, max_tokens, out, sync)
+    recent, offset = open_window(jsonl_path, cutoff_ts)
+    read_through = [offset]
+    if sync is not None:
+        def appended() -> Iterator[tuple]:
+            read_through[0] = yield from read_appended(sync, jsonl_path, offset, cutoff_ts)
+        recent = chain(recent, appended())
+
+    # Determine username (or group slug) from file
+    chat_username = jsonl_path.stem
+    is_group = jsonl_path.parent == GROUPS_DIR
+
+    first = next(recent, None)
+    if first is None:
+        out.write(no_messages_text(chat_username, is_group, hours))
+        write_banner(sync, out)
+        return read_through[0]
+
+    # Format as markdown transcript
+    out.write(header_text(chat_username, is_group, hours))
+
+    for line in format_messages(dedup(chain([first], recent)), chat_username, is_group):
+        out.write(line)
+        out.write("\n")
+    write_banner(sync, out)
+    return read_through[0]
+
+
+def write_newest(jsonl_path: Path, hours: int, cutoff_ts: int, max_tokens: int, out: TextIO,
+                 sync: Optional[SyncJob] = None) -> int:
+    """write_transcript() for --max-tokens: the newest messages that fit, oldest first."""
+    if sync is not None:
+        sync.wait()  # the newest messages are the ones the sync appends
+    chat_username = jsonl_path.stem
+    is_group = jsonl_path.parent == GROUPS_DIR
+    header = header_text(chat_username, is_group, hours)
+    marker = ELISION_MARKER.format(max_tokens=max_tokens)
+
+    newest, offset = read_newest(jsonl_path, cutoff_ts)
+    budget = max_tokens - estimate_tokens(header) - estimate_tokens(marker)
+    lines, elided = fit_tokens(format_messages(dedup(newest), chat_username, is_group), budget)
+    if not lines and not elided:
+        out.write(no_messages_text(chat_username, is_group, hours))
+        write_banner(sync, out)
+        return offset
+
+    out.write(header)
+    if elided:
+        out.write(f"{marker}\n")
+    for line in lines:
+        out.write(line)
+        out.write("\n")
+    write_banner(sync, out)
+    return offset
+
+
+def write_around(jsonl_path: Path, target: Tuple[str, int], context: int, out: TextIO) -> bool:
+    """Write the target message and `context` messages either side (see read_around()); False if not found."""
+    chat_username = jsonl_path.stem
+    is_group = jsonl_path.parent == GROUPS_DIR
+    found = read_around(jsonl_path, target, context)
+    if found is None:
+        kind, value = target
+        where = f"in {chat_username}" if is_group else f"with @{chat_username}"
+        print(f"No message at {'id' if kind == 'id' else 'byte'} {value} {where}", file=sys.stderr)
+        return False
+
+    around, i = found
+    ts, m = around[i]
+    out.write(around_header_text(chat_username, is_group, ts + utc_offset(m.date)))
+    for line in format_messages(around, chat_username, is_group):
+        out.write(line)
+        out.write("\n")
+    return True
+
+
+def header_text(chat_username: str, is_group: bool, hours: int) -> str:
+    if is_group:
+        return f"## Group {chat_username} (last {hours}h)\n\n"
+    return f"## Chat with @{chat_username} (last {hours}h)\n\n"
+
+
+def around_header_text(chat_username: str, is_group: bool, ts: int) -> str:
+    when = f"{day_of(ts)} {format_time(ts)}"
+    if is_group:
+        return f"## Group {chat_username} around {when}\n\n"
+    return f"## Chat with @{chat_username} around {when}\n\n"
+
+
+def no_messages_text(chat_username: str, is_group: bool, hours: int) -> str:
+    if is_group:
+        return f"No messages in last {hours}h in {chat_username}\n"
+    return f"No messages in last {hours}h with @{chat_username}\n"
+
+
+def render_transcript(jsonl_path: Path, hours: int, sync: Optional[SyncJob] = None,
+                      max_tokens: Optional[int] = None) -> Tuple[str, int]:
+    """(markdown transcript, offset read through), for batch workers (threads or processes)."""
+    buf = io.StringIO()
+    offset = write_transcript(jsonl_path, hours, buf, sync, max_tokens)
+    return buf.getvalue(), offset
+
+
+def banner_text(sync: Optional[SyncJob]) -> str:
+    """Trailer flagging a transcript exported without a completed sync, else ''."""
+    banner = sync.banner() if sync is not None else None
+    return f"\n{banner}\n" if banner else ""
+
+
+def write_banner(sync: Optional[SyncJob], out: TextIO) -> None:
+    """Flag a transcript exported without a completed sync."""
+    out.write(banner_text(sync))
+
+
+class FileWatcher:
+    """Wakes when any of several files changes: kqueue on macOS, inotify on Linux, else stat polling.
+
+    wait() returns the paths whose inode, size or mtime changed. The
+    event backends only cut latency: stats are compared on every wake
+    either way, so a missed or coalesced event costs one interval at most.
+    """
+
+    def __init__(self, paths: List[Path], interval: float = FOLLOW_INTERVAL):
+        self.interval = interval
+        self.stats = {path: self._stat(path) for path in paths}
+        self._fds: Dict[Path, int] = {}
+        self._kqueue = select.kqueue() if hasattr(select, 'kqueue') else None
+        self._libc = None
+        self._inotify = -1
+        if self._kqueue is None and sys.platform.startswith('linux'):
+            try:
+                import ctypes
+                import ctypes.util
+                self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+                self._inotify = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            except (ImportError, OSError, AttributeError):
+                self._libc = None
+        for path in paths:
+            self._watch(path)
+
+    @staticmethod
+    def _stat(path: Path) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def _watch(self, path: Path) -> None:
+        """(Re-)register path; a replaced file needs a watch on its new inode."""
+        if self._kqueue is not None:
+            old = self._fds.pop(path, None)
+            if old is not None:
+                os.close(old)
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except OSError:
+                return
+            self._fds[path] = fd
+            flags = select.KQ_NOTE_WRITE | select.KQ_NOTE_EXTEND | select.KQ_NOTE_DELETE | select.KQ_NOTE_RENAME
+            self._kqueue.control([select.kevent(fd, select.KQ_FILTER_VNODE,
+                                                select.KQ_EV_ADD | select.KQ_EV_CLEAR, flags)], 0)
+        elif self._inotify >= 0:
+            self._libc.inotify_add_watch(self._inotify, os.fsencode(path),
+                                         IN_MODIFY | IN_ATTRIB | IN_DELETE_SELF | IN_MOVE_SELF)
+
+    def wait(self, timeout: Optional[float] = None) -> List[Path]:
+        """Block until a watched file changes or `timeout` (default: interval) passes."""
+        timeout = self.interval if timeout is None else timeout
+        if self._kqueue is not None:
+            self._kqueue.control(None, max(1, len(self._fds)), timeout)
+        elif self._inotify >= 0:
+            if select.select([self._inotify], [], [], timeout)[0]:
+                try:
+                    os.read(self._inotify, 64 * 1024)  # drain; the stat pass below says what changed
+                except BlockingIOError:
+                    pass
+        else:
+            time.sleep(timeout)
+
+        changed = []
+        for path, old in self.stats.items():
+            new = self._stat(path)
+            if new != old:
+                self.stats[path] = new
+                if new is not None and (old is None or new[0] != old[0]):
+                    self._watch(path)
+                changed.append(path)
+        return changed
+
+    def close(self) -> None:
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds.clear()
+        if self._kqueue is not None:
+            self._kqueue.close()
+        if self._inotify >= 0:
+            os.close(self._inotify)
+            self._inotify = -1
+
+
+def follow(paths: List[Path], offsets: Dict[Path, int], out: TextIO, sync_every: Optional[float] = None,
+           sync_timeout: Optional[float] = None) -> None:
+    """Write messages appended to paths as they land, until interrupted.
+
+    Reading starts at each path's offset and only complete lines are read,
+    so a line still being written is picked up on a later wake. With
+    several conversations, a heading marks each switch between them.
+    `sync_every` re-runs the sync in the background that often. Repeats
+    among the lines followed are dropped (see dedup()).
+    """
+    watcher = FileWatcher(paths)
+    seen = {path: RecentKeys() for path in paths}
+    jobs: List[SyncJob] = []
+    next_sync = time.time() + sync_every if sync_every is not None else None
+    last = paths[0] if len(paths) == 1 else None
+    try:
+        while True:
+            for path in watcher.wait():
+                try:
+                    end = complete_size(path)
+                except OSError:
+                    continue
+                if end < offsets[path]:
+                    print(f"{path.stem} was rewritten; following from its new end", file=sys.stderr)
+                    offsets[path] = end
+                if end <= offsets[path]:
+                    continue
+                is_group = path.parent == GROUPS_DIR
+                if path != last:
+                    out.write(f"\n### {path.stem if is_group else '@' + path.stem}\n")
+                    last = path
+                appended = dedup(read_range(path, offsets[path], end, 0), seen[path])
+                for line in format_messages(appended, path.stem, is_group):
+                    out.write(line)
+                    out.write("\n")
+                out.flush()
+                offsets[path] = end
+
+            for job in [job for job in jobs if job.done()]:
+                job.wait()
+                jobs.remove(job)
+            if next_sync is not None and not jobs and time.time() >= next_sync:
+                jobs = [job for job in set(sync_batch(paths, 0, sync_timeout, quiet=True).values())
+                        if isinstance(job, SyncJob)]
+                next_sync = time.time() + sync_every
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+def quick_export(username: str, hours: int = 24, skip_sync: bool = False, save: bool = False,
+                 max_staleness: int = parse_duration(DEFAULT_MAX_STALENESS),
+                 sync_timeout: Optional[int] = parse_duration(DEFAULT_SYNC_TIMEOUT),
+                 follow_new: bool = False, max_tokens: Optional[int] = None,
+                 around: Optional[Tuple[str, int]] = None, context: int = AROUND_CONTEXT) -> bool:
+    """Sync, filter, and stream markdown to stdout (or exports/ with save).
+
+    With follow_new, keep writing messages as they are appended (see follow()).
+    With max_tokens, keep only the newest messages that fit (see write_newest()).
+    With around, write just that message and its neighbours (see write_around()).
+    """
+
+    jsonl_path = find_jsonl(username)
+    if not jsonl_path:
+        print(f"No synced data for '{username}'", file=sys.stderr)
+        recent = recent_conversations(10, groups=False)
+        print(f"Available DMs (most recent first): {', '.join(path.stem for path, _ in recent)}", file=sys.stderr)
+        return False
+    if around is not None:
+        # The message is on disk already; a sync would only append after it
+        return write_around(jsonl_path, around, context, sys.stdout)
+
+    # Sync in the background while cached data streams out (unless skipped or fresh enough)
+    sync = None
+    if not skip_sync:
+        synced = last_sync_time(jsonl_path)
+        age = time.time() - synced
+        if age > max_staleness:
+            sync = sync_dms(jsonl_path, sync_timeout)
+        else:
+            print(f"Synced {age:.0f}s ago, skipping sync", file=sys.stderr)
+            sync = SkippedSync(synced)
+
+    if save:
+        path = export_path(username)
+        with open(path, 'w') as out:
+            write_transcript(jsonl_path, hours, out, sync, max_tokens)
+        print(f"Saved to {path}", file=sys.stderr)
+    else:
+        offset = write_transcript(jsonl_path, hours, sys.stdout, sync, max_tokens)
+        if follow_new:
+            sys.stdout.flush()
+            follow([jsonl_path], {jsonl_path: offset}, sys.stdout, None if skip_sync else max_staleness, sync_timeout)
+    return True
+
+
+def quick_export_batch(usernames: List[str], hours: int = 24, all_active: bool = False,
+                       skip_sync: bool = False, save: bool = False,
+                       max_staleness: int = parse_duration(DEFAULT_MAX_STALENESS),
+                       sync_timeout: Optional[int] = parse_duration(DEFAULT_SYNC_TIMEOUT),
+                       workers: int = BATCH_WORKERS, processes: int = 0, follow_new: bool = False,
+                       max_tokens: Optional[int] = None) -> bool:
+    """Export several conversations in one invocation, as markdown sections (or one file each with save).
+
+    Names resolve against one lookup index load; `all_active` adds every
+    conversation with a message in the window, from the activity index.
+    Each source directory syncs at most once, and transcripts are read on
+    a thread pool and written in order. With `processes`, transcripts are
+    formatted in that many worker processes instead, in chunks; syncs
+    finish first, since a running sync can't be shared across processes.
+    With follow_new, one watcher then follows them all (see follow()).
+    max_tokens applies to each transcript separately.
+    """
+    if processes > 0 and WARM is not None:
+        raise RunLocally("processes")  # No forking from the daemon and its watcher thread
+    paths: List[Path] = []
+    if all_active:
+        cutoff = time.time() - hours * 3600
+        paths = [path for path, entry in recent_conversations() if entry['last_ts'] >= cutoff]
+    if usernames:
+        index = load_lookup_index()
+        for username in usernames:
+            path = find_jsonl(username, index)
+            if path is None:
+                print(f"No synced data for '{username}'", file=sys.stderr)
+            elif path not in paths:
+                paths.append(path)
+    if not paths:
+        print(f"No conversations to export (last {hours}h)", file=sys.stderr)
+        return False
+
+    syncs = {} if skip_sync else sync_batch(paths, max_staleness, sync_timeout)
+
+    if processes > 0:
+        for job in set(syncs.values()):
+            job.wait()
+        pool = ProcessPoolExecutor(max_workers=min(processes, len(paths)), initializer=use_backend,
+                                   initargs=("sqlite" if STORE is not None else "jsonl",))
+        chunksize = max(1, len(paths) // (processes * CHUNKS_PER_PROCESS))
+        texts = pool.map(partial(render_transcript, hours=hours, max_tokens=max_tokens), paths, chunksize=chunksize)
+    else:
+        pool = ThreadPoolExecutor(max_workers=min(workers, len(paths)))
+        texts = pool.map(lambda path: render_transcript(path, hours, syncs.get(path), max_tokens), paths)
+
+    offsets = {}
+    with pool:
+        for i, (path, (text, offset)) in enumerate(zip(paths, texts)):
+            offsets[path] = offset
+            if processes > 0:
+                text += banner_text(syncs.get(path))
+            if save:
+                out_path = export_path(path.stem)
+                out_path.write_text(text)
+                print(f"Saved to {out_path}", file=sys.stderr)
+            else:
+                sys.stdout.write(f"\n{text}" if i else text)
+    if follow_new and not save:
+        sys.stdout.flush()
+        follow(paths, offsets, sys.stdout, None if skip_sync else max_staleness, sync_timeout)
+    return True
+
+
+def export_path(username: str) -> Path:
+    """Path in exports/ with timestamp."""
     EXPORTS_DIR.mkdir(exist_ok=True)
     date_str = datetime.now().strftime("%Y-%m-%d")
     output_path = EXPORTS_DIR / f"{username}_{date_str}.md"
@@ -113,27 +2071,281 @@ def save_export(content: str, username: str) -> Path:
         time_str = datetime.now().strftime("%H-%M")
         output_path = EXPORTS_DIR / f"{username}_{date_str}_{time_str}.md"
 
-    output_path.write_text(content)
     return output_path
 
 
-def main():
+class WarmWindow:
+    """A conversation's recent messages as the daemon holds them, newer than cutoff_ts up to end."""
+
+    def __init__(self, stat: os.stat_result, cutoff_ts: int, end: int, crc: int, messages: List[tuple]):
+        self.ino = stat.st_ino
+        self.stat = (stat.st_size, stat.st_mtime_ns)
+        self.cutoff_ts = cutoff_ts
+        self.end = end
+        self.crc = crc
+        self.messages = messages
+
+
+class WarmCache:
+    """In-memory state for the --serve daemon.
+
+    Holds the lookup index, activity entries, per-file column caches
+    and the recent window of the last WARM_WINDOWS conversations exported.
+    A FileWatcher thread over DMS_DIR, GROUPS_DIR and CONTACTS_DIR drops
+    the lookup index when conversations or contacts come or go. Per-file
+    entries are checked with one stat per request instead: a watcher
+    event can trail an append that the request right behind it must see.
+    Windows of a grown file are extended from where they stopped.
+    """
+
+    def __init__(self, dirs: List[Path]):
+        self.lookup: Optional[LookupIndex] = None
+        self.activity: Optional[dict] = None
+        self.columns: Dict[Path, ColumnCache] = {}
+        self.windows: "OrderedDict[Path, WarmWindow]" = OrderedDict()
+        self.watcher = FileWatcher(dirs)
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    def _watch(self) -> None:
+        while True:
+            if self.watcher.wait():
+                self.lookup = None
+
+    def window(self, path: Path, cutoff_ts: int) -> Tuple[Iterator[tuple], int]:
+        """open_window() from memory, reading only bytes appended since the last request."""
+        st = path.stat()
+        entry = self.windows.pop(path, None)
+        if entry is not None and (entry.ino != st.st_ino or entry.cutoff_ts > cutoff_ts):
+            entry = None
+        if entry is not None and entry.stat != (st.st_size, st.st_mtime_ns):
+            with open(path, 'rb') as f:
+                unchanged = st.st_size >= entry.end and tail_crc(f, entry.end) == entry.crc
+            if unchanged:
+                end = complete_size(path)
+                entry.messages.extend(read_range(path, entry.end, end, entry.cutoff_ts))
+                with open(path, 'rb') as f:
+                    entry.crc = tail_crc(f, end)
+                entry.end, entry.stat = end, (st.st_size, st.st_mtime_ns)
+            else:
+                entry = None
+        if entry is None:
+            messages, end = read_window(path, cutoff_ts)
+            messages = list(messages)
+            with open(path, 'rb') as f:
+                entry = WarmWindow(st, cutoff_ts, end, tail_crc(f, end), messages)
+
+        messages = [tm for tm in entry.messages if tm[0] > cutoff_ts]
+        if cutoff_ts > entry.cutoff_ts:
+            # Forget what has aged out, so an entry kept for days stays the size of its window
+            entry.messages, entry.cutoff_ts = messages[:], cutoff_ts
+        self.windows[path] = entry
+        while len(self.windows) > WARM_WINDOWS:
+            self.windows.popitem(last=False)
+        return iter(messages), entry.end
+
+
+class SocketStream(io.TextIOBase):
+    """Text stream relaying writes to a daemon client as {"<name>": text} JSON lines.
+
+    Writes are buffered, so a request handed back to the client (see
+    RunLocally) can be dropped before anything reached it.
+    """
+
+    def __init__(self, conn: socket.socket, name: str, buffer_size: int = BLOCK_SIZE):
+        self.conn = conn
+        self.name = name
+        self.buffer_size = buffer_size
+        self._parts: List[str] = []
+        self._size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        self._parts.append(s)
+        self._size += len(s)
+        if self._size >= self.buffer_size:
+            self.flush()
+        return len(s)
+
+    def flush(self) -> None:
+        if self._parts:
+            text, self._parts, self._size = "".join(self._parts), [], 0
+            self.conn.sendall(json.dumps({self.name: text}).encode() + b"\n")
+
+    def discard(self) -> None:
+        self._parts, self._size = [], 0
+
+
+def handle_request(conn: socket.socket) -> None:
+    """Run one client's command line against the warm caches, relaying its output and exit code.
+
+    A command that would sync or fork is handed back with {"local": true}
+    instead (see RunLocally).
+    """
+    request = json.loads(conn.makefile('rb').readline())
+    argv = request['argv']
+    out, err = SocketStream(conn, 'stdout'), SocketStream(conn, 'stderr')
+    code = 0
+    with redirect_stdout(out), redirect_stderr(err):
+        try:
+            if any(flag in argv for flag in DAEMON_LOCAL_FLAGS):
+                print(f"{', '.join(DAEMON_LOCAL_FLAGS)} can't run in the daemon", file=sys.stderr)
+                code = 2
+            else:
+                main(argv)
+        except RunLocally:
+            out.discard()
+            err.discard()
+            conn.sendall(json.dumps({'local': True}).encode() + b"\n")
+            return
+        except SystemExit as e:
+            if isinstance(e.code, str):
+                print(e.code, file=sys.stderr)
+            code = e.code if isinstance(e.code, int) else int(e.code is not None)
+        except Exception:
+            traceback.print_exc()
+            code = 1
+    out.flush()
+    err.flush()
+    conn.sendall(json.dumps({'exit': code}).encode() + b"\n")
+
+
+def serve(socket_path: Path = DAEMON_SOCKET) -> None:
+    """Answer export_client.py requests over a Unix socket, one at a time, until interrupted.
+
+    Requests never sync or fork here (see RunLocally), so each one is a
+    quick read of the warm caches.
+    """
+    global WARM
+    WARM = WarmCache([DMS_DIR, GROUPS_DIR, CONTACTS_DIR])
+    try:
+        socket_path.unlink()
+    except FileNotFoundError:
+        pass
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Created owner-only: a chmod after bind() would leave a moment when anyone could connect
+    umask = os.umask(0o177)
+    try:
+        server.bind(str(socket_path))
+    finally:
+        os.umask(umask)
+    server.listen(16)
+    print(f"Serving quick_export on {socket_path}", file=sys.stderr)
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                try:
+                    handle_request(conn)
+                except (OSError, ValueError, KeyError):
+                    pass  # Client went away or sent garbage
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        try:
+            socket_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def compact(usernames: List[str]) -> None:
+    """--compact: compact_jsonl() each named conversation, or all of them, reporting the repeats removed."""
+    if usernames:
+        paths = []
+        for username in usernames:
+            path = find_jsonl(username)
+            if path is None:
+                print(f"No synced data for '{username}'", file=sys.stderr)
+            else:
+                paths.append(path)
+    else:
+        paths = ([DMS_DIR / f"{stem}.jsonl" for stem in conversation_stems(DMS_DIR)]
+                 + [GROUPS_DIR / f"{stem}.jsonl" for stem in conversation_stems(GROUPS_DIR)])
+    total = 0
+    for path in paths:
+        try:
+            kept, repeats = compact_jsonl(path)
+        except RuntimeError as e:
+            print(e, file=sys.stderr)
+            continue
+        total += repeats
+        if repeats:
+            print(f"{store_name(path)}: removed {repeats:,} duplicates, {kept:,} messages left")
+    print(f"{total:,} duplicates removed across {len(paths)} conversations")
+
+
+def main(argv: Optional[List[str]] = None):
     import argparse
-    parser = argparse.ArgumentParser(description="Quick export Telegram DMs for AI context")
-    parser.add_argument("username", help="Telegram username (flexible matching)")
+    parser = argparse.ArgumentParser(description="Quick export Telegram DMs and groups for AI context")
+    parser.add_argument("usernames", nargs="*", metavar="username",
+                        help="Telegram username or group slug (flexible matching); several export as one batch")
     parser.add_argument("--hours", type=int, default=24, help="Hours to look back (default: 24)")
     parser.add_argument("--no-sync", action="store_true", help="Skip sync, use cached data")
+    parser.add_argument("--max-staleness", type=parse_duration, default=DEFAULT_MAX_STALENESS,
+                        help=f"Skip sync if synced within this long, e.g. 30s, 5m, 1h (default: {DEFAULT_MAX_STALENESS})")
+    parser.add_argument("--sync-timeout", type=parse_duration, default=DEFAULT_SYNC_TIMEOUT,
+                        help=f"Stop waiting for sync after this long and use cache (default: {DEFAULT_SYNC_TIMEOUT})")
     parser.add_argument("--save", action="store_true", help="Save to exports/ instead of stdout")
-    args = parser.parse_args()
+    parser.add_argument("--max-tokens", type=int, metavar="N",
+                        help="Keep only the newest messages that fit in about N LLM tokens (per conversation)")
+    parser.add_argument("--around", type=parse_around, metavar="OFFSET|id:N",
+                        help="Show one message and its neighbours instead: a byte offset from search.py, or id:N")
+    parser.add_argument("--context", type=int, default=AROUND_CONTEXT, metavar="N",
+                        help=f"Messages either side of --around (default: {AROUND_CONTEXT})")
+    parser.add_argument("--all-active", action="store_true",
+                        help="Export every conversation with messages in the --hours window")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS,
+                        help=f"Threads reading conversations in a batch (default: {BATCH_WORKERS})")
+    parser.add_argument("--processes", type=int, default=0, metavar="N",
+                        help="Format a batch in N worker processes instead of threads, for thousands of chats")
+    parser.add_argument("--follow", action="store_true",
+                        help="After the export, keep printing new messages (re-syncing every --max-staleness)")
+    parser.add_argument("--backend", choices=("jsonl", "sqlite"), default="jsonl",
+                        help="Read from the JSONL files or the SQLite message store, data/messages.db (default: jsonl)")
+    parser.add_argument("--migrate", action="store_true",
+                        help="Load every conversation into data/messages.db for --backend sqlite and exit")
+    parser.add_argument("--compact", action="store_true",
+                        help="Rewrite the named conversations (default: all) sorted, without repeated message ids, "
+                             "and exit; run while no sync is writing")
+    parser.add_argument("--serve", action="store_true",
+                        help=f"Run the warm daemon export_client.py talks to, on {DAEMON_SOCKET}")
+    parser.add_argument("--recent", type=int, nargs="?", const=20, metavar="N",
+                        help="List the N most recently active DMs and groups (default: 20) and exit")
+    args = parser.parse_args(argv)
 
-    result = quick_export(args.username, args.hours, args.no_sync)
+    if args.serve:
+        serve(DAEMON_SOCKET)
+        return
+    if args.migrate:
+        migrate_store([DMS_DIR / f"{stem}.jsonl" for stem in conversation_stems(DMS_DIR)]
+                      + [GROUPS_DIR / f"{stem}.jsonl" for stem in conversation_stems(GROUPS_DIR)])
+        return
+    if args.compact:
+        compact(args.usernames)
+        return
+    if args.recent is not None:
+        for path, entry in recent_conversations(args.recent):
+            print(format_activity(path.stem if path.parent == DMS_DIR else f"{path.stem} (group)", entry))
+        return
+    if not args.usernames and not args.all_active:
+        parser.error("username is required unless --all-active, --recent or --migrate is given")
+    if args.follow and args.save:
+        parser.error("--follow writes to stdout; it can't be combined with --save")
+    if args.around is not None and (len(args.usernames) != 1 or args.all_active or args.save or args.follow
+                                    or args.max_tokens is not None):
+        parser.error("--around takes one username; it can't be combined with --all-active, --save, --follow "
+                     "or --max-tokens")
+    use_backend(args.backend)
 
-    if result:
-        if args.save:
-            path = save_export(result, args.username)
-            print(f"Saved to {path}", file=sys.stderr)
-        else:
-            print(result)
+    if len(args.usernames) == 1 and not args.all_active:
+        quick_export(args.usernames[0], args.hours, args.no_sync, args.save, args.max_staleness, args.sync_timeout,
+                     args.follow, args.max_tokens, args.around, args.context)
+    else:
+        quick_export_batch(args.usernames, args.hours, args.all_active, args.no_sync, args.save,
+                           args.max_staleness, args.sync_timeout, args.workers, args.processes, args.follow,
+                           args.max_tokens)
 
 
 if __name__ == "__main__":
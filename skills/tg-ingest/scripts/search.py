@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Full-text search across every DM and group: where did someone mention X.
+
+Usage:
+    python scripts/search.py "term sheet"               # best 20 hits, all chats
+    python scripts/search.py launch --hours 168          # only the last week
+    python scripts/search.py "deck OR memo" --fts        # raw FTS5 query syntax
+    python scripts/search.py wallet --limit 50
+    python scripts/search.py '0x[0-9a-f]{40}' --regex    # regex over the raw JSONL lines
+
+Hits come ranked (bm25) from an SQLite FTS5 index in data/search.db, in
+quick_export's `[HH:MM] **sender**: text` style under a heading naming the
+chat, the date and the message's byte offset in its JSONL. Before each
+search the index takes in only the bytes appended to each JSONL since.
+
+--regex skips the index and scans every JSONL instead, like ripgrep: each
+file is memory-mapped and searched in chunks on a process pool with one
+compiled bytes pattern, and only the lines it matches are decoded. Hits
+come newest first.
+"""
+import argparse
+import heapq
+import mmap
+import os
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+import quick_export
+from quick_export import (REPO_ROOT, Message, conversation_stems, day_of, decode_message, format_messages,
+                          offset_suffix, parse_ts, store_name, tail_crc, utc_offset)
+
+SEARCH_INDEX = REPO_ROOT / "data/search.db"
+
+# Row ids are file id << OFFSET_BITS | byte offset, so a conversation's rows are one rowid range
+OFFSET_BITS = 40
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    tail_crc INTEGER NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5(
+    text, sender, ts UNINDEXED, utc_offset UNINDEXED, direction UNINDEXED,
+    tokenize = 'porter unicode61 remove_diacritics 2'
+);
+"""
+SCHEMA_VERSION = 3
+
+DEFAULT_LIMIT = 20
+
+# Bytes of one JSONL scanned per --regex task, so one huge conversation still spreads across processes
+GREP_CHUNK = 64 * 1024 * 1024
+
+
+def conversation_paths() -> List[Path]:
+    return [d / f"{stem}.jsonl" for d in (quick_export.DMS_DIR, quick_export.GROUPS_DIR)
+            for stem in conversation_stems(d)]
+
+
+def connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(SEARCH_INDEX, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        # An older layout; the index is rebuilt from the JSONL files on this search
+        conn.executescript(f"BEGIN IMMEDIATE; DROP TABLE IF EXISTS messages; DROP TABLE IF EXISTS files;"
+                           f"{SCHEMA} PRAGMA user_version = {SCHEMA_VERSION}; COMMIT;")
+    return conn
+
+
+def update_index(conn: sqlite3.Connection, paths: List[Path]) -> int:
+    """Index lines appended to each JSONL since the last search; returns how many were added.
+
+    `paths` is every conversation: files whose size and mtime match are
+    skipped on one stat, and ones no longer there have their rows dropped.
+    A file whose tail no longer matches (rewritten) has its rowid range
+    dropped and is indexed again from the start.
+    """
+    known = {name: (size, mtime_ns) for name, size, mtime_ns in conn.execute("SELECT name, size, mtime_ns FROM files")}
+    stale = []
+    gone = set(known)
+    for path in paths:
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        name = store_name(path)
+        gone.discard(name)
+        if known.get(name) != (st.st_size, st.st_mtime_ns):
+            stale.append(path)
+    if not stale and not gone:
+        return 0
+
+    added = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for name in gone:
+            drop_file(conn, name)
+        for path in stale:
+            added += index_file(conn, path)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return added
+
+
+def drop_file(conn: sqlite3.Connection, name: str) -> None:
+    """Remove a conversation deleted from disk, and its rowid range, from the index."""
+    row = conn.execute("SELECT id FROM files WHERE name = ?", (name,)).fetchone()
+    if row is None:
+        return  # Another search dropped it first
+    file_id = row[0]
+    conn.execute("DELETE FROM messages WHERE rowid >= ? AND rowid < ?",
+                 (file_id << OFFSET_BITS, (file_id + 1) << OFFSET_BITS))
+    conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+
+def index_file(conn: sqlite3.Connection, path: Path) -> int:
+    name = store_name(path)
+    with open(path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        row = conn.execute("SELECT id, size, tail_crc FROM files WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            file_id = conn.execute("INSERT INTO files (name, size, mtime_ns, tail_crc) VALUES (?, 0, 0, 0)",
+                                   (name,)).lastrowid
+            start = 0
+        else:
+            file_id, start, crc = row
+            if st.st_size < start or tail_crc(f, start) != crc:
+                conn.execute("DELETE FROM messages WHERE rowid >= ? AND rowid < ?",
+                             (file_id << OFFSET_BITS, (file_id + 1) << OFFSET_BITS))
+                start = 0
+        end = [start]
+
+        def rows() -> Iterator[tuple]:
+            pos = start
+            f.seek(pos)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # Partial trailing line, still being written
+                offset, pos = pos, pos + len(line)
+                end[0] = pos
+                if line.strip():
+                    m = decode_message(line)
+                    if m.text:
+                        yield (file_id << OFFSET_BITS | offset, m.text, m.sender_username, parse_ts(m.date),
+                               utc_offset(m.date), int(bool(m.is_outgoing)))
+        before = conn.total_changes
+        conn.executemany("INSERT INTO messages (rowid, text, sender, ts, utc_offset, direction) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", rows())
+        added = conn.total_changes - before
+        conn.execute("UPDATE files SET size = ?, mtime_ns = ?, tail_crc = ? WHERE id = ?",
+                     (end[0], st.st_mtime_ns, tail_crc(f, end[0]), file_id))
+    return added
+
+
+def fts_query(query: str) -> str:
+    """Plain words as an FTS5 query: every word must match, punctuation taken literally."""
+    return " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+
+
+def search(conn: sqlite3.Connection, query: str, limit: int = DEFAULT_LIMIT,
+           since_ts: int = 0) -> List[Tuple[str, int, int, Message]]:
+    """Best-ranked hits as (conversation, ts, byte offset, message); newer first among equals."""
+    names = dict(conn.execute("SELECT id, name FROM files"))
+    rows = conn.execute(
+        "SELECT rowid, ts, utc_offset, direction, sender, text FROM messages WHERE messages MATCH ? AND ts > ? "
+        "ORDER BY rank, ts DESC LIMIT ?", (query, since_ts, limit))
+    mask = (1 << OFFSET_BITS) - 1
+    return [(names[rowid >> OFFSET_BITS], ts, rowid & mask,
+             Message(offset_suffix(off), text, bool(direction), sender))
+            for rowid, ts, off, direction, sender, text in rows]
+
+
+def grep_chunk(path: str, start: int, end: int, pattern: re.Pattern, since_ts: int = 0,
+               limit: int = DEFAULT_LIMIT) -> List[Tuple[int, int, Message]]:
+    """Newest lines matching pattern among those starting in path[start:end], as (ts, byte offset, message).
+
+    A match belongs to the line it starts on. Lines are decoded only once
+    they match; a partial trailing line is left alone.
+    """
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    with mm:
+        first = mm.find(b'\n', start - 1) + 1 or len(mm) if start else 0
+        # Just past the line holding the chunk's last byte, or the last complete line
+        stop = mm.find(b'\n', end - 1) + 1 or mm.rfind(b'\n') + 1
+        hits = []
+        pos = first
+        while pos < stop:
+            m = pattern.search(mm, pos, stop)
+            if m is None:
+                break
+            line_start = mm.rfind(b'\n', first, m.start()) + 1 or first
+            line_end = mm.find(b'\n', m.start(), stop) + 1
+            if line_end == 0:
+                break
+            pos = line_end
+            line = mm[line_start:line_end]
+            if line.strip():
+                msg = decode_message(line)
+                ts = parse_ts(msg.date)
+                if ts > since_ts:
+                    hits.append((ts, line_start, msg))
+    return heapq.nlargest(limit, hits, key=lambda hit: hit[0])
+
+
+def grep(paths: List[Path], pattern: re.Pattern, limit: int = DEFAULT_LIMIT, since_ts: int = 0,
+         processes: int = 0) -> List[Tuple[str, int, int, Message]]:
+    """Newest lines matching pattern across paths, as (conversation, ts, byte offset, message)."""
+    tasks = []
+    for path in paths:
+        try:
+            size = path.stat().st_size
+        except OSError:
+            continue
+        tasks.extend((path, start, min(start + GREP_CHUNK, size)) for start in range(0, size, GREP_CHUNK))
+    if not tasks:
+        return []
+    paths, starts, ends = zip(*tasks)
+    with ProcessPoolExecutor(max_workers=min(processes or os.cpu_count() or 1, len(tasks))) as pool:
+        chunks = pool.map(grep_chunk, map(str, paths), starts, ends, repeat(pattern), repeat(since_ts), repeat(limit))
+        hits = [(store_name(path), ts, offset, m) for path, chunk in zip(paths, chunks) for ts, offset, m in chunk]
+    return heapq.nlargest(limit, hits, key=lambda hit: hit[1])
+
+
+def format_hits(hits: List[Tuple[str, int, int, Message]]) -> Iterator[str]:
+    for name, ts, offset, m in hits:
+        folder, stem = name.split("/", 1)
+        is_group = folder == quick_export.GROUPS_DIR.name
+        day = day_of(ts + utc_offset(m.date))
+        yield f"### {stem if is_group else '@' + stem} · {day} · byte {offset}"
+        yield from format_messages([(ts, m)], stem, is_group)
+        yield ""
+
+
+def index_hits(query: str, limit: int, since_ts: int) -> List[Tuple[str, int, int, Message]]:
+    """Bring the index up to date, then search it."""
+    conn = connect()
+    added = update_index(conn, conversation_paths())
+    if added:
+        print(f"Indexed {added:,} new messages", file=sys.stderr)
+    try:
+        return search(conn, query, limit, since_ts)
+    except sqlite3.OperationalError as e:
+        sys.exit(f"Bad search query: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text search across Telegram DMs and groups")
+    parser.add_argument("query", help="Words to find (all must match); FTS5 syntax with --fts, a regex with --regex")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT, help=f"Hits to show (default: {DEFAULT_LIMIT})")
+    parser.add_argument("--hours", type=int, help="Only messages from the last N hours")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--fts", action="store_true",
+                      help="Pass the query to FTS5 as is (OR, NOT, \"phrases\", prefix*)")
+    mode.add_argument("--regex", action="store_true",
+                      help="Scan the raw JSONL lines with a Python regex instead of using the index")
+    parser.add_argument("-i", "--ignore-case", action="store_true", help="Case-insensitive --regex")
+    parser.add_argument("--processes", type=int, default=0, metavar="N",
+                        help="Worker processes for --regex (default: one per CPU)")
+    args = parser.parse_args()
+    since_ts = int(time.time()) - args.hours * 3600 if args.hours else 0
+
+    if args.regex:
+        try:
+            pattern = re.compile(args.query.encode(), re.IGNORECASE if args.ignore_case else 0)
+        except re.error as e:
+            sys.exit(f"Bad regex: {e}")
+        hits = grep(conversation_paths(), pattern, args.limit, since_ts, args.processes)
+    else:
+        hits = index_hits(args.query if args.fts else fts_query(args.query), args.limit, since_ts)
+    if not hits:
+        print(f"No matches for {args.query!r}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"## Search: {args.query} (top {len(hits)})\n")
+    for line in format_hits(hits):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()